@@ -1,3 +1,6 @@
+# Small fixed sample only. For varied, seeded, bulk loaded cohorts (incl. day 2 change sets)
+# at benchmark scale see api_pipeline/scripts/synth_cohort.py
+
 import json
 import pyodbc
 import uuid
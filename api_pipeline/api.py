@@ -1,162 +1,548 @@
 # api_pipeline/api.py
-import json
+import queue
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import requests
+from itertools import islice
 
-from .config import BATCH_SIZE, API_ENDPOINT_LA
-from .db import update_api_success, update_api_failure
+from . import codec, metrics
+from .auth import get_oauth_token
+from .config import BATCH_SIZE, API_ENDPOINT_LA, MAX_IN_FLIGHT, MAX_BATCH_BYTES, BISECT_ON_400, TOKEN_ENDPOINT, PIPELINE_QUEUE_DEPTH
+from .storage import backend
+from .rate_limit import RateLimiter, parse_retry_after
+from .transport import post, encode_body, gzip_accepted, gzip_probe_result, gzip_probe_start, gzip_rejected
 from .utils import benchmark_section, log_debug
 
 
 # # ---- local imports with fallback for notebook/debug use ----
 # try:
-#     from .config import BATCH_SIZE, API_ENDPOINT_LA
-#     from .db import update_api_success, update_api_failure
+#     from . import codec, metrics
+#     from .auth import get_oauth_token
+#     from .config import BATCH_SIZE, API_ENDPOINT_LA, MAX_IN_FLIGHT, MAX_BATCH_BYTES, BISECT_ON_400, TOKEN_ENDPOINT, PIPELINE_QUEUE_DEPTH
+#     from .storage import backend
+#     from .rate_limit import RateLimiter, parse_retry_after
+#     from .transport import post, encode_body, gzip_accepted, gzip_probe_result, gzip_probe_start, gzip_rejected
 #     from .utils import benchmark_section, log_debug
 # except ImportError:
-#     from config import BATCH_SIZE, API_ENDPOINT_LA
-#     from db import update_api_success, update_api_failure
+#     import codec, metrics
+#     from auth import get_oauth_token
+#     from config import BATCH_SIZE, API_ENDPOINT_LA, MAX_IN_FLIGHT, MAX_BATCH_BYTES, BISECT_ON_400, TOKEN_ENDPOINT, PIPELINE_QUEUE_DEPTH
+#     from storage import backend
+#     from rate_limit import RateLimiter, parse_retry_after
+#     from transport import post, encode_body, gzip_accepted, gzip_probe_result, gzip_probe_start, gzip_rejected
 #     from utils import benchmark_section, log_debug
 
 
+# Map known statuses to explanation
+STATUS_MESSAGES = {
+    204: "No content",
+    400: "Malformed Payload",
+    401: "Invalid API token",
+    403: "API access disallowed",
+    413: "Payload exceeds limit",
+    429: "Rate limit exceeded"
+}
+
+RETRYABLE_STATUSES = [401, 403, 429]
+
+
+class BatchByteLimit:
+    """
+    Effective request body ceiling for run, starts at MAX_BATCH_BYTES and
+    is lowered (shared across worker threads) each time API answers 413
+    """
+
+    def __init__(self, ceiling=MAX_BATCH_BYTES):
+        self.value = ceiling
+        self._lock = threading.Lock()
+
+    def shrink(self, rejected_bytes):
+        """Learn from 413: keep future batches below rejected body size"""
+        with self._lock:
+            learned = int(rejected_bytes * 0.9)
+            if learned < self.value:
+                self.value = learned
+                print(f"Payload limit learned from 413: batches now packed under {learned} bytes")
+
+
 # ---- API ----
 # PEP 484 signature:
-# def process_batches(records: List[Dict[str, Any]], headers: Dict[str, str], conn: pyodbc.Connection, max_retries: int = 3) -> None:
+# def process_batches(records: Iterable[Dict[str, Any]], headers: Dict[str, str], conn: pyodbc.Connection, max_retries: int = 3, max_in_flight: int = MAX_IN_FLIGHT, journal: Optional[SendJournal] = None) -> None:
 @benchmark_section("process_batches()")  # Performance monitor
-def process_batches(records, headers, conn, max_retries=3):
+def process_batches(records, headers, conn, max_retries=3, max_in_flight=MAX_IN_FLIGHT, journal=None):
     """
     Submit payloads in batches to API with retry logic
 
+    Batches are packed up to BATCH_SIZE records and the learned byte ceiling
+    (see BatchByteLimit), and sent by bounded worker pool (max_in_flight at a
+    time), each retrying independently and paced by one shared RateLimiter. All DB work (reading a record stream, writing
+    outcomes) stays on calling thread, in batch submission order, so pyodbc
+    connection is never shared across threads.
+
     Args:
-        records: List of dicts with 'person_id' and parsed JSON
+        records: List, or stream (db.iter_pending_records), of dicts with 'person_id' and parsed 'json' or raw JSON text
         headers: HTTP headers for API call
         conn: Open database connection
         max_retries: Retry count before marking as failure
+        max_in_flight: Concurrent batch submissions (1 = sequential)
+        journal: Optional SendJournal, batches journalled around POST, cleared once committed
     """
-    total = len(records)
+    total = len(records) if hasattr(records, "__len__") else "?"
     cursor = conn.cursor()
+    sent = 0
+    byte_limit = BatchByteLimit()
+    limiter = RateLimiter()
+
+    def write_outcome(result):
+        batch_id, (successes, failures) = result
+        # Single set-based write for whole batch
+        backend.update_api_results(cursor, successes, failures)
+        conn.commit()
+        if journal is not None:
+            journal.clear(batch_id)
+
+    if max_in_flight <= 1:
+        for batch in _iter_batches(records, BATCH_SIZE, byte_limit):
+            log_debug(f"Processing batch {sent + 1} to {sent + len(batch)} of {total}")  # DEBUG
+            sent += len(batch)
+            write_outcome(_send_journalled(batch, headers, max_retries, byte_limit, limiter, journal))
+        return
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight = deque()
+        for batch in _iter_batches(records, BATCH_SIZE, byte_limit):
+            log_debug(f"Processing batch {sent + 1} to {sent + len(batch)} of {total}")  # DEBUG
+            sent += len(batch)
+            in_flight.append(pool.submit(_send_journalled, batch, headers, max_retries, byte_limit, limiter, journal))
 
-    for i in range(0, total, BATCH_SIZE):
-        batch = records[i:i + BATCH_SIZE]
+            # Bound work in flight, write oldest outcome first to keep ordering
+            if len(in_flight) >= max_in_flight:
+                write_outcome(in_flight.popleft().result())
 
+        while in_flight:
+            write_outcome(in_flight.popleft().result())
 
-        log_debug(f"Processing batch {i + 1} to {i + len(batch)} of {total}")  # DEBUG
-        
-        payload = [r["json"] for r in batch]
-        payload_str = json.dumps(payload)
 
-        retries = 0
-        retry_delay = 5  # Seconds
+# Sentinel closing pipeline queues
+_END = object()
+
+
+# PEP 484 signature:
+# def stream_batches(records: Iterator[Dict[str, Any]], headers: Dict[str, str], conn: pyodbc.Connection, max_retries: int = 3, max_in_flight: int = MAX_IN_FLIGHT, queue_depth: int = PIPELINE_QUEUE_DEPTH, journal: Optional[SendJournal] = None) -> None:
+@benchmark_section("stream_batches()")  # Performance monitor
+def stream_batches(records, headers, conn, max_retries=3, max_in_flight=MAX_IN_FLIGHT, queue_depth=PIPELINE_QUEUE_DEPTH, journal=None):
+    """
+    Submit payloads as staged pipeline, DB read|send|DB write overlapping
 
-        while retries < max_retries:
+    Stages run concurrently, joined by bounded queues:
+      reader thread   - pulls records (e.g. db.iter_pending_records) and packs batches
+      dispatch thread - hands batches to sender pool (max_in_flight workers)
+      calling thread  - writes outcomes to DB in batch submission order
+    Full queues block upstream stage (backpressure), so at most queue_depth
+    packed batches plus max_in_flight in-flight|unwritten batches are held.
+
+    records is consumed on reader thread, so must not use conn: pass stream
+    from a second connection (pyodbc connections are not shared by threads).
+
+    Args:
+        records: Iterator of records on own DB connection
+        headers: HTTP headers for API call
+        conn: Open database connection for outcome writes
+        max_retries: Retry count before marking as failure
+        max_in_flight: Concurrent batch submissions
+        queue_depth: Packed batches buffered between reader and senders
+        journal: Optional SendJournal, batches journalled around POST, cleared once committed
+    """
+    cursor = conn.cursor()
+    byte_limit = BatchByteLimit()
+    limiter = RateLimiter()
+    max_in_flight = max(1, max_in_flight)
+
+    batches = queue.Queue(maxsize=max(1, queue_depth))   # reader -> dispatch
+    outcomes = queue.Queue(maxsize=max_in_flight)        # dispatch -> writer (futures, in order)
+    stop = threading.Event()
+
+    def put(q, item):
+        # Blocking put that gives up once pipeline is stopping
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for batch in _iter_batches(records, BATCH_SIZE, byte_limit):
+                if not put(batches, batch):
+                    return
+        except Exception as e:
+            put(batches, e)  # Surface to writer via dispatch
+            return
+        put(batches, _END)
+
+    def dispatch(pool):
+        while True:
             try:
-                # Submit batch to API
-                resp = requests.post(API_ENDPOINT_LA, headers=headers, data=payload_str)
-                raw_text = resp.text.strip()
+                batch = batches.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if batch is _END or isinstance(batch, Exception):
+                put(outcomes, batch)
+                return
+            if not put(outcomes, pool.submit(_send_journalled, batch, headers, max_retries, byte_limit, limiter, journal)):
+                return
 
+    sent = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        reader = threading.Thread(target=read, name="pipeline-reader", daemon=True)
+        dispatcher = threading.Thread(target=dispatch, args=(pool,), name="pipeline-dispatch", daemon=True)
+        reader.start()
+        dispatcher.start()
+        try:
+            while True:
+                item = outcomes.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch_id, (successes, failures) = item.result()
+                backend.update_api_results(cursor, successes, failures)
+                conn.commit()
+                if journal is not None:
+                    journal.clear(batch_id)
+                sent += len(successes) + len(failures)
+                metrics.observe("pipeline batches queued", batches.qsize(), unit="")  # Depth, not seconds
+                log_debug(f"Written outcomes for {sent} records")  # DEBUG
+        finally:
+            stop.set()
+            dispatcher.join()
+            reader.join()
+
+
+# PEP 484 signature:
+# def send_batch(batch: List[Dict[str, Any]], headers: Dict[str, str], max_retries: int = 3, byte_limit: Optional[BatchByteLimit] = None, limiter: Optional[RateLimiter] = None, on_outcome: Optional[Callable[[List[Tuple[str, str, datetime, Optional[bytes]]], List[Tuple[str, str]]], None]] = None) -> Tuple[List[Tuple[str, str, datetime, Optional[bytes]]], List[Tuple[str, str]]]:
+@metrics.timed("send_batch()")  # Performance monitor
+def send_batch(batch, headers, max_retries=3, byte_limit=None, limiter=None, on_outcome=None):
+    """
+    POST one batch with retry logic, no DB access (safe to run on worker thread)
+
+    On 413 a multi-record batch is split in half and each half resent, and
+    byte_limit learns the rejected size if body was sent uncompressed;
+    single record 413 is final failure.
+    On 400 (BISECT_ON_400) a multi-record batch is bisected to isolate bad
+    records, so valid records are still sent in same run. Bearer token is
+    taken from auth token cache per attempt (refreshed ahead of expiry) and
+    force refreshed on 401 before retry. With limiter, each attempt waits
+    for a rate slot and 429 pauses all senders for Retry-After. Body is
+    gzipped if enabled (GZIP_REQUESTS); 415, or 400 before gzip is known to
+    work and accepted (200) when resent plain, turns gzip off for run.
+
+    Args:
+        batch: List of records to submit
+        headers: HTTP headers for API call
+        max_retries: Retry count before marking as failure
+        byte_limit: Shared BatchByteLimit to update on 413
+        limiter: Shared RateLimiter pacing all senders
+        on_outcome: Called with (successes, failures) of each request as its
+            response arrives, once per sub-batch when split|bisected
+
+    Returns:
+        (successes, failures) as accepted by db.update_api_results
+    """
+    answered = False  # Outcome final: later exception (e.g. journal write) must not resend|fail batch
+
+    def done(successes, failures):
+        # Final outcome of this request (not of sub-batches, which report their own)
+        nonlocal answered
+        answered = True
+        if on_outcome is not None:
+            on_outcome(successes, failures)
+        return successes, failures
+
+    payload_str = _build_batch_body(batch)
+    data, encoding_headers = encode_body(payload_str)
+    gzip_probe = False  # Resending plain after 400 on unconfirmed gzip
+
+    retries = 0
+    retry_delay = 5  # Seconds
+    stale_auth = None  # Authorization header rejected with 401, refreshed before retry
+
+    while retries < max_retries:
+        try:
+            # Submit batch to API
+            request_headers = _with_current_token(headers, stale_auth=stale_auth)
+            stale_auth = None
+            if encoding_headers:
+                request_headers = {**request_headers, **encoding_headers}
+            if limiter is not None:
+                limiter.acquire(len(data))
+            resp = post(API_ENDPOINT_LA, headers=request_headers, data=data)
+            raw_text = resp.text.strip()
+
+            if encoding_headers:
                 if resp.status_code == 200:
+                    gzip_accepted()
+                elif resp.status_code == 415 or (resp.status_code == 400 and gzip_probe_start()):
+                    # Endpoint may not understand gzip: resend same batch plain
+                    if resp.status_code == 415:
+                        gzip_rejected()
+                    else:
+                        gzip_probe = True
+                    data, encoding_headers = payload_str, {}
+                    continue
+            elif gzip_probe:
+                gzip_probe = False
+                gzip_probe_result(resp.status_code)  # Only plain 200 turns gzip off
+
+            if resp.status_code == 200:
+                try:
+                    # Parse JSON response
+                    response_items = codec.loads(raw_text)
+                except Exception:
+                    # Response invalid or unreadable
+                    print("Failed to parse JSON response. Logging all as failed.")
+                    return done(*_all_failed(batch, f"Invalid JSON response: {raw_text}"))
+
+                if not isinstance(response_items, list):
+                    print("Invalid API response: expected list, got", type(response_items).__name__)
+                    return done(*_all_failed(batch, "Invalid JSON structure from API"))
+
+                if len(response_items) != len(batch):
+                    # Response count mismatch
+                    print(f"Mismatched response count to sent records: expected {len(batch)}, got {len(response_items)}")
+                    return done(*_all_failed(batch, "Response count mismatch"))
+
+                successes = []
+                for rec, item in zip(batch, response_items):
                     try:
-                        # Parse JSON response
-                        response_items = json.loads(raw_text)
-                        if not isinstance(response_items, list):
-                            print("Invalid API response: expected list, got", type(response_items).__name__)
-                            for rec in batch:
-                                update_api_failure(cursor, rec["person_id"], "Invalid JSON structure from API")
-                            conn.commit()
-                            break
+                        # Parse UUID and timestamp
+                        date_part, time_part, uuid = item.split("_")
+                        timestamp = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S.%f")
                     except Exception:
-                        # Response invalid or unreadable
-                        print("Failed to parse JSON response. Logging all as failed.")
-                        for rec in batch:
-                            update_api_failure(cursor, rec["person_id"], f"Invalid JSON response: {raw_text}")
-                        conn.commit()
-                        break
-
-                    if len(response_items) == len(batch):
-                        for rec, item in zip(batch, response_items):
-                            try:
-                                # Parse UUID and timestamp
-                                date_part, time_part, uuid = item.split("_")
-                                timestamp = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S.%f")
-                            except Exception:
-                                # Fallback to partial match and current time
-                                uuid = item.split("_")[-1]
-                                timestamp = datetime.now()
-
-                            update_api_success(cursor, rec["person_id"], uuid, timestamp)
-
-                        conn.commit()
-                        break  # Exit retry loop
+                        # Fallback to partial match and current time
+                        uuid = item.split("_")[-1]
+                        timestamp = datetime.now()
 
-                    else:
-                        # Response count mismatch
-                        print(f"Mismatched response count to sent records: expected {len(batch)}, got {len(response_items)}")
-                        for rec in batch:
-                            update_api_failure(cursor, rec["person_id"], "Response count mismatch")
-                        conn.commit()
-                        break
-
-                else:
-                    status = resp.status_code
-                    detail = resp.text
-
-                    # Map known statuses to explanation
-                    msg_map = {
-                        204: "No content",
-                        400: "Malformed Payload",
-                        401: "Invalid API token",
-                        403: "API access disallowed",
-                        413: "Payload exceeds limit",
-                        429: "Rate limit exceeded"
-                    }
-
-                    api_msg = msg_map.get(status, f"Unexpected Error: {status}")
-                    print(f"API error {status}: {api_msg}")
-                    print("API response (truncated):", detail[:250])
-
-                    retryable = status in [401, 403, 429]
-
-                    if not retryable or retries == max_retries - 1:
-                        # Final failure
-                        handle_batch_failure(cursor, batch, status, api_msg, detail)
-                        conn.commit()
-                        break
-                    else:
-                        # Wait and retry
-                        print(f"Retrying in {retry_delay}s (retry {retries + 1}/{max_retries})...")
-                        time.sleep(retry_delay)
-                        retry_delay = min(30, retry_delay * 2)
-                        retries += 1
-
-            except Exception as e:
-                # Network or unexpected exception
-                print(f"Request failed: {e}")
-                for rec in batch:
-                    update_api_failure(cursor, rec["person_id"], str(e))
-                conn.commit()
-                break
+                    successes.append((rec["person_id"], uuid, timestamp, rec.get("current_hash")))
 
+                metrics.incr("records sent", len(successes))
+                if limiter is not None:
+                    limiter.on_success()
+                return done(successes, [])
 
-# PEP 484 signature:
-# def handle_batch_failure(cursor: pyodbc.Cursor, batch: List[Dict[str, Any]], status_code: int, error_message: str, error_detail: str) -> None:
-@benchmark_section("handle_batch_failure()")  # Performance monitor
-def handle_batch_failure(cursor, batch, status_code, error_message, error_detail):
+            status = resp.status_code
+            detail = resp.text
+
+            if status == 413 and len(batch) > 1:
+                # Too large: learn limit, split and resend halves
+                metrics.incr("batch splits (413)")
+                if byte_limit is not None and not encoding_headers:
+                    # Batches pack on uncompressed size: gzipped body length is no measure of that
+                    byte_limit.shrink(len(payload_str))
+                mid = len(batch) // 2
+                print(f"Payload exceeds limit ({len(data)} bytes sent), splitting batch of {len(batch)}")
+                answered = True
+                return _send_groups([batch[:mid], batch[mid:]], headers, max_retries, byte_limit, limiter, on_outcome)
+
+            if status == 400 and BISECT_ON_400 and len(batch) > 1:
+                # Malformed record(s): isolate by resending subsets
+                metrics.incr("batch bisects (400)")
+                print(f"API error 400: bisecting batch of {len(batch)} to isolate invalid records")
+                answered = True
+                return _send_groups(_bisect_groups(batch, detail), headers, max_retries, byte_limit, limiter, on_outcome)
+
+            api_msg = STATUS_MESSAGES.get(status, f"Unexpected Error: {status}")
+            print(f"API error {status}: {api_msg}")
+            print("API response (truncated):", detail[:250])
+
+            retryable = status in RETRYABLE_STATUSES
+
+            if not retryable or retries == max_retries - 1:
+                # Final failure
+                return done([], batch_failure_messages(batch, status, api_msg, detail))
+
+            metrics.incr(f"batch retries ({status})")
+            retries += 1
+
+            if status == 401:
+                # Expired|revoked token: refresh and retry straight away
+                print(f"Refreshing token and retrying (retry {retries}/{max_retries})...")
+                stale_auth = request_headers.get("Authorization")
+                continue
+
+            if status == 429 and limiter is not None:
+                # Shared pause (Retry-After if given), next acquire() waits it out
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                limiter.on_throttled(retry_after, fallback_delay=retry_delay)
+                print(f"Retrying after rate limit pause (retry {retries}/{max_retries})...")
+                retry_delay = min(30, retry_delay * 2)
+                continue
+
+            # Wait and retry
+            print(f"Retrying in {retry_delay}s (retry {retries}/{max_retries})...")
+            time.sleep(retry_delay)
+            retry_delay = min(30, retry_delay * 2)
+
+        except Exception as e:
+            if answered:
+                raise
+            # Network or unexpected exception
+            print(f"Request failed: {e}")
+            if gzip_probe:
+                gzip_probe_result(None)
+            return done(*_all_failed(batch, str(e)))
+
+    return done([], [])
+
+
+def _send_journalled(batch, headers, max_retries, byte_limit, limiter, journal):
     """
-    Handle API batch failure by logging error messages per record
+    send_batch() with batch journalled before POST and outcome of each
+    request (sub-batch if split|bisected) journalled as its response arrives
+
+    Returns:
+        (journal batch id or None, (successes, failures))
+    """
+    if journal is None:
+        return None, send_batch(batch, headers, max_retries, byte_limit, limiter)
+    batch_id = journal.begin(batch)
+
+    def record_outcome(successes, failures):
+        journal.record_outcome(batch_id, successes, failures)
+
+    return batch_id, send_batch(batch, headers, max_retries, byte_limit, limiter, on_outcome=record_outcome)
+
+
+def _with_current_token(headers, stale_auth=None):
+    """
+    Copy of headers with Authorization from token cache, if auth configured
+
+    stale_auth is Authorization header just rejected (401): token is
+    refreshed unless another sender already replaced it.
+    """
+    if "Authorization" not in headers or not TOKEN_ENDPOINT:
+        return headers
+    stale_token = stale_auth.split(" ", 1)[-1].strip() if stale_auth else None
+    token = get_oauth_token(force_refresh=stale_auth is not None, stale_token=stale_token)
+    if not token:
+        return headers
+    return {**headers, "Authorization": f"Bearer {token.strip()}"}
+
+
+def _send_groups(groups, headers, max_retries, byte_limit, limiter, on_outcome=None):
+    """Send each sub-batch in turn, combining (successes, failures) outcomes"""
+    successes, failures = [], []
+    for group in groups:
+        if group:
+            ok, failed = send_batch(group, headers, max_retries, byte_limit, limiter, on_outcome)
+            successes += ok
+            failures += failed
+    return successes, failures
+
+
+def _bisect_groups(batch, error_detail):
+    """
+    Split 400 rejected batch for resend
+
+    If API detail flags some (not all) record indexes, flagged records are
+    separated from rest so clean records go in one request; otherwise halves.
+
+    Args:
+        batch: Rejected batch
+        error_detail: Raw 400 response detail
+
+    Returns:
+        List of sub-batches
+    """
+    flagged = {int(i) for i in re.findall(r"\[(\d+)\]", error_detail) if int(i) < len(batch)}
+    if flagged and len(flagged) < len(batch):
+        clean = [rec for i, rec in enumerate(batch) if i not in flagged]
+        suspect = [rec for i, rec in enumerate(batch) if i in flagged]
+        return [clean, suspect]
+    mid = len(batch) // 2
+    return [batch[:mid], batch[mid:]]
+
+
+def _build_batch_body(batch):
+    """
+    Build JSON array request body for batch
+
+    Raw passthrough records are joined as stored, skipping a parse and
+    re-serialise per record; parsed records are serialised as before.
+
+    Args:
+        batch: List of records with 'raw' JSON text or parsed 'json'
+
+    Returns:
+        UTF-8 encoded request body
+    """
+    if all("raw" in r for r in batch):
+        return ("[" + ",".join(r["raw"] for r in batch) + "]").encode("utf-8")
+    return codec.dumps_bytes([r["json"] if "json" in r else codec.loads(r["raw"]) for r in batch])
+
+
+def _record_bytes(record):
+    """Approximate serialised size of record in request body"""
+    if "raw" in record:
+        raw = record["raw"]
+        return len(raw) if raw.isascii() else len(raw.encode("utf-8"))
+    return len(codec.dumps_bytes(record["json"]))
+
+
+def _iter_batches(records, size, byte_limit=None):
+    """
+    Yield successive lists of up to size records from list or iterator
+
+    With byte_limit, batches are also closed before serialised body would
+    exceed current limit (an oversize record still goes alone).
+    """
+    it = iter(records)
+    if byte_limit is None:
+        while True:
+            batch = list(islice(it, size))
+            if not batch:
+                return
+            yield batch
+
+    batch = []
+    batch_bytes = 2  # Enclosing []
+    for record in it:
+        rec_bytes = _record_bytes(record) + 1  # Separator
+        if batch and (len(batch) >= size or batch_bytes + rec_bytes > byte_limit.value):
+            yield batch
+            batch = []
+            batch_bytes = 2
+        batch.append(record)
+        batch_bytes += rec_bytes
+    if batch:
+        yield batch
+
+
+def batch_failure_messages(batch, status_code, error_message, error_detail):
+    """
+    Build per-record error messages for failed batch
 
     Args:
-        cursor: Active database cursor
         batch: List of records submitted in batch
         status_code: HTTP status returned by API
         error_message: General API error description
         error_detail: Raw response detail from API
+
+    Returns:
+        List of (person_id, message)
     """
     # Extract failing record indexes from API response
     index_matches = re.findall(r"\[(\d+)\]", error_detail)
     failed_indexes = set(index_matches)
 
+    failures = []
     for i, record in enumerate(batch):
         person_id = record["person_id"]
 
@@ -166,5 +552,29 @@ def handle_batch_failure(cursor, batch, status_code, error_message, error_detail
         else:
             msg = f"API error ({status_code}): {error_message} — Record valid but batch failed"
 
-        update_api_failure(cursor, person_id, msg)
+        failures.append((person_id, msg))
         print(f"Logged API error for person_id {person_id}: {msg}")
+
+    return failures
+
+
+# PEP 484 signature:
+# def handle_batch_failure(cursor: pyodbc.Cursor, batch: List[Dict[str, Any]], status_code: int, error_message: str, error_detail: str) -> None:
+@metrics.timed("handle_batch_failure()")  # Performance monitor
+def handle_batch_failure(cursor, batch, status_code, error_message, error_detail):
+    """
+    Handle API batch failure by logging error messages per record
+
+    Args:
+        cursor: Active database cursor
+        batch: List of records submitted in batch
+        status_code: HTTP status returned by API
+        error_message: General API error description
+        error_detail: Raw response detail from API
+    """
+    backend.update_api_results(cursor, [], batch_failure_messages(batch, status_code, error_message, error_detail))
+
+
+def _all_failed(batch, message):
+    """Outcome marking every record in batch as failed with same message"""
+    return [], [(rec["person_id"], message) for rec in batch]
@@ -1,19 +1,106 @@
 # api_pipeline/auth.py
-import requests
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
 
-from .config import CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT
+from .config import (
+    CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT,
+    TOKEN_REFRESH_MARGIN, TOKEN_CACHE_PATH,
+)
+from .transport import post
 from .utils import log_debug
 
 # # ---- local imports with fallback for notebook/debug use ----
 # try:
-#     from .config import CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT
+#     from .config import CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT, TOKEN_REFRESH_MARGIN, TOKEN_CACHE_PATH
+#     from .transport import post
 #     from .utils import log_debug
 # except ImportError:
-#     from config import CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT
+#     from config import CLIENT_ID, CLIENT_SECRET, SCOPE, TOKEN_ENDPOINT, TOKEN_REFRESH_MARGIN, TOKEN_CACHE_PATH
+#     from transport import post
 #     from utils import log_debug
 
+# --- Optional cryptography support -------------------------------------------
+# Token cache on disk is only ever written encrypted. If cryptography not
+# installed (e.g. minimal EXE), persistence is skipped and tokens stay in memory
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except Exception:
+    Fernet = None
+    InvalidToken = Exception
 
-def get_oauth_token():
+DEFAULT_EXPIRES_IN = 3600  # Seconds, if token response omits expires_in
+MAX_REFRESH_FRACTION = 0.25  # Refresh margin never more than this share of token lifetime
+
+_token_lock = threading.Lock()
+_cached_token = None       # access_token string
+_cached_refresh_at = 0.0   # epoch seconds, refresh proactively from here
+
+
+def get_oauth_token(force_refresh=False, stale_token=None):
+    """
+    Return valid access token, fetching only when needed
+
+    Cached token is reused until refresh margin before expiry (see
+    _refresh_at), then refreshed proactively. With TOKEN_CACHE_PATH set (and
+    cryptography installed) token is also kept in encrypted local cache
+    across CLI runs.
+
+    Args:
+        force_refresh: Ignore cached token, e.g. after 401
+        stale_token: Token that was rejected; with force_refresh, fetch only
+            if cache still holds it, so concurrent senders hitting 401 share
+            one refresh
+
+    Returns:
+        Access token string, or None on failure
+    """
+    global _cached_token, _cached_refresh_at
+
+    with _token_lock:
+        if force_refresh and stale_token is not None and _cached_token and _cached_token.strip() != stale_token.strip():
+            return _cached_token  # Already refreshed by another sender
+
+        if not force_refresh:
+            if _cached_token and time.time() < _cached_refresh_at:
+                return _cached_token
+
+            cached = _load_cached_token()
+            if cached:
+                _cached_token, _cached_refresh_at = cached
+                log_debug("OAuth token loaded from local cache.")
+                return _cached_token
+
+        fetched = _fetch_oauth_token()
+        if fetched is None:
+            return None
+
+        _cached_token, expires_at, _cached_refresh_at = fetched
+        _save_cached_token(_cached_token, expires_at, _cached_refresh_at)
+        return _cached_token
+
+
+def _refresh_at(expires_in):
+    """
+    Epoch seconds to refresh token lasting expires_in seconds
+
+    TOKEN_REFRESH_MARGIN is clamped to MAX_REFRESH_FRACTION of lifetime, so
+    short-lived tokens (expires_in <= margin) are still reused.
+    """
+    margin = min(TOKEN_REFRESH_MARGIN, expires_in * MAX_REFRESH_FRACTION)
+    return time.time() + expires_in - margin
+
+
+def _fetch_oauth_token():
+    """
+    Request new token from TOKEN_ENDPOINT (client_credentials)
+
+    Returns:
+        (access_token, expires_at, refresh_at) or None on failure
+    """
     payload = {
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
@@ -22,14 +109,64 @@ def get_oauth_token():
     }
 
     try:
-        response = requests.post(TOKEN_ENDPOINT, data=payload)
+        response = post(TOKEN_ENDPOINT, data=payload)
         response.raise_for_status()
-        token = response.json()["access_token"]
+        body = response.json()
+        token = body["access_token"]
+        expires_in = float(body.get("expires_in") or DEFAULT_EXPIRES_IN)
         print("OAuth token retrieved.")
-        
-        log_debug(f"TOKEN (first 10 chars): {token[:10]}...")
-        
-        return token
+
+        log_debug(f"TOKEN (first 10 chars): {token[:10]}... expires in {expires_in:.0f}s")
+
+        return token, time.time() + expires_in, _refresh_at(expires_in)
     except Exception as e:
         print(f"OAuth Token Error: {e}")
         return None
+
+
+# --- Encrypted local token cache ---------------------------------------------
+def _cache_cipher():
+    """Fernet keyed from client credentials, or None if persistence unavailable"""
+    if not TOKEN_CACHE_PATH or Fernet is None or not CLIENT_SECRET:
+        return None
+    digest = hashlib.sha256(f"{CLIENT_ID}:{CLIENT_SECRET}:{SCOPE}".encode("utf-8")).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+def _load_cached_token():
+    """
+    Read token from encrypted cache if present, readable and not near expiry
+
+    Returns:
+        (access_token, refresh_at) or None
+    """
+    cipher = _cache_cipher()
+    if cipher is None or not os.path.exists(TOKEN_CACHE_PATH):
+        return None
+    try:
+        with open(TOKEN_CACHE_PATH, "rb") as f:
+            data = json.loads(cipher.decrypt(f.read()))
+    except (OSError, ValueError, InvalidToken):
+        return None  # Unreadable, or written with other credentials
+
+    expires_at = float(data.get("expires_at", 0))
+    refresh_at = float(data.get("refresh_at", expires_at - TOKEN_REFRESH_MARGIN))  # Older cache files lack refresh_at
+    if time.time() >= refresh_at:
+        return None
+    return data["access_token"], refresh_at
+
+
+def _save_cached_token(token, expires_at, refresh_at):
+    """Write token to encrypted cache (owner-only permissions), never raises"""
+    cipher = _cache_cipher()
+    if cipher is None:
+        if TOKEN_CACHE_PATH and Fernet is None:
+            log_debug("TOKEN_CACHE_PATH set but cryptography not installed, token not persisted.")
+        return
+    try:
+        blob = cipher.encrypt(json.dumps({"access_token": token, "expires_at": expires_at, "refresh_at": refresh_at}).encode("utf-8"))
+        fd = os.open(TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+    except OSError as e:
+        log_debug(f"Token cache write failed: {e}")
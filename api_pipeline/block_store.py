@@ -0,0 +1,217 @@
+# api_pipeline/block_store.py
+#
+# Local per-block payload store for incremental partial payloads (SQLite)
+# Per person, keeps each block of payload last diffed, tagged with its staging
+# current_hash. On next change, if staging previous_hash still matches that
+# tag (payload was sent), previous payload is rebuilt from stored blocks and
+# only blocks that moved are decrypted, parsed and diffed (see
+# payload.build_partial_rows); previous_json_payload is not parsed at all.
+# Store is a cache: losing or deleting it only costs full diffs
+#
+# Blocks are child level data, so store is only written encrypted: block
+# bodies and block key lists are AES-GCM sealed (one call per block, cheaper
+# than Fernet at block counts), blocks are compared and looked up by keyed
+# digest. Keys derive from client credentials, as token cache (auth.py);
+# without cryptography or CLIENT_SECRET store is disabled
+
+import hashlib
+import os
+import sqlite3
+
+from . import codec
+from .config import BLOCK_STORE_PATH, CLIENT_ID, CLIENT_SECRET
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from . import codec
+#     from .config import BLOCK_STORE_PATH, CLIENT_ID, CLIENT_SECRET
+# except ImportError:
+#     import codec
+#     from config import BLOCK_STORE_PATH, CLIENT_ID, CLIENT_SECRET
+
+# --- Optional cryptography support -------------------------------------------
+try:
+    from cryptography.exceptions import InvalidTag as InvalidToken
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except Exception:
+    AESGCM = None
+    InvalidToken = Exception
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS docs (
+        person_id       TEXT PRIMARY KEY,
+        doc_hash        BLOB NOT NULL,   -- staging current_hash of payload blocks were taken from
+        block_keys      BLOB NOT NULL    -- encrypted JSON list, block order of payload
+    );
+    CREATE TABLE IF NOT EXISTS blocks (
+        person_id       TEXT NOT NULL,
+        key_digest      BLOB NOT NULL,   -- keyed digest of block key
+        block_digest    BLOB NOT NULL,   -- keyed digest of block compact JSON
+        body            BLOB NOT NULL,   -- encrypted compact JSON of block
+        PRIMARY KEY (person_id, key_digest)
+    ) WITHOUT ROWID;
+"""
+
+# Host parameter limit safe on older SQLite builds
+_LOOKUP_CHUNK = 500
+
+_NONCE_BYTES = 12
+
+_cipher = None   # AESGCM, built once per process (workers included)
+_hasher = None   # Keyed blake2b, copied per digest
+
+
+def _keys():
+    """(AESGCM, keyed blake2b) from client credentials"""
+    global _cipher, _hasher
+    if _cipher is None:
+        secret = f"{CLIENT_ID}:{CLIENT_SECRET}".encode("utf-8")
+        _cipher = AESGCM(hashlib.sha256(b"block-store:" + secret).digest())
+        _hasher = hashlib.blake2b(key=hashlib.sha256(b"block-digest:" + secret).digest(), digest_size=16)
+    return _cipher, _hasher
+
+
+def available():
+    """True if store can be kept encrypted (cryptography installed, CLIENT_SECRET set)"""
+    return AESGCM is not None and bool(CLIENT_SECRET)
+
+
+def digest(data):
+    """Keyed digest of bytes: equal blocks compare equal, short blocks cannot be guessed"""
+    h = _keys()[1].copy()
+    h.update(data)
+    return h.digest()
+
+
+def seal(data):
+    """Encrypt bytes for store, random nonce prepended"""
+    nonce = os.urandom(_NONCE_BYTES)
+    return nonce + _keys()[0].encrypt(nonce, data, None)
+
+
+def unseal(token):
+    """Decrypt stored bytes, InvalidToken if credentials changed since written"""
+    return _keys()[0].decrypt(token[:_NONCE_BYTES], token[_NONCE_BYTES:], None)
+
+
+class BlockStore:
+    """
+    SQLite store of encrypted payload blocks, used from partial payload collector only
+
+    synchronous=NORMAL: entry lost in crash is rebuilt by full diff next run.
+    """
+
+    def __init__(self, path=BLOCK_STORE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(blocks)")]
+        if columns and "body" in columns and "key_digest" not in columns:
+            # Store written before encryption: drop plaintext blocks, free pages scrubbed
+            print("Block store holds unencrypted blocks, clearing (full diffs this run)")
+            self._conn.executescript("DROP TABLE blocks; DROP TABLE docs;")
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.executescript(_SCHEMA)
+
+    def _select(self, sql, person_ids):
+        for i in range(0, len(person_ids), _LOOKUP_CHUNK):
+            part = person_ids[i:i + _LOOKUP_CHUNK]
+            yield from self._conn.execute(sql.format(",".join("?" * len(part))), part)
+
+    def lookup(self, prev_hashes):
+        """
+        Stored blocks of persons whose last diffed payload is staging previous payload
+
+        Args:
+            prev_hashes: Dict of person_id -> staging previous_hash (bytes)
+
+        Returns:
+            Dict of person_id -> (block keys, {block_key: (block digest,
+            encrypted body)}), only where stored doc hash equals
+            previous_hash and all blocks present
+        """
+        by_key = {str(pid): pid for pid in prev_hashes}
+        keys = {}
+        for pid, doc_hash, block_keys in self._select(
+            "SELECT person_id, doc_hash, block_keys FROM docs WHERE person_id IN ({})", list(by_key)
+        ):
+            if doc_hash == prev_hashes[by_key[pid]]:
+                try:
+                    keys[pid] = codec.loads(unseal(block_keys))
+                except InvalidToken:
+                    continue  # Written under other credentials: full diff
+
+        key_names = {pid: {digest(k.encode("utf-8")): k for k in block_keys} for pid, block_keys in keys.items()}
+        blocks = {pid: {} for pid in keys}
+        for pid, key_digest, block_digest, body in self._select(
+            "SELECT person_id, key_digest, block_digest, body FROM blocks WHERE person_id IN ({})", list(keys)
+        ):
+            key = key_names[pid].get(key_digest)
+            if key is not None:
+                blocks[pid][key] = (block_digest, body)
+
+        return {
+            by_key[pid]: (block_keys, blocks[pid])
+            for pid, block_keys in keys.items()
+            if all(k in blocks[pid] for k in block_keys)
+        }
+
+    def save(self, items):
+        """
+        Store blocks of payloads just diffed, one transaction
+
+        Args:
+            items: List of (person_id, current_hash, (block keys, changed
+                blocks as {key: (block digest, encrypted body)}, removed
+                block keys or None to replace all blocks))
+        """
+        if not items:
+            return
+        docs, upserts, removals, replaced = [], [], [], []
+        for pid, doc_hash, (block_keys, changed, removed) in items:
+            pid = str(pid)
+            docs.append((pid, doc_hash, seal(codec.dumps_bytes(block_keys))))
+            upserts += [(pid, digest(key.encode("utf-8")), d, body) for key, (d, body) in changed.items()]
+            if removed is None:
+                replaced.append((pid,))
+            else:
+                removals += [(pid, digest(key.encode("utf-8"))) for key in removed]
+
+        with self._conn:
+            self._conn.executemany("DELETE FROM blocks WHERE person_id = ?", replaced)
+            self._conn.executemany("DELETE FROM blocks WHERE person_id = ? AND key_digest = ?", removals)
+            self._conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?)", upserts)
+            self._conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", docs)
+
+    def drop(self, person_ids):
+        """Forget persons (deleted records)"""
+        rows = [(str(pid),) for pid in person_ids]
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM blocks WHERE person_id = ?", rows)
+            self._conn.executemany("DELETE FROM docs WHERE person_id = ?", rows)
+
+    def close(self):
+        self._conn.close()
+
+
+def open_block_store():
+    """
+    Open block store if BLOCK_STORE_PATH configured
+
+    Returns:
+        BlockStore, or None if disabled, store cannot be encrypted, or store unusable
+    """
+    if not BLOCK_STORE_PATH:
+        return None
+    if not available():
+        print("Block store needs cryptography and CLIENT_SECRET (blocks kept encrypted), diffing full payloads")
+        return None
+    try:
+        return BlockStore(BLOCK_STORE_PATH)
+    except sqlite3.Error as e:
+        print(f"Block store unavailable ({e}), diffing full payloads")
+        return None
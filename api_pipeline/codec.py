@@ -0,0 +1,126 @@
+# api_pipeline/codec.py
+#
+# Single JSON codec for hot paths (staging payload parse, partial payload
+# serialise, batch body build). Uses accelerated backend if installed
+# (orjson, then ujson) else stdlib json, with same output everywhere:
+# compact separators, non-ASCII kept as UTF-8, key order preserved.
+# NaN|Infinity read by loads() round trip as NaN|Infinity on all backends;
+# non-finite floats built in Python (not parsed) are written as null by orjson
+
+import json
+
+from .config import JSON_BACKEND
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from .config import JSON_BACKEND
+# except ImportError:
+#     from config import JSON_BACKEND
+
+# --- Optional accelerated backends -------------------------------------------
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import ujson
+except Exception:
+    ujson = None
+
+_SEPARATORS = (",", ":")
+
+
+def _select_backend(requested):
+    """
+    Resolve backend name from JSON_BACKEND setting
+
+    Args:
+        requested: 'auto', 'orjson', 'ujson' or 'stdlib'
+
+    Returns:
+        Backend name actually available
+    """
+    available = {"orjson": orjson is not None, "ujson": ujson is not None, "stdlib": True}
+    if requested in available and available[requested]:
+        return requested
+    if requested not in ("auto", "") and requested not in available:
+        print(f"Unknown JSON_BACKEND '{requested}', using auto")
+    elif requested not in ("auto", ""):
+        print(f"JSON_BACKEND '{requested}' not installed, using auto")
+    for name in ("orjson", "ujson"):
+        if available[name]:
+            return name
+    return "stdlib"
+
+
+BACKEND = _select_backend(JSON_BACKEND)
+
+
+# --- stdlib ------------------------------------------------------------------
+def _std_loads(data):
+    return json.loads(data)
+
+
+def _std_dumps(obj):
+    return json.dumps(obj, separators=_SEPARATORS, ensure_ascii=False)
+
+
+def _std_dumps_bytes(obj):
+    return _std_dumps(obj).encode("utf-8")
+
+
+# --- orjson (bytes native, falls back to stdlib for values it rejects) --------
+class _NonFinite(float):
+    """
+    NaN|Infinity parsed by stdlib fallback. orjson would write these as null;
+    it rejects float subclasses, so dumps falls back to stdlib (NaN kept)
+    """
+    __slots__ = ()
+
+
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # NaN|Infinity (tagged, see _NonFinite), or raise stdlib error for bad JSON
+        return json.loads(data, parse_constant=_NonFinite)
+
+
+def _orjson_dumps_bytes(obj):
+    try:
+        return orjson.dumps(obj)
+    except TypeError:
+        return _std_dumps(obj).encode("utf-8")  # e.g. int beyond 64 bit, NaN from loads()
+
+
+def _orjson_dumps(obj):
+    return _orjson_dumps_bytes(obj).decode("utf-8")
+
+
+# --- ujson -------------------------------------------------------------------
+def _ujson_loads(data):
+    try:
+        return ujson.loads(data)
+    except ValueError:
+        return json.loads(data)  # Raise stdlib error for consistent messages
+
+
+def _ujson_dumps(obj):
+    try:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+    except (OverflowError, TypeError):
+        return _std_dumps(obj)
+
+
+def _ujson_dumps_bytes(obj):
+    return _ujson_dumps(obj).encode("utf-8")
+
+
+# --- Public API: loads(str|bytes), dumps(obj) -> str, dumps_bytes(obj) -> bytes ---
+if BACKEND == "orjson":
+    loads, dumps, dumps_bytes = _orjson_loads, _orjson_dumps, _orjson_dumps_bytes
+elif BACKEND == "ujson":
+    loads, dumps, dumps_bytes = _ujson_loads, _ujson_dumps, _ujson_dumps_bytes
+else:
+    loads, dumps, dumps_bytes = _std_loads, _std_dumps, _std_dumps_bytes
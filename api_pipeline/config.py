@@ -13,6 +13,9 @@ USE_PARTIAL_PAYLOAD = os.getenv("USE_PARTIAL_PAYLOAD", "true").strip().lower() =
 # -- debug|verbose mode set in .env
 DEBUG = os.getenv("DEBUG", "false").strip().lower() == "true"
 
+# -- opt-in tracemalloc peak for whole run (heavy, dev only)
+TRACE_MEMORY = os.getenv("TRACE_MEMORY", "false").strip().lower() == "true"
+
 
 
 
@@ -32,13 +35,45 @@ else:
 
 API_ENDPOINT_LA = f"{API_ENDPOINT}/children_social_care_data/{LA_CODE}/children"
 
+# --- Staging table storage backend ---
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlserver").strip().lower()  # sqlserver | postgres | sqlite (offline benchmarks)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "csc_api_staging.sqlite3").strip()  # staging db file when DB_BACKEND=sqlite
+PG_CONN_STR = os.getenv("PG_CONN_STR", "").strip()  # libpq DSN|URI when DB_BACKEND=postgres, e.g. host=... dbname=... user=...
+
 # --- Other config ---
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 SCOPE = os.getenv("SCOPE")
 TOKEN_ENDPOINT = os.getenv("TOKEN_ENDPOINT")
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", 300))  # seconds before expiry to refresh, capped at 1/4 of token lifetime
+TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH", "").strip()  # optional encrypted token cache file
+SEND_JOURNAL_PATH = os.getenv("SEND_JOURNAL_PATH", "").strip()  # optional SQLite send journal for crash recovery (resume)
 SUPPLIER_KEY = os.getenv("SUPPLIER_KEY")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 100))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", 5 * 1024 * 1024))  # request body ceiling, lowered on 413
+
+# --- HTTP transport (shared keep-alive session) ---
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 120))  # seconds
+GZIP_REQUESTS = os.getenv("GZIP_REQUESTS", "false").strip().lower() == "true"  # Content-Encoding: gzip batch bodies
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))  # 1 (fast) - 9 (small)
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", 1024))  # smaller bodies sent plain
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 1))  # concurrent batch submissions, 1 = sequential
+BISECT_ON_400 = os.getenv("BISECT_ON_400", "false").strip().lower() == "true"  # isolate bad records in 400 rejected batches
+API_MAX_RPS = float(os.getenv("API_MAX_RPS", 0))  # client side requests/sec ceiling, 0 = unlimited
+API_MAX_BYTES_PER_SEC = float(os.getenv("API_MAX_BYTES_PER_SEC", 0))  # client side upload bytes/sec ceiling, 0 = unlimited
+
+PARTIAL_COMMIT_SIZE = int(os.getenv("PARTIAL_COMMIT_SIZE", 5000))  # partial_json_payload rows per bulk write|commit
+PARTIAL_WORKERS = int(os.getenv("PARTIAL_WORKERS", 1))  # processes generating partial payloads, 1 = in-process, 0 = all cores
+BLOCK_STORE_PATH = os.getenv("BLOCK_STORE_PATH", "").strip()  # optional encrypted SQLite per-block payload store, re-parse|diff only blocks that moved
+STREAM_PENDING_RECORDS = os.getenv("STREAM_PENDING_RECORDS", "false").strip().lower() == "true"  # page pending rows, bounded memory
+PENDING_PAGE_SIZE = int(os.getenv("PENDING_PAGE_SIZE", 5000))  # pending rows per keyset page (one query each), independent of BATCH_SIZE
+PIPELINE_STREAMING = os.getenv("PIPELINE_STREAMING", "false").strip().lower() == "true"  # overlap DB read, send, DB write (second DB connection)
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", 4))  # packed batches buffered between reader and senders
+RAW_PAYLOAD_PASSTHROUGH = os.getenv("RAW_PAYLOAD_PASSTHROUGH", "false").strip().lower() == "true"  # send stored JSON text without parse|re-serialise
+RAW_PAYLOAD_VALIDATE = os.getenv("RAW_PAYLOAD_VALIDATE", "false").strip().lower() == "true"  # full parse check of raw payloads
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").strip().lower()  # auto|orjson|ujson|stdlib, auto = fastest installed
 
 
 
@@ -1,19 +1,78 @@
-import json
+import pyodbc
 
-from .config import TABLE_NAME, USE_PARTIAL_PAYLOAD
-from .payload import generate_partial_payload, generate_deletion_payload
+from . import metrics
+from .config import (
+    SQL_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE,
+)
+from .payload import collect_partial_updates, print_partial_stats, to_send_record
 from .utils import benchmark_section
 
 # # ---- local imports with fallback for notebook/debug use ----
 # try:
-#     from .config import TABLE_NAME, USE_PARTIAL_PAYLOAD
-#     from .payload import generate_partial_payload, generate_deletion_payload
+#     from . import metrics
+#     from .config import SQL_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE
+#     from .payload import collect_partial_updates, print_partial_stats, to_send_record
 #     from .utils import benchmark_section
 # except ImportError:
-#     from config import TABLE_NAME, USE_PARTIAL_PAYLOAD
-#     from payload import generate_partial_payload, generate_deletion_payload
+#     import metrics
+#     from config import SQL_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE
+#     from payload import collect_partial_updates, print_partial_stats, to_send_record
 #     from utils import benchmark_section
 
+# Session temp tables for set-based writes (see update_api_results, write_partial_payloads)
+_RESULTS_TEMP_TABLE = "#api_results"
+_PARTIALS_TEMP_TABLE = "#partial_payloads"
+
+# Cleared on first failed temp table load, later batches go straight to row updates
+_bulk_results_available = True
+
+
+def _load_temp_table(cursor, temp_table, columns_ddl, rows, input_sizes=None):
+    """
+    Create (first use on connection) or truncate session temp table, then
+    bulk load rows with fast_executemany
+
+    Args:
+        cursor: Active database cursor
+        temp_table: Temp table name, '#' prefixed
+        columns_ddl: Column definitions for CREATE TABLE
+        rows: Sequence of parameter tuples, one per row
+        input_sizes: Optional pyodbc setinputsizes() list, e.g. for (MAX) columns
+    """
+    cursor.execute(f"""
+        IF OBJECT_ID('tempdb..{temp_table}') IS NULL
+            CREATE TABLE {temp_table} ({columns_ddl})
+        ELSE
+            TRUNCATE TABLE {temp_table}
+    """)
+
+    placeholders = ", ".join("?" for _ in rows[0])
+    cursor.fast_executemany = True
+    try:
+        if input_sizes:
+            cursor.setinputsizes(input_sizes)
+        cursor.executemany(f"INSERT INTO {temp_table} VALUES ({placeholders})", rows)
+    finally:
+        cursor.fast_executemany = False
+        if input_sizes:
+            cursor.setinputsizes(None)
+
+
+# ---- CONNECTION ----
+# PEP 484 signature:
+# def connect(timeout: int = 10) -> pyodbc.Connection:
+def connect(timeout=10):
+    """
+    Open SQL Server connection from SQL_CONN_STR
+
+    Args:
+        timeout: Login timeout in seconds
+
+    Returns:
+        pyodbc.Connection
+    """
+    return pyodbc.connect(SQL_CONN_STR, timeout=timeout)
+
 
 # ---- DATA ----
 # PEP 484 signature:
@@ -23,86 +82,109 @@ def update_partial_payloads(conn):
     """
     Update table with generated partial JSON payloads
 
+    Change detection is hash-first: rows whose current_hash equals
+    previous_hash are filtered out server side, so payloads are only
+    transferred for rows that really changed. Deleted rows only need
+    previous payload, so current payload is not fetched for them.
+    Payload generation runs across PARTIAL_WORKERS processes if set.
+
     Args:
         conn: Open database connection
     """
     cursor = conn.cursor()
 
-    # Select rows with both current, previous JSON
+    # Select changed rows with both current, previous JSON
     cursor.execute(f"""
-        SELECT person_id, row_state, json_payload, previous_json_payload 
+        SELECT
+            person_id,
+            row_state,
+            CASE WHEN row_state = 'deleted' THEN NULL ELSE json_payload END,
+            previous_json_payload,
+            current_hash,
+            previous_hash  -- Block store entry check (BLOCK_STORE_PATH)
         FROM {TABLE_NAME}
         WHERE 
             json_payload IS NOT NULL
             AND previous_json_payload IS NOT NULL
             AND row_state <> 'unchanged'
+            AND (
+                row_state = 'deleted'
+                OR current_hash IS NULL
+                OR previous_hash IS NULL
+                OR current_hash <> previous_hash
+            )
     """)
 
-    updates = []
+    updates, counts = collect_partial_updates(_iter_rows(cursor), PARTIAL_WORKERS)
 
-    # ---- DIAGNOSTIC COUNTERS ----
-    total_checked = 0
-    skipped_due_to_state = 0
-    skipped_due_to_equal_json = 0
-    new_record_count = 0
-    deletion_count = 0
-    delta_count = 0
-    error_count = 0
+    # Apply updates to database
+    write_partial_payloads(conn, updates)
+    print(f"Updated {len(updates)} partial_json_payload records")
 
-    # ---------------------------------------
+    print_partial_stats(counts)
 
-    for person_id, row_state, curr_raw, prev_raw in cursor.fetchall():
-        total_checked += 1
-        try:
-            # ---- EARLY EXIT: skip if new or unchanged ----
-            if row_state.lower() == "unchanged":
-                skipped_due_to_state += 1
-                continue
 
-            # ---- EARLY EXIT: skip if identical JSON strings ----
-            if curr_raw == prev_raw:
-                skipped_due_to_equal_json += 1
-                continue
 
-            curr = json.loads(curr_raw)  # Parse current JSON
-            prev = json.loads(prev_raw)  # Parse previous JSON
+def _iter_rows(cursor, size=PARTIAL_COMMIT_SIZE):
+    """Iterate executed cursor in fetchmany() chunks, not one fetchall() list"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
 
-            # Generate appropriate payload by row state
-            if row_state.lower() == "deleted":
-                partial = generate_deletion_payload(prev)
-                deletion_count += 1
-            else:
-                partial = generate_partial_payload(curr, prev)
-                delta_count += 1
+# PEP 484 signature:
+# def write_partial_payloads(conn: pyodbc.Connection, updates: List[Tuple[str, str]], commit_size: int = PARTIAL_COMMIT_SIZE) -> None:
+@metrics.timed("write_partial_payloads()")  # Performance monitor
+def write_partial_payloads(conn, updates, commit_size=PARTIAL_COMMIT_SIZE):
+    """
+    Bulk write partial JSON payloads, committing every commit_size rows
 
-            # Serialise partial and escape quotes for SQL
-            json_out = json.dumps(partial, separators=(',', ':'), ensure_ascii=False).replace("'", "''")
-            updates.append((json_out, person_id))
+    Each chunk is bulk loaded into session temp table and applied with one
+    UPDATE...JOIN. Falls back to executemany UPDATE if temp table unavailable.
 
-        except Exception as e:
-            print(f"Error for {person_id}: {e}")
-            error_count += 1
+    Args:
+        conn: Open database connection
+        updates: List of (person_id, partial_json) tuples
+        commit_size: Rows per chunk|commit
+    """
+    cursor = conn.cursor()
+    use_temp_table = True
+
+    for i in range(0, len(updates), commit_size):
+        chunk = updates[i:i + commit_size]
+
+        if use_temp_table:
+            try:
+                _load_temp_table(
+                    cursor,
+                    _PARTIALS_TEMP_TABLE,
+                    "person_id NVARCHAR(48) NOT NULL, partial_json_payload NVARCHAR(MAX) NULL",
+                    chunk,
+                    input_sizes=[(pyodbc.SQL_WVARCHAR, 48, 0), (pyodbc.SQL_WLONGVARCHAR, 0, 0)],
+                )
+                cursor.execute(f"""
+                    UPDATE t
+                    SET partial_json_payload = p.partial_json_payload
+                    FROM {TABLE_NAME} t
+                    JOIN {_PARTIALS_TEMP_TABLE} p ON p.person_id = t.person_id
+                """)
+                conn.commit()
+                metrics.incr("partial payload rows written", len(chunk))
+                continue
+            except pyodbc.Error as e:
+                conn.rollback()
+                print(f"Bulk partial payload write unavailable ({e}), falling back to executemany")
+                use_temp_table = False
 
-    # Apply updates to database
-    for json_out, pid in updates:
-        cursor.execute(f"""
+        cursor.executemany(f"""
             UPDATE {TABLE_NAME}
             SET partial_json_payload = ?
             WHERE person_id = ?
-        """, json_out, pid)
-
-    conn.commit()
-    print(f"Updated {len(updates)} partial_json_payload records")
-
-    # ---- DIAGNOSTIC OUTPUT ----
-    print(f"[DIAG] Checked: {total_checked}")
-    print(f"[DIAG] Skipped (state): {skipped_due_to_state}")
-    print(f"[DIAG] Skipped (identical JSON): {skipped_due_to_equal_json}")
-    print(f"[DIAG] Deleted payloads: {deletion_count}")
-    print(f"[DIAG] Delta payloads: {delta_count}")
-    print(f"[DIAG] Errors: {error_count}")
-    # --------------------------------------
-
+        """, [(json_out, pid) for pid, json_out in chunk])
+        conn.commit()
+        metrics.incr("partial payload rows written", len(chunk))
 
 
 # PEP 484 signature:
@@ -116,13 +198,13 @@ def get_pending_records(cursor):
         cursor: Active database cursor
 
     Returns:
-        List of records with parsed JSON payload.
+        List of records with parsed (or raw passthrough) JSON payload.
     """
     col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
 
     # Select valid rows by status and payload content
     cursor.execute(f"""
-        SELECT person_id, {col}
+        SELECT person_id, {col}, current_hash
         FROM {TABLE_NAME}
         WHERE submission_status IN ('pending', 'error')
         AND {col} IS NOT NULL AND LTRIM(RTRIM({col})) <> ''
@@ -130,24 +212,72 @@ def get_pending_records(cursor):
 
     results = []
 
-    for pid, payload in cursor.fetchall():
-        try:
-            results.append({
-                "person_id": pid,
-                "json": json.loads(payload)  # Parse JSON safely
-            })
-        except:
-            print(f"Skipping invalid JSON for person_id {pid}")
+    for pid, payload, current_hash in cursor.fetchall():
+        record = to_send_record(pid, payload, current_hash)
+        if record is not None:
+            results.append(record)
 
     return results
 
 
+# PEP 484 signature:
+# def iter_pending_records(conn: pyodbc.Connection, page_size: int = PENDING_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+def iter_pending_records(conn, page_size=PENDING_PAGE_SIZE):
+    """
+    Stream pending/error records with non-empty payload, page by page
+
+    Keyset paged on person_id: each page is fully fetched before records are
+    yielded, so no result set is left open (holding locks) while caller
+    writes outcomes, on same or second connection. Peak memory bounded by
+    page_size, not cohort size. Each page is one query, so page_size is
+    large and independent of BATCH_SIZE, and person_id must be indexed
+    (IX_ssd_api_data_staging_person, created by populate scripts), else
+    every page rescans table.
+
+    Args:
+        conn: Open database connection
+        page_size: Rows fetched per round trip (defaults to PENDING_PAGE_SIZE)
+
+    Yields:
+        Record dicts with 'person_id' and payload (see payload.to_send_record)
+    """
+    col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
+    cursor = conn.cursor()
+
+    select_sql = f"""
+        SELECT TOP (?) person_id, {col}, current_hash
+        FROM {TABLE_NAME}
+        WHERE submission_status IN ('pending', 'error')
+        AND {col} IS NOT NULL AND LTRIM(RTRIM({col})) <> ''
+        {{keyset}}
+        ORDER BY person_id
+    """
+
+    last_pid = None
+    while True:
+        if last_pid is None:
+            cursor.execute(select_sql.format(keyset=""), page_size)
+        else:
+            cursor.execute(select_sql.format(keyset="AND person_id > ?"), page_size, last_pid)
+        rows = cursor.fetchall()
+        metrics.incr("pending pages fetched")
+
+        for pid, payload, current_hash in rows:
+            record = to_send_record(pid, payload, current_hash)
+            if record is not None:
+                yield record
+
+        if len(rows) < page_size:
+            return
+        last_pid = rows[-1][0]
+
+
 
 # ---- DB UPDATES ----
 # PEP 484 signature:
-# def update_api_success(cursor: pyodbc.Cursor, person_id: str, uuid: str, timestamp: str) -> None:
-@benchmark_section("update_api_success()")  # Performance monitor
-def update_api_success(cursor, person_id, uuid, timestamp):
+# def update_api_success(cursor: pyodbc.Cursor, person_id: str, uuid: str, timestamp: str, current_hash: Optional[bytes] = None) -> None:
+@metrics.timed("update_api_success()")  # Performance monitor
+def update_api_success(cursor, person_id, uuid, timestamp, current_hash=None):
     """
     Mark record as sent with API response and timestamp
 
@@ -156,6 +286,7 @@ def update_api_success(cursor, person_id, uuid, timestamp):
         person_id: Person identifier
         uuid: API response reference
         timestamp: Submission timestamp
+        current_hash: Hash of payload sent; row left pending if it no longer matches
     """
     cursor.execute(f"""
         UPDATE {TABLE_NAME}
@@ -166,13 +297,14 @@ def update_api_success(cursor, person_id, uuid, timestamp):
             previous_json_payload=json_payload,
             row_state='unchanged'
         WHERE person_id = ?
-    """, uuid, timestamp, person_id)
+        AND (? IS NULL OR current_hash = ?)
+    """, uuid, timestamp, person_id, current_hash, current_hash)
 
 
 
 # PEP 484 signature:
 # def update_api_failure(cursor: pyodbc.Cursor, person_id: str, message: str) -> None:
-@benchmark_section("update_api_failure()")  # Performance monitor
+@metrics.timed("update_api_failure()")  # Performance monitor
 def update_api_failure(cursor, person_id, message):
     """
     Mark record as failed, store API error message
@@ -189,3 +321,89 @@ def update_api_failure(cursor, person_id, message):
         WHERE person_id = ?
     """, message[:500], person_id)  # Truncate to max allowed size
 
+
+
+# PEP 484 signature:
+# def update_api_results(cursor: pyodbc.Cursor, successes: List[Tuple[str, str, datetime, Optional[bytes]]], failures: List[Tuple[str, str]]) -> None:
+@metrics.timed("update_api_results()")  # Performance monitor
+def update_api_results(cursor, successes, failures):
+    """
+    Apply whole batch of API outcomes in set-based statements
+
+    Outcomes are bulk loaded (fast_executemany) into session temp table, then
+    applied with one joined UPDATE per status, so DB cost per batch is O(1)
+    round trips rather than one UPDATE per record. Falls back to row by row
+    updates if temp table cannot be used (e.g. restricted permissions), and
+    remembers that for rest of run. Timestamps load as DATETIME2 with
+    explicit input sizes: microsecond datetimes overflow DATETIME under
+    fast_executemany (22008). A success only marks row sent while row
+    current_hash still equals hash of payload sent (None: unchecked); row
+    repopulated since keeps its new payload pending.
+
+    Args:
+        cursor: Active database cursor
+        successes: List of (person_id, uuid, timestamp, current_hash) for accepted records
+        failures: List of (person_id, message) for failed records
+    """
+    rows = [(pid, "sent", uuid, ts, current_hash) for pid, uuid, ts, current_hash in successes]
+    rows += [(pid, "error", (msg or "")[:500], None, None) for pid, msg in failures]  # Truncate to max allowed size
+    if not rows:
+        return
+
+    global _bulk_results_available
+    if _bulk_results_available:
+        try:
+            _load_temp_table(
+                cursor,
+                _RESULTS_TEMP_TABLE,
+                """
+                    person_id               NVARCHAR(48) NOT NULL,
+                    submission_status       NVARCHAR(50) NOT NULL,
+                    api_response            NVARCHAR(500) NULL,
+                    submission_timestamp    DATETIME2(7) NULL,
+                    current_hash            BINARY(32) NULL
+                """,
+                rows,
+                input_sizes=[
+                    (pyodbc.SQL_WVARCHAR, 48, 0),
+                    (pyodbc.SQL_WVARCHAR, 50, 0),
+                    (pyodbc.SQL_WVARCHAR, 500, 0),
+                    (pyodbc.SQL_TYPE_TIMESTAMP, 27, 7),
+                    (pyodbc.SQL_BINARY, 32, 0),
+                ],
+            )
+        except pyodbc.Error as e:
+            print(f"Bulk status update unavailable ({e}), falling back to row updates for rest of run")
+            _bulk_results_available = False
+
+    if not _bulk_results_available:
+        for pid, uuid, ts, current_hash in successes:
+            update_api_success(cursor, pid, uuid, ts, current_hash)
+        for pid, msg in failures:
+            update_api_failure(cursor, pid, msg)
+        return
+
+    if successes:
+        cursor.execute(f"""
+            UPDATE t
+            SET submission_status='sent',
+                api_response=r.api_response,
+                submission_timestamp=r.submission_timestamp,
+                previous_hash=t.current_hash,
+                previous_json_payload=t.json_payload,
+                row_state='unchanged'
+            FROM {TABLE_NAME} t
+            JOIN {_RESULTS_TEMP_TABLE} r ON r.person_id = t.person_id
+            WHERE r.submission_status = 'sent'
+            AND (r.current_hash IS NULL OR t.current_hash = r.current_hash)
+        """)
+
+    if failures:
+        cursor.execute(f"""
+            UPDATE t
+            SET submission_status='error',
+                api_response=r.api_response
+            FROM {TABLE_NAME} t
+            JOIN {_RESULTS_TEMP_TABLE} r ON r.person_id = t.person_id
+            WHERE r.submission_status = 'error'
+        """)
@@ -0,0 +1,335 @@
+# api_pipeline/db_postgres.py
+#
+# PostgreSQL storage backend (DB_BACKEND=postgres) for staging table built by
+# build_dfe_payload_staging/ALPHA/populate_ssd_api_data_staging_postgres.sql
+# (jsonb payloads, bytea hashes). Same functions as db.py
+#   - reads stream through server-side (named) cursors
+#   - partial payloads bulk loaded with COPY into temp table, one joined UPDATE
+#   - API outcomes applied with execute_values, one UPDATE...FROM VALUES per status
+# Table is append-only (populate script inserts a row per changed payload), so
+# person_id is not unique: only latest row per person (highest id) is read,
+# and writes are keyed on id, leaving earlier rows as history
+# Requires psycopg2 (pip install .[postgres])
+
+import csv
+import io
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from . import metrics
+from .config import PG_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE
+from .payload import collect_partial_updates, print_partial_stats, to_send_record
+from .utils import benchmark_section
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from . import metrics
+#     from .config import PG_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE
+#     from .payload import collect_partial_updates, print_partial_stats, to_send_record
+#     from .utils import benchmark_section
+# except ImportError:
+#     import metrics
+#     from config import PG_CONN_STR, TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE
+#     from payload import collect_partial_updates, print_partial_stats, to_send_record
+#     from utils import benchmark_section
+
+# Session temp table for COPY loaded partial payloads (see write_partial_payloads)
+_PARTIALS_TEMP_TABLE = "tmp_partial_payloads"
+
+# Postgres script writes 'Pending'|'New'|'Updated'..., comparisons are case-insensitive as on SQL Server
+_PENDING_FILTER = "lower(submission_status) IN ('pending', 'error')"
+
+# Join restricting table (aliased t) to latest row per person, filters apply after
+_LATEST_ROWS = f"""
+    JOIN (
+        SELECT DISTINCT ON (person_id) id
+        FROM {TABLE_NAME}
+        ORDER BY person_id, id DESC
+    ) AS latest USING (id)
+"""
+
+# Id of latest row of each person in VALUES list v, for writes keyed on id
+_LATEST_OF_VALUES = f"""
+    CROSS JOIN LATERAL (
+        SELECT max(s.id) AS id FROM {TABLE_NAME} AS s WHERE s.person_id = v.person_id
+    ) AS latest
+"""
+
+
+# ---- CONNECTION ----
+# PEP 484 signature:
+# def connect(timeout: int = 10) -> psycopg2.extensions.connection:
+def connect(timeout=10):
+    """
+    Open PostgreSQL connection from PG_CONN_STR
+
+    Args:
+        timeout: Connect timeout in seconds
+
+    Returns:
+        psycopg2 connection
+    """
+    return psycopg2.connect(PG_CONN_STR, connect_timeout=timeout)
+
+
+# ---- DATA ----
+# PEP 484 signature:
+# def update_partial_payloads(conn: psycopg2.extensions.connection) -> None:
+@benchmark_section("update_partial_payloads()")
+def update_partial_payloads(conn):
+    """
+    Update table with generated partial JSON payloads
+
+    Hash-first change detection as db.update_partial_payloads, on latest row
+    per person only. Candidate rows stream from server-side cursor; jsonb is
+    read as text so payloads are parsed once, by payload codec, not by driver.
+
+    Args:
+        conn: Open database connection
+    """
+    cursor = conn.cursor(name="partial_payload_candidates")
+    cursor.itersize = PARTIAL_COMMIT_SIZE
+
+    # Select changed rows with both current, previous JSON
+    cursor.execute(f"""
+        SELECT
+            t.id,
+            person_id,
+            row_state,
+            CASE WHEN lower(row_state) = 'deleted' THEN NULL ELSE json_payload::text END,
+            previous_json_payload::text,
+            current_hash,
+            previous_hash  -- Block store entry check (BLOCK_STORE_PATH)
+        FROM {TABLE_NAME} AS t
+        {_LATEST_ROWS}
+        WHERE
+            json_payload IS NOT NULL
+            AND previous_json_payload IS NOT NULL
+            AND lower(row_state) <> 'unchanged'
+            AND (
+                lower(row_state) = 'deleted'
+                OR current_hash IS NULL
+                OR previous_hash IS NULL
+                OR current_hash <> previous_hash
+            )
+    """)
+
+    row_ids = {}  # person_id -> id of row read, partials are written by id
+
+    def rows():
+        for row_id, *row in cursor:
+            row_ids[row[0]] = row_id
+            yield row
+
+    try:
+        updates, counts = collect_partial_updates(rows(), PARTIAL_WORKERS)
+    finally:
+        cursor.close()  # Named cursor must close before write_partial_payloads() commits
+
+    # Apply updates to database
+    write_partial_payloads(conn, [(row_ids[pid], partial) for pid, partial in updates])
+    print(f"Updated {len(updates)} partial_json_payload records")
+
+    print_partial_stats(counts)
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """COPY rows into table via CSV stream (handles quotes|newlines in JSON)"""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+# PEP 484 signature:
+# def write_partial_payloads(conn: psycopg2.extensions.connection, updates: List[Tuple[int, str]], commit_size: int = PARTIAL_COMMIT_SIZE) -> None:
+@metrics.timed("write_partial_payloads()")  # Performance monitor
+def write_partial_payloads(conn, updates, commit_size=PARTIAL_COMMIT_SIZE):
+    """
+    Bulk write partial JSON payloads, committing every commit_size rows
+
+    Each chunk is COPY loaded into session temp table (emptied on commit) and
+    applied with one UPDATE...FROM. Falls back to execute_values if temp
+    table or COPY unavailable.
+
+    Args:
+        conn: Open database connection
+        updates: List of (row id, partial_json) tuples
+        commit_size: Rows per chunk|commit
+    """
+    cursor = conn.cursor()
+    use_copy = True
+
+    for i in range(0, len(updates), commit_size):
+        chunk = updates[i:i + commit_size]
+
+        if use_copy:
+            try:
+                cursor.execute(f"""
+                    CREATE TEMP TABLE IF NOT EXISTS {_PARTIALS_TEMP_TABLE} (
+                        id BIGINT NOT NULL,
+                        partial_json_payload JSONB NULL
+                    ) ON COMMIT DELETE ROWS
+                """)
+                _copy_rows(cursor, _PARTIALS_TEMP_TABLE, ("id", "partial_json_payload"), chunk)
+                cursor.execute(f"""
+                    UPDATE {TABLE_NAME} AS t
+                    SET partial_json_payload = p.partial_json_payload
+                    FROM {_PARTIALS_TEMP_TABLE} AS p
+                    WHERE p.id = t.id
+                """)
+                conn.commit()
+                metrics.incr("partial payload rows written", len(chunk))
+                continue
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"Bulk partial payload write unavailable ({e}), falling back to execute_values")
+                use_copy = False
+
+        execute_values(cursor, f"""
+            UPDATE {TABLE_NAME} AS t
+            SET partial_json_payload = v.partial_json_payload::jsonb
+            FROM (VALUES %s) AS v(id, partial_json_payload)
+            WHERE t.id = v.id
+        """, chunk, page_size=len(chunk))
+        conn.commit()
+        metrics.incr("partial payload rows written", len(chunk))
+
+
+# PEP 484 signature:
+# def get_pending_records(cursor: psycopg2.extensions.cursor) -> List[Dict[str, Any]]:
+@benchmark_section("get_pending_records()")  # Performance monitor
+def get_pending_records(cursor):
+    """
+    Fetch pending/error records with payload, latest row per person
+
+    Args:
+        cursor: Active database cursor
+
+    Returns:
+        List of records with parsed (or raw passthrough) JSON payload.
+    """
+    col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
+
+    # jsonb has no empty string case, NULL check is enough
+    cursor.execute(f"""
+        SELECT person_id, {col}::text, current_hash
+        FROM {TABLE_NAME} AS t
+        {_LATEST_ROWS}
+        WHERE {_PENDING_FILTER}
+        AND {col} IS NOT NULL
+    """)
+
+    results = []
+    for pid, payload, current_hash in cursor.fetchall():
+        record = to_send_record(pid, payload, current_hash)
+        if record is not None:
+            results.append(record)
+    return results
+
+
+# PEP 484 signature:
+# def iter_pending_records(conn: psycopg2.extensions.connection, page_size: int = PENDING_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+def iter_pending_records(conn, page_size=PENDING_PAGE_SIZE):
+    """
+    Stream pending/error records (latest row per person) through server-side cursor, page by page
+
+    Cursor is declared WITH HOLD so it survives caller committing outcomes on
+    same connection; it reads one snapshot, so rows updated meanwhile are not
+    seen twice. Peak memory bounded by page_size, not cohort size.
+
+    Args:
+        conn: Open database connection
+        page_size: Rows fetched per round trip (defaults to PENDING_PAGE_SIZE)
+
+    Yields:
+        Record dicts with 'person_id' and payload (see payload.to_send_record)
+    """
+    col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
+    cursor = conn.cursor(name="pending_records", withhold=True)
+
+    try:
+        cursor.execute(f"""
+            SELECT person_id, {col}::text, current_hash
+            FROM {TABLE_NAME} AS t
+            {_LATEST_ROWS}
+            WHERE {_PENDING_FILTER}
+            AND {col} IS NOT NULL
+            ORDER BY person_id
+        """)
+        while True:
+            rows = cursor.fetchmany(page_size)
+            metrics.incr("pending pages fetched")
+
+            for pid, payload, current_hash in rows:
+                record = to_send_record(pid, payload, current_hash)
+                if record is not None:
+                    yield record
+
+            if len(rows) < page_size:
+                return
+    finally:
+        if not conn.closed:
+            cursor.close()
+
+
+# ---- DB UPDATES ----
+# PEP 484 signature:
+# def update_api_success(cursor: psycopg2.extensions.cursor, person_id: str, uuid: str, timestamp: datetime, current_hash: Optional[bytes] = None) -> None:
+@metrics.timed("update_api_success()")  # Performance monitor
+def update_api_success(cursor, person_id, uuid, timestamp, current_hash=None):
+    """Mark record as sent with API response and timestamp"""
+    update_api_results(cursor, [(person_id, uuid, timestamp, current_hash)], [])
+
+
+# PEP 484 signature:
+# def update_api_failure(cursor: psycopg2.extensions.cursor, person_id: str, message: str) -> None:
+@metrics.timed("update_api_failure()")  # Performance monitor
+def update_api_failure(cursor, person_id, message):
+    """Mark record as failed, store API error message"""
+    update_api_results(cursor, [], [(person_id, message)])
+
+
+# PEP 484 signature:
+# def update_api_results(cursor: psycopg2.extensions.cursor, successes: List[Tuple[str, str, datetime, Optional[bytes]]], failures: List[Tuple[str, str]]) -> None:
+@metrics.timed("update_api_results()")  # Performance monitor
+def update_api_results(cursor, successes, failures):
+    """
+    Apply whole batch of API outcomes, one UPDATE...FROM VALUES per status
+
+    execute_values sends each status as single statement, so DB cost per
+    batch is O(1) round trips. Commit is left to caller. Each outcome is
+    written to latest row of person, by id; success only marks it sent
+    while current_hash matches hash sent (see db.update_api_results), so
+    row appended since send stays pending.
+
+    Args:
+        cursor: Active database cursor
+        successes: List of (person_id, uuid, timestamp, current_hash) for accepted records
+        failures: List of (person_id, message) for failed records
+    """
+    if successes:
+        execute_values(cursor, f"""
+            UPDATE {TABLE_NAME} AS t
+            SET submission_status = 'sent',
+                api_response = v.api_response,
+                submission_timestamp = v.submission_timestamp,
+                previous_hash = t.current_hash,
+                previous_json_payload = t.json_payload,
+                row_state = 'unchanged'
+            FROM (VALUES %s) AS v(person_id, api_response, submission_timestamp, current_hash)
+            {_LATEST_OF_VALUES}
+            WHERE t.id = latest.id
+            AND (v.current_hash IS NULL OR t.current_hash = v.current_hash)
+        """, successes, template="(%s, %s, %s::timestamptz, %s::bytea)", page_size=len(successes))
+
+    if failures:
+        execute_values(cursor, f"""
+            UPDATE {TABLE_NAME} AS t
+            SET submission_status = 'error',
+                api_response = v.api_response
+            FROM (VALUES %s) AS v(person_id, api_response)
+            {_LATEST_OF_VALUES}
+            WHERE t.id = latest.id
+        """, [(pid, (msg or "")[:500]) for pid, msg in failures], page_size=len(failures))  # Truncate to max allowed size
@@ -0,0 +1,270 @@
+# api_pipeline/db_sqlite.py
+#
+# SQLite storage backend (DB_BACKEND=sqlite): local stand-in for SQL Server
+# staging table, same columns as admin/construct_fake_data_ssd_api_data_staging_anon.py
+# Lets full pipeline runs (partial payloads, paging, send, write-back) be
+# profiled offline at realistic volumes. Same functions as db.py
+
+import sqlite3
+
+from . import metrics
+from .config import TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE, SQLITE_PATH
+from .payload import collect_partial_updates, print_partial_stats, to_send_record
+from .utils import benchmark_section
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from . import metrics
+#     from .config import TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE, SQLITE_PATH
+#     from .payload import collect_partial_updates, print_partial_stats, to_send_record
+#     from .utils import benchmark_section
+# except ImportError:
+#     import metrics
+#     from config import TABLE_NAME, USE_PARTIAL_PAYLOAD, PARTIAL_COMMIT_SIZE, PARTIAL_WORKERS, PENDING_PAGE_SIZE, SQLITE_PATH
+#     from payload import collect_partial_updates, print_partial_stats, to_send_record
+#     from utils import benchmark_section
+
+# SQLite translation of ssd_api_data_staging_anon (NVARCHAR -> TEXT, BINARY(32) -> BLOB)
+STAGING_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id                      INTEGER PRIMARY KEY,
+        person_id               TEXT NULL,          -- Link value (_person_id or equivalent)
+        previous_json_payload   TEXT NULL,          -- Enable sub-attribute purge tracking
+        json_payload            TEXT NULL,          -- JSON data payload
+        partial_json_payload    TEXT NULL,          -- Reductive JSON data payload
+        previous_hash           BLOB NULL,          -- Previous hash of JSON payload
+        current_hash            BLOB NULL,          -- Current hash of JSON payload
+        row_state               TEXT NULL,          -- Record state: New, Updated, Deleted, Unchanged
+        last_updated            TEXT NULL,          -- Last update timestamp
+        submission_status       TEXT NULL,          -- Status: pending, sent, error
+        api_response            TEXT NULL,          -- API response or error messages
+        submission_timestamp    TEXT NULL           -- Timestamp on API submission
+    );
+    CREATE INDEX IF NOT EXISTS ix_{index}_person_id ON {table} (person_id);
+"""
+
+
+# ---- CONNECTION ----
+def connect(path=SQLITE_PATH):
+    """
+    Open SQLite staging database, creating staging table if missing
+
+    Args:
+        path: Database file (':memory:' for throwaway runs)
+
+    Returns:
+        sqlite3.Connection
+    """
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")  # Reader stage can page while writer commits
+    create_staging_table(conn)
+    return conn
+
+
+def create_staging_table(conn):
+    """Create staging table (and person_id index) if not present"""
+    conn.executescript(STAGING_TABLE_DDL.format(table=TABLE_NAME, index=TABLE_NAME.replace(".", "_")))
+    conn.commit()
+
+
+def _timestamp(ts):
+    """Timestamp as ISO text, SQLite has no DATETIME type"""
+    return ts.isoformat(sep=" ") if ts is not None and hasattr(ts, "isoformat") else ts
+
+
+# ---- DATA ----
+# PEP 484 signature:
+# def update_partial_payloads(conn: sqlite3.Connection) -> None:
+@benchmark_section("update_partial_payloads()")
+def update_partial_payloads(conn):
+    """
+    Update table with generated partial JSON payloads (hash-first, see db.update_partial_payloads)
+
+    Args:
+        conn: Open database connection
+    """
+    cursor = conn.cursor()
+
+    # Select changed rows with both current, previous JSON
+    cursor.execute(f"""
+        SELECT
+            person_id,
+            row_state,
+            CASE WHEN lower(row_state) = 'deleted' THEN NULL ELSE json_payload END,
+            previous_json_payload,
+            current_hash,
+            previous_hash  -- Block store entry check (BLOCK_STORE_PATH)
+        FROM {TABLE_NAME}
+        WHERE
+            json_payload IS NOT NULL
+            AND previous_json_payload IS NOT NULL
+            AND lower(row_state) <> 'unchanged'
+            AND (
+                lower(row_state) = 'deleted'
+                OR current_hash IS NULL
+                OR previous_hash IS NULL
+                OR current_hash <> previous_hash
+            )
+    """)
+
+    # Read all candidate rows first: SQLite cursor would otherwise hold read
+    # snapshot open across write_partial_payloads() commits
+    updates, counts = collect_partial_updates(cursor.fetchall(), PARTIAL_WORKERS)
+
+    # Apply updates to database
+    write_partial_payloads(conn, updates)
+    print(f"Updated {len(updates)} partial_json_payload records")
+
+    print_partial_stats(counts)
+
+
+# PEP 484 signature:
+# def write_partial_payloads(conn: sqlite3.Connection, updates: List[Tuple[str, str]], commit_size: int = PARTIAL_COMMIT_SIZE) -> None:
+@metrics.timed("write_partial_payloads()")  # Performance monitor
+def write_partial_payloads(conn, updates, commit_size=PARTIAL_COMMIT_SIZE):
+    """
+    Write partial JSON payloads, committing every commit_size rows
+
+    Args:
+        conn: Open database connection
+        updates: List of (person_id, partial_json) tuples
+        commit_size: Rows per chunk|commit
+    """
+    cursor = conn.cursor()
+    for i in range(0, len(updates), commit_size):
+        chunk = updates[i:i + commit_size]
+        cursor.executemany(f"""
+            UPDATE {TABLE_NAME}
+            SET partial_json_payload = ?
+            WHERE person_id = ?
+        """, [(json_out, pid) for pid, json_out in chunk])
+        conn.commit()
+        metrics.incr("partial payload rows written", len(chunk))
+
+
+# PEP 484 signature:
+# def get_pending_records(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+@benchmark_section("get_pending_records()")  # Performance monitor
+def get_pending_records(cursor):
+    """
+    Fetch pending/error records with non-empty payload
+
+    Args:
+        cursor: Active database cursor
+
+    Returns:
+        List of records with parsed (or raw passthrough) JSON payload.
+    """
+    col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
+
+    cursor.execute(f"""
+        SELECT person_id, {col}, current_hash
+        FROM {TABLE_NAME}
+        WHERE submission_status IN ('pending', 'error')
+        AND {col} IS NOT NULL AND TRIM({col}) <> ''
+    """)
+
+    results = []
+    for pid, payload, current_hash in cursor.fetchall():
+        record = to_send_record(pid, payload, current_hash)
+        if record is not None:
+            results.append(record)
+    return results
+
+
+# PEP 484 signature:
+# def iter_pending_records(conn: sqlite3.Connection, page_size: int = PENDING_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+def iter_pending_records(conn, page_size=PENDING_PAGE_SIZE):
+    """
+    Stream pending/error records with non-empty payload, keyset paged on person_id
+
+    Args:
+        conn: Open database connection
+        page_size: Rows fetched per page (defaults to PENDING_PAGE_SIZE)
+
+    Yields:
+        Record dicts with 'person_id' and payload (see payload.to_send_record)
+    """
+    col = "partial_json_payload" if USE_PARTIAL_PAYLOAD else "json_payload"
+    cursor = conn.cursor()
+
+    select_sql = f"""
+        SELECT person_id, {col}, current_hash
+        FROM {TABLE_NAME}
+        WHERE submission_status IN ('pending', 'error')
+        AND {col} IS NOT NULL AND TRIM({col}) <> ''
+        {{keyset}}
+        ORDER BY person_id
+        LIMIT ?
+    """
+
+    last_pid = None
+    while True:
+        if last_pid is None:
+            cursor.execute(select_sql.format(keyset=""), (page_size,))
+        else:
+            cursor.execute(select_sql.format(keyset="AND person_id > ?"), (last_pid, page_size))
+        rows = cursor.fetchall()
+        metrics.incr("pending pages fetched")
+
+        for pid, payload, current_hash in rows:
+            record = to_send_record(pid, payload, current_hash)
+            if record is not None:
+                yield record
+
+        if len(rows) < page_size:
+            return
+        last_pid = rows[-1][0]
+
+
+# ---- DB UPDATES ----
+# PEP 484 signature:
+# def update_api_success(cursor: sqlite3.Cursor, person_id: str, uuid: str, timestamp: datetime, current_hash: Optional[bytes] = None) -> None:
+@metrics.timed("update_api_success()")  # Performance monitor
+def update_api_success(cursor, person_id, uuid, timestamp, current_hash=None):
+    """Mark record as sent with API response and timestamp"""
+    update_api_results(cursor, [(person_id, uuid, timestamp, current_hash)], [])
+
+
+# PEP 484 signature:
+# def update_api_failure(cursor: sqlite3.Cursor, person_id: str, message: str) -> None:
+@metrics.timed("update_api_failure()")  # Performance monitor
+def update_api_failure(cursor, person_id, message):
+    """Mark record as failed, store API error message"""
+    update_api_results(cursor, [], [(person_id, message)])
+
+
+# PEP 484 signature:
+# def update_api_results(cursor: sqlite3.Cursor, successes: List[Tuple[str, str, datetime, Optional[bytes]]], failures: List[Tuple[str, str]]) -> None:
+@metrics.timed("update_api_results()")  # Performance monitor
+def update_api_results(cursor, successes, failures):
+    """
+    Apply whole batch of API outcomes (executemany per status, one transaction with caller commit)
+
+    Success only marks row sent while current_hash matches hash sent (see db.update_api_results).
+
+    Args:
+        cursor: Active database cursor
+        successes: List of (person_id, uuid, timestamp, current_hash) for accepted records
+        failures: List of (person_id, message) for failed records
+    """
+    if successes:
+        cursor.executemany(f"""
+            UPDATE {TABLE_NAME}
+            SET submission_status='sent',
+                api_response=?,
+                submission_timestamp=?,
+                previous_hash=current_hash,
+                previous_json_payload=json_payload,
+                row_state='unchanged'
+            WHERE person_id = ?
+            AND (? IS NULL OR current_hash = ?)
+        """, [(uuid, _timestamp(ts), pid, h, h) for pid, uuid, ts, h in successes])
+
+    if failures:
+        cursor.executemany(f"""
+            UPDATE {TABLE_NAME}
+            SET submission_status='error',
+                api_response=?
+            WHERE person_id = ?
+        """, [((msg or "")[:500], pid) for pid, msg in failures])  # Truncate to max allowed size
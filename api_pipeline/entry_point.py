@@ -1,4 +1,5 @@
 # api_pipeline/entry_point.py
+import multiprocessing
 import sys
 
 # DEBUG
@@ -10,6 +11,7 @@ CSC API Pipeline CLI
 
 Usage:
   csc_api_pipeline run                   Run the pipeline
+  csc_api_pipeline resume                Apply send journal of interrupted run (no resend)
   csc_api_pipeline test-db-connection    Test DB connection
   csc_api_pipeline test-schema           Validate DB schema
   csc_api_pipeline run-smoke             Run smoke tests (recommended)
@@ -20,18 +22,22 @@ Notes:
 """
 
 def cli():
+    # Frozen EXE: let partial payload worker processes start (PARTIAL_WORKERS)
+    multiprocessing.freeze_support()
+
     if "--help" in sys.argv or "-h" in sys.argv:
         print(HELP_TEXT)
         return
 
     # Defer heavy imports so --help doesn't pull config/auth/etc.
-    from .main import main
+    from .main import main, resume
     from .test import test_db_connection, test_schema, run_smoke
 
     command = sys.argv[1] if len(sys.argv) >= 2 else "run"
 
     command_map = {
         "run": main,
+        "resume": resume,
         "test-db-connection": test_db_connection,
         "test-schema": test_schema,
         "run-smoke": run_smoke
@@ -0,0 +1,250 @@
+# api_pipeline/journal.py
+#
+# Crash-safe local send journal (SQLite write-ahead log of batch submissions)
+# Each batch is journalled before POST (with current_hash of each record), API
+# outcome of each request is journalled as soon as its response arrives (a
+# 413 split|400 bisected batch is several requests), and entry is cleared
+# once outcome is committed to staging table. After a crash, 'resume' (or
+# next run) replays journalled outcomes into staging table without
+# re-POSTing accepted records
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .config import SEND_JOURNAL_PATH
+from .storage import backend
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from .config import SEND_JOURNAL_PATH
+#     from .storage import backend
+# except ImportError:
+#     from config import SEND_JOURNAL_PATH
+#     from storage import backend
+
+# Batch states
+IN_FLIGHT = "in_flight"   # POST may have been sent, some record(s) with no response journalled
+RESPONDED = "responded"   # API outcome of every record journalled, not yet committed to staging table
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS batches (
+        batch_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at      TEXT NOT NULL,
+        state           TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS batch_records (
+        batch_id        INTEGER NOT NULL,
+        person_id       TEXT NOT NULL,
+        status          TEXT NULL,       -- 'sent' | 'error' once responded
+        api_response    TEXT NULL,       -- uuid, or error message
+        submitted_at    TEXT NULL,       -- ISO timestamp for 'sent'
+        current_hash    BLOB NULL        -- staging current_hash of payload sent
+    );
+    CREATE INDEX IF NOT EXISTS ix_batch_records_batch ON batch_records (batch_id);
+"""
+
+
+def _owner_only(path):
+    """Create file if missing and restrict it to owning user (as token cache)"""
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+
+
+class SendJournal:
+    """
+    SQLite journal of in-flight batches, shared by sender threads
+
+    One connection guarded by lock; every change is its own transaction with
+    synchronous=FULL, so journalled outcome survives process|OS crash.
+    Journal holds person_ids and API error text (may echo record content),
+    so file and its -wal|-shm sidecars are owner-only.
+    """
+
+    def __init__(self, path=SEND_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        _owner_only(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        for sidecar in (path + "-wal", path + "-shm"):
+            if os.path.exists(sidecar):
+                os.chmod(sidecar, 0o600)
+        self._conn.executescript(_SCHEMA)
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(batch_records)")]
+        if "current_hash" not in columns:
+            # Journal created before hashes were journalled
+            self._conn.execute("ALTER TABLE batch_records ADD COLUMN current_hash BLOB NULL")
+
+    def begin(self, batch):
+        """
+        Journal batch before POST
+
+        Args:
+            batch: List of records with 'person_id' and 'current_hash'
+
+        Returns:
+            Journal batch id
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO batches (started_at, state) VALUES (?, ?)",
+                (datetime.now().isoformat(), IN_FLIGHT),
+            )
+            batch_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO batch_records (batch_id, person_id, current_hash) VALUES (?, ?, ?)",
+                [(batch_id, str(rec["person_id"]), rec.get("current_hash")) for rec in batch],
+            )
+        return batch_id
+
+    def record_outcome(self, batch_id, successes, failures):
+        """
+        Journal API outcome of request for some or all of batch records,
+        before it is written to staging table
+
+        Called once per request as its response arrives, so records of a
+        split|bisected batch already answered are not resent after a crash.
+        Batch is RESPONDED once every record has an outcome.
+
+        Args:
+            batch_id: Journal batch id from begin()
+            successes: List of (person_id, uuid, timestamp, current_hash)
+            failures: List of (person_id, message)
+        """
+        rows = [("sent", uuid, ts.isoformat(), batch_id, str(pid)) for pid, uuid, ts, _ in successes]
+        rows += [("error", msg, None, batch_id, str(pid)) for pid, msg in failures]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE batch_records SET status = ?, api_response = ?, submitted_at = ? WHERE batch_id = ? AND person_id = ?",
+                rows,
+            )
+            self._conn.execute(
+                """
+                UPDATE batches SET state = ? WHERE batch_id = ? AND NOT EXISTS (
+                    SELECT 1 FROM batch_records WHERE batch_id = ? AND status IS NULL
+                )
+                """,
+                (RESPONDED, batch_id, batch_id),
+            )
+
+    def clear(self, batch_id):
+        """Drop batch from journal once its outcome is committed to staging table"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM batch_records WHERE batch_id = ?", (batch_id,))
+            self._conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+
+    def responded_batches(self):
+        """
+        Journalled outcomes not yet committed to staging table, including
+        records answered in batches still IN_FLIGHT
+
+        Returns:
+            List of (batch_id, successes, failures), successes carrying
+            current_hash journalled by begin()
+        """
+        with self._lock:
+            batch_ids = [r[0] for r in self._conn.execute("SELECT batch_id FROM batches ORDER BY batch_id")]
+            result = []
+            for batch_id in batch_ids:
+                successes, failures = [], []
+                for pid, status, response, submitted_at, current_hash in self._conn.execute(
+                    """
+                    SELECT person_id, status, api_response, submitted_at, current_hash
+                    FROM batch_records WHERE batch_id = ? AND status IS NOT NULL
+                    """,
+                    (batch_id,),
+                ):
+                    if status == "sent":
+                        successes.append((pid, response, datetime.fromisoformat(submitted_at), current_hash))
+                    else:
+                        failures.append((pid, response))
+                if successes or failures:
+                    result.append((batch_id, successes, failures))
+        return result
+
+    def in_flight_batches(self):
+        """
+        Batches journalled before POST with record(s) lacking a journalled
+        response (outcome unknown)
+
+        Returns:
+            List of (batch_id, started_at, person_ids without response)
+        """
+        with self._lock:
+            batches = list(self._conn.execute(
+                "SELECT batch_id, started_at FROM batches WHERE state = ? ORDER BY batch_id", (IN_FLIGHT,)
+            ))
+            return [
+                (batch_id, started_at, [r[0] for r in self._conn.execute(
+                    "SELECT person_id FROM batch_records WHERE batch_id = ? AND status IS NULL", (batch_id,)
+                )])
+                for batch_id, started_at in batches
+            ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_journal():
+    """
+    Open send journal if SEND_JOURNAL_PATH configured
+
+    Returns:
+        SendJournal, or None if journalling disabled or journal unusable
+    """
+    if not SEND_JOURNAL_PATH:
+        return None
+    try:
+        return SendJournal(SEND_JOURNAL_PATH)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Send journal unavailable ({e}), continuing without crash recovery")
+        return None
+
+
+# PEP 484 signature:
+# def reconcile(journal: SendJournal, conn: pyodbc.Connection) -> int:
+def reconcile(journal, conn):
+    """
+    Replay journalled API outcomes into staging table without re-POSTing
+
+    Outcomes journalled but not committed (process died between API response
+    and DB commit) are written and cleared. A journalled success is only
+    applied while staging row current_hash still equals hash journalled
+    before POST; row repopulated since stays pending with its new payload.
+    Records with no journalled response are reported and cleared: they are
+    still pending in staging table and go again on next run.
+
+    Args:
+        journal: Open SendJournal
+        conn: Open database connection
+
+    Returns:
+        Number of records reconciled
+    """
+    cursor = conn.cursor()
+    reconciled = 0
+
+    responded = journal.responded_batches()
+    for batch_id, successes, failures in responded:
+        backend.update_api_results(cursor, successes, failures)
+        conn.commit()
+        reconciled += len(successes) + len(failures)
+        print(f"Reconciled journalled batch {batch_id}: {len(successes)} sent, {len(failures)} error")
+
+    in_flight = journal.in_flight_batches()
+    for batch_id, started_at, person_ids in in_flight:
+        preview = ", ".join(person_ids[:5]) + (" ..." if len(person_ids) > 5 else "")
+        print(
+            f"Journalled batch {batch_id} ({started_at}) has no recorded API response for "
+            f"{len(person_ids)} record(s); they remain pending and may be resent: {preview}"
+        )
+
+    # Partly answered batches appear in both lists, cleared once replayed and reported
+    for batch_id in {b[0] for b in responded} | {b[0] for b in in_flight}:
+        journal.clear(batch_id)
+
+    return reconciled
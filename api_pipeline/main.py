@@ -1,52 +1,64 @@
 # api_pipeline/main.py
 # core pipeline execution logic: connecting to DB, generating payload, authenticating, and API sends
 # 
-import pyodbc
 import json
 from datetime import datetime
+from itertools import chain
 import re
 
-from .config import SQL_CONN_STR, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA
+from .config import DB_BACKEND, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA, TRACE_MEMORY, STREAM_PENDING_RECORDS, PIPELINE_STREAMING
 from .auth import get_oauth_token
-from .db import update_partial_payloads, get_pending_records, update_api_success, update_api_failure
-from .api import process_batches
+from .storage import backend, TARGET
+from .api import process_batches, stream_batches
+from .journal import open_journal, reconcile
+from .transport import close_session
 from .utils import benchmark_section, log_debug, announce_mode
 
 # # ---- local imports with fallback for notebook/debug use ----
 # try:
-#     from .config import SQL_CONN_STR, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA
+#     from .config import DB_BACKEND, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA, TRACE_MEMORY, STREAM_PENDING_RECORDS, PIPELINE_STREAMING
 #     from .auth import get_oauth_token
-#     from .db import update_partial_payloads, get_pending_records, update_api_success, update_api_failure
-#     from .api import process_batches
+#     from .storage import backend, TARGET
+#     from .api import process_batches, stream_batches
+#     from .journal import open_journal, reconcile
+#     from .transport import close_session
 #     from .utils import benchmark_section, log_debug, announce_mode
 # except ImportError:
-#     from config import SQL_CONN_STR, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA
+#     from config import DB_BACKEND, USE_PARTIAL_PAYLOAD, SUPPLIER_KEY, API_ENDPOINT_LA, TRACE_MEMORY, STREAM_PENDING_RECORDS, PIPELINE_STREAMING
 #     from auth import get_oauth_token
-#     from db import update_partial_payloads, get_pending_records, update_api_success, update_api_failure
-#     from api import process_batches
+#     from storage import backend, TARGET
+#     from api import process_batches, stream_batches
+#     from journal import open_journal, reconcile
+#     from transport import close_session
 #     from utils import benchmark_section, log_debug, announce_mode
 
 
-@benchmark_section("main()")
+@benchmark_section("main()", trace_memory=TRACE_MEMORY)
 def main():
 
     announce_mode()
-    log_debug(f"Connecting to DB using: {SQL_CONN_STR}")
+    log_debug(f"Connecting to {DB_BACKEND} DB using: {TARGET}")
     try:
-        conn = pyodbc.connect(SQL_CONN_STR, timeout=10)
+        conn = backend.connect()
     except Exception as e:
         print(f"Database connection failed: {e}")
         log_debug(f"Failed to connect DB or timeout occured.")
         return
 
+    # Apply outcomes journalled by interrupted run before anything is resent
+    journal = open_journal()
+    if journal is not None:
+        reconcile(journal, conn)
+
     if USE_PARTIAL_PAYLOAD:
         
-            update_partial_payloads(conn)
+            backend.update_partial_payloads(conn)
             log_debug("Partial payloads updated.")
         
     token = get_oauth_token()
     if not token:
         print("No token retrieved. Exiting.")
+        _close(conn, journal)
         return
 
     headers = {
@@ -84,19 +96,99 @@ def main():
     log_debug(f"API endpoint: {API_ENDPOINT_LA}")
     log_debug("\nFetching pending records from DB...")
     
+    if PIPELINE_STREAMING:
+        # Reader stage pages pending rows on own connection while outcomes are written on conn
+        try:
+            reader_conn = backend.connect()
+        except Exception as e:
+            print(f"Pipeline reader connection failed: {e}")
+            _close(conn, journal)
+            return
+
+        stream = backend.iter_pending_records(reader_conn)
+        first = next(stream, None)
+        if first is None:
+            print("No pending records to send.")
+            reader_conn.close()
+            _close(conn, journal)
+            return
+
+        print("Streaming pending records through send pipeline...")
+        log_debug("Beginning pipelined batch API submission...")
+        try:
+            stream_batches(chain([first], stream), headers, conn, journal=journal)
+        finally:
+            reader_conn.close()
+
+        _close(conn, journal)
+        return
+
+    if STREAM_PENDING_RECORDS:
+        # Page through pending rows as batches are sent, memory bounded by batch size
+        stream = backend.iter_pending_records(conn)
+        first = next(stream, None)
+        if first is None:
+            print("No pending records to send.")
+            _close(conn, journal)
+            return
+
+        print("Streaming pending records in batches...")
+        log_debug("Beginning batch API submission...")
+        process_batches(chain([first], stream), headers, conn, journal=journal)
+
+        _close(conn, journal)
+        return
+
     cursor = conn.cursor()
     
-    records = get_pending_records(cursor)
+    records = backend.get_pending_records(cursor)
     log_debug(f"Fetched {len(records)} pending records.")  
 
     if not records:
         print("No pending records to send.")
+        _close(conn, journal)
         return
 
     print(f"Sending {len(records)} records...")
     log_debug("Beginning batch API submission...") 
-    process_batches(records, headers, conn)
+    process_batches(records, headers, conn, journal=journal)
+
+    _close(conn, journal)
+
+
+def _close(conn, journal):
+    """Release HTTP session, journal and DB connection at end of run"""
+    close_session()
+    if journal is not None:
+        journal.close()
+    conn.close()
+
+
+@benchmark_section("resume()")
+def resume():
+    """
+    Reconcile send journal of interrupted run into staging table, no API calls
+
+    Outcomes API returned but run never committed are written to staging
+    table; batches with no recorded response are reported, their records
+    stay pending for next run.
+    """
+    announce_mode()
+    journal = open_journal()
+    if journal is None:
+        print("No send journal configured (SEND_JOURNAL_PATH). Nothing to resume.")
+        return
+
+    try:
+        conn = backend.connect()
+    except Exception as e:
+        print(f"Database connection failed: {e}")
+        journal.close()
+        return
 
+    reconciled = reconcile(journal, conn)
+    print(f"Resume complete: {reconciled} record outcome(s) reconciled from journal.")
+    journal.close()
     conn.close()
 
 
@@ -0,0 +1,235 @@
+# api_pipeline/metrics.py
+#
+# Low-overhead run metrics: counters, histograms and nested spans
+# Aggregated in-process per label and reported once at end of run, so hot
+# paths (recursive_diff, prune_unchanged_list, per-record DB updates) pay a
+# closure-local call count, with timing sampled, rather than print +
+# tracemalloc per call
+
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+_RESERVOIR_SIZE = 1024  # Max samples kept per histogram for percentiles
+
+
+class _Histogram:
+    """Running count/total/min/max plus bounded reservoir sample for percentiles"""
+
+    __slots__ = ("count", "total", "min", "max", "samples", "unit")
+
+    def __init__(self, unit="s"):
+        self.unit = unit  # 's' reported as ms, '' reported as plain values
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self.samples) < _RESERVOIR_SIZE:
+            self.samples.append(value)
+        else:
+            # Reservoir sampling keeps uniform sample of all observations
+            slot = random.randrange(self.count)
+            if slot < _RESERVOIR_SIZE:
+                self.samples[slot] = value
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {}
+_histograms = {}
+_memory = {}  # span path -> peak traced bytes (opt-in sections only)
+_call_counts = {}  # '<label> calls' -> closure-local counters of timed() wrappers, read at report time
+
+
+def _span_stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def incr(name, n=1):
+    """
+    Increment named counter
+
+    Args:
+        name: Counter label
+        n: Increment amount
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, value, unit="s"):
+    """
+    Record value into named histogram
+
+    Args:
+        name: Histogram label
+        value: Observed value (seconds for timings)
+        unit: 's' for timings, '' for unitless values (e.g. queue depth),
+            fixed by first observation
+    """
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = _Histogram(unit)
+        hist.add(value)
+
+
+def depth():
+    """Number of spans currently open on calling thread"""
+    return len(_span_stack())
+
+
+@contextmanager
+def span(label, trace_memory=False):
+    """
+    Time block as nested span, recorded under its full path e.g. 'main() > process_batches()'
+
+    Args:
+        label: Span label
+        trace_memory: Opt-in tracemalloc peak for this span. Only outermost
+            traced span starts|stops tracemalloc, so nested spans do not
+            reset or corrupt enclosing measurement
+    """
+    stack = _span_stack()
+    stack.append(label)
+    path = " > ".join(stack)
+
+    owns_trace = trace_memory and not tracemalloc.is_tracing()
+    if owns_trace:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if owns_trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with _lock:
+                _memory[path] = max(_memory.get(path, 0), peak)
+        stack.pop()
+        observe(path, elapsed)
+
+
+def timed(label, sample_every=1, enabled=True):
+    """
+    Decorator counting every call and timing 1 in sample_every calls
+
+    Timing is flat (not a span) so recursive functions do not build deep span
+    paths. Calls are counted in closure-local counter (no lock, no registry
+    update; may undercount slightly under threads), read by get_counter() and
+    report(). Use sample_every > 1 on very hot functions to bound overhead,
+    or enabled=False to leave function unwrapped (no per-call cost at all).
+
+    Args:
+        label: Metric label, calls counted as '<label> calls'
+        sample_every: Time every Nth call only
+        enabled: Wrap function; False returns it unchanged
+    """
+    calls_name = f"{label} calls"
+
+    def decorator(func):
+        if not enabled:
+            return func
+        counter = [0]
+        with _lock:
+            _call_counts.setdefault(calls_name, []).append(counter)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            if counter[0] % sample_every:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _all_counters():
+    """Counters merged with timed() call counts, caller holds _lock"""
+    merged = dict(_counters)
+    for name, cells in _call_counts.items():
+        calls = sum(cell[0] for cell in cells)
+        if calls:
+            merged[name] = merged.get(name, 0) + calls
+    return merged
+
+
+def get_counter(name):
+    """Current value of named counter (0 if unset)"""
+    with _lock:
+        return _all_counters().get(name, 0)
+
+
+def get_histogram(name):
+    """Named histogram, or None if nothing observed"""
+    with _lock:
+        return _histograms.get(name)
+
+
+def reset():
+    """Clear all collected metrics"""
+    with _lock:
+        _counters.clear()
+        for cells in _call_counts.values():
+            for cell in cells:
+                cell[0] = 0
+        _histograms.clear()
+        _memory.clear()
+
+
+def report():
+    """
+    Build end of run summary of all counters, timings and traced memory
+
+    Returns:
+        List of printable lines
+    """
+    lines = ["[METRICS] Run summary"]
+    with _lock:
+        counters = _all_counters()
+        for name in sorted(counters):
+            lines.append(f"[METRICS] {name}: {counters[name]}")
+        for name in sorted(_histograms):
+            h = _histograms[name]
+            if h.unit != "s":
+                lines.append(
+                    f"[METRICS] {name}: n={h.count} avg={h.total / h.count:.2f}{h.unit} "
+                    f"p50={h.percentile(50):g}{h.unit} p95={h.percentile(95):g}{h.unit} max={h.max:g}{h.unit}"
+                )
+                continue
+            lines.append(
+                f"[METRICS] {name}: n={h.count} total={h.total:.3f}s "
+                f"avg={h.total / h.count * 1000:.3f}ms p50={h.percentile(50) * 1000:.3f}ms "
+                f"p95={h.percentile(95) * 1000:.3f}ms max={h.max * 1000:.3f}ms"
+            )
+        for path in sorted(_memory):
+            lines.append(f"[METRICS] {path}: peak traced mem {_memory[path] / (1024 ** 2):.2f} MiB")
+    return lines
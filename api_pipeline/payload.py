@@ -1,32 +1,38 @@
 # api_pipeline/payload.py
 
-import json
-
-from .config import REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS
-from .utils import benchmark_section
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from . import codec, metrics
+from .config import (
+    REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS, PARTIAL_WORKERS,
+    RAW_PAYLOAD_PASSTHROUGH, RAW_PAYLOAD_VALIDATE, DEBUG,
+)
+from .block_store import InvalidToken, digest, open_block_store, seal, unseal
+from .utils import log_debug
 
 # # ---- local imports with fallback for notebook/debug use ----
 # try:
-#     from .config import REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS
-#     from .utils import benchmark_section
+#     from . import codec, metrics
+#     from .config import REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS, PARTIAL_WORKERS, RAW_PAYLOAD_PASSTHROUGH, RAW_PAYLOAD_VALIDATE, DEBUG
+#     from .block_store import InvalidToken, digest, open_block_store, seal, unseal
+#     from .utils import log_debug
 # except ImportError:
-#     from config import REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS
-#     from utils import benchmark_section
-
-
-
+#     import codec, metrics
+#     from config import REQUIRED_FIELDS, ALLOWED_PURGE_BLOCKS, PARTIAL_WORKERS, RAW_PAYLOAD_PASSTHROUGH, RAW_PAYLOAD_VALIDATE, DEBUG
+#     from block_store import InvalidToken, digest, open_block_store, seal, unseal
+#     from utils import log_debug
 
 
-# [DIAG] Add diagnostics
-from time import perf_counter  # [DIAG]
-_recursive_diff_call_count = 0  # [DIAG]
-_recursive_diff_total_time = 0  # [DIAG]
+# Hot recursive paths: wrapped only with DEBUG (wrapper frame alone costs ~25%
+# of diff time), then time 1 in N calls, always count
+_HOT_SAMPLE_EVERY = 64
 
-_prune_call_count = 0  # [DIAG]
-_prune_total_time = 0  # [DIAG]
 
-
-@benchmark_section("generate_partial_payload()")  # Performance monitor
+@metrics.timed("generate_partial_payload()")  # Performance monitor
 def generate_partial_payload(current, previous):
     """
     Create partial payload with required and changed fields
@@ -52,7 +58,7 @@ def generate_partial_payload(current, previous):
     return partial
 
 
-@benchmark_section("generate_deletion_payload()")  # Performance monitor
+@metrics.timed("generate_deletion_payload()")  # Performance monitor
 def generate_deletion_payload(previous):
     """
     Create deletion payload using identifiers and purge flag
@@ -70,80 +76,554 @@ def generate_deletion_payload(previous):
     }
 
 
-@benchmark_section("recursive_diff()")  # Performance monitor
+# ---- Partial payload generation (storage backend neutral) ----
+_PARTIAL_CHUNK_SIZE = 250  # Changed rows per partial payload worker task
+
+
+def build_partial_rows(rows):
+    """
+    Build serialised partial payloads for chunk of changed rows
+
+    Pure CPU (parse, diff, serialise) with no DB access, so chunks can run
+    in worker processes. Row errors are returned, not raised, so one bad
+    payload does not fail its chunk.
+
+    Args:
+        rows: Iterable of (person_id, row_state, curr_raw, prev_raw), plus
+            stored block entry (or None) as 5th item when block store in use
+
+    Returns:
+        List of (person_id, outcome, value): outcome one of 'state', 'equal',
+        'deleted', 'delta' (value is partial JSON) or 'error' (value is message).
+        Block tracked delta rows carry block store update as 4th item
+    """
+    results = []
+    for row in rows:
+        person_id, row_state, curr_raw, prev_raw = row[:4]
+        try:
+            state = row_state.lower()
+
+            # ---- EARLY EXIT: skip if new or unchanged ----
+            if state == "unchanged":
+                results.append((person_id, "state", None))
+                continue
+
+            # Deleted: only previous payload needed (current not fetched)
+            if state == "deleted":
+                partial = generate_deletion_payload(codec.loads(prev_raw))
+                outcome = "deleted"
+
+            else:
+                # ---- EARLY EXIT: skip if identical JSON strings ----
+                if curr_raw == prev_raw:
+                    results.append((person_id, "equal", None))
+                    continue
+
+                curr = codec.loads(curr_raw)  # Parse current JSON
+
+                if len(row) > 4:
+                    # Block tracked: previous rebuilt from stored blocks, parsed only where block moved
+                    partial, update = _block_partial(curr, prev_raw, row[4])
+                    results.append((person_id, "delta", codec.dumps(partial), update))
+                    continue
+
+                prev = codec.loads(prev_raw)  # Parse previous JSON
+
+                partial = generate_partial_payload(curr, prev)
+                outcome = "delta"
+
+            # Serialise partial (compact, bound as parameter, no quote escaping needed)
+            json_out = codec.dumps(partial)
+            results.append((person_id, outcome, json_out))
+
+        except Exception as e:
+            results.append((person_id, "error", str(e)))
+
+    return results
+
+
+def collect_partial_updates(rows, workers=PARTIAL_WORKERS):
+    """
+    Build partial payloads for changed rows read by storage backend
+
+    With BLOCK_STORE_PATH set, rows whose previous_hash matches block store
+    entry are diffed per block (see block_store), and store is updated with
+    blocks of current payload.
+
+    Args:
+        rows: Iterable of (person_id, row_state, curr_raw, prev_raw, current_hash, previous_hash)
+        workers: Worker processes, see iter_partial_results()
+
+    Returns:
+        (updates, counts): updates as list of (person_id, partial_json),
+        counts per outcome for print_partial_stats()
+    """
+    updates = []
+    counts = dict.fromkeys(("checked", "state", "equal", "deleted", "delta", "error"), 0)
+
+    store = open_block_store()
+    if store is None:
+        rows = (tuple(row)[:4] for row in rows)
+    else:
+        curr_hashes = {}
+        rows = _tracked_rows(rows, store, curr_hashes)
+        saves, drops = [], []
+
+    try:
+        for result in iter_partial_results(rows, workers):
+            person_id, outcome, value = result[:3]
+            counts["checked"] += 1
+            counts[outcome] += 1
+            if outcome == "error":
+                print(f"Error for {person_id}: {value}")
+            elif outcome in ("deleted", "delta"):
+                updates.append((person_id, value))
+
+            if store is None:
+                continue
+            curr_hash = curr_hashes.pop(person_id, None)
+            if len(result) > 3 and curr_hash is not None:
+                saves.append((person_id, curr_hash, result[3]))
+            elif outcome == "deleted":
+                drops.append(person_id)
+            if len(saves) >= _PARTIAL_CHUNK_SIZE:
+                store.save(saves)
+                saves = []
+
+        if store is not None:
+            store.save(saves)
+            store.drop(drops)
+    finally:
+        if store is not None:
+            store.close()
+
+    return updates, counts
+
+
+def _tracked_rows(rows, store, curr_hashes, chunk_size=_PARTIAL_CHUNK_SIZE):
+    """
+    Attach block store entries to changed rows, looked up chunk by chunk
+
+    Rows without current_hash (or deleted) pass through untracked as
+    4-tuples. current_hash of tracked rows is kept in curr_hashes until
+    result is saved.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = [tuple(row) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return
+        entries = store.lookup({row[0]: bytes(row[5]) for row in chunk if len(row) > 5 and row[5] is not None})
+        for row in chunk:
+            if len(row) > 5 and row[4] is not None and str(row[1]).lower() not in ("deleted", "unchanged"):
+                curr_hashes[row[0]] = bytes(row[4])  # bytes() also normalises psycopg2 memoryview
+                entry = entries.get(row[0])
+                metrics.incr("block store hits" if entry is not None else "block store misses")
+                yield row[:4] + (entry,)
+            else:
+                yield row[:4]
+
+
+def print_partial_stats(counts):
+    """[DIAG] summary of collect_partial_updates() outcomes"""
+    print(f"[DIAG] Checked: {counts['checked']}")
+    print(f"[DIAG] Skipped (state): {counts['state']}")
+    print(f"[DIAG] Skipped (identical JSON): {counts['equal']}")
+    print(f"[DIAG] Deleted payloads: {counts['deleted']}")
+    print(f"[DIAG] Delta payloads: {counts['delta']}")
+    print(f"[DIAG] Errors: {counts['error']}")
+
+
+def iter_partial_results(rows, workers=PARTIAL_WORKERS, chunk_size=_PARTIAL_CHUNK_SIZE):
+    """
+    Generate partial payload results for rows, in-process or across worker processes
+
+    Rows are fanned out in chunks with at most 2 chunks per worker in flight,
+    so memory stays bounded. Results come back in row order; DB reads and
+    writes stay on calling process. If pool cannot start or breaks, remaining
+    chunks run in-process.
+
+    Args:
+        rows: Iterable of (person_id, row_state, curr_raw, prev_raw[, block entry])
+        workers: Worker processes, 1 = in-process, 0 = os.cpu_count()
+        chunk_size: Rows per worker task
+
+    Yields:
+        (person_id, outcome, value) tuples, see payload.build_partial_rows()
+    """
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    rows = iter(rows)  # lists too: islice must consume, not restart
+    chunks = iter(lambda: [tuple(row) for row in islice(rows, chunk_size)], [])  # plain tuples pickle, pyodbc rows may not
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from build_partial_rows(chunk)
+        return
+
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        print(f"Process pool unavailable ({e}), generating partial payloads in-process")
+        for chunk in chunks:
+            yield from build_partial_rows(chunk)
+        return
+
+    log_debug(f"Generating partial payloads across {workers} processes")
+    pending = deque()
+    broken = False
+    with executor:
+        for chunk in chunks:
+            if broken:
+                yield from build_partial_rows(chunk)
+                continue
+            pending.append((chunk, executor.submit(build_partial_rows, chunk)))
+            if len(pending) >= workers * 2:
+                results, broken = _chunk_results(*pending.popleft(), broken)
+                yield from results
+        while pending:
+            results, broken = _chunk_results(*pending.popleft(), broken)
+            yield from results
+
+
+def _chunk_results(chunk, future, broken):
+    """Worker result for chunk, recomputed in-process if pool has broken"""
+    if not broken:
+        try:
+            return future.result(), False
+        except BrokenProcessPool:
+            print("Partial payload worker pool failed, continuing in-process")
+    return build_partial_rows(chunk), True
+
+
+# ---- Per-block delta (block store) ----
+_EPISODES = "social_care_episodes"
+_EPISODE_LIST = "social_care_episodes[]"   # Marker block, episodes follow as one block each
+_EPISODE_PREFIX = "social_care_episodes/"
+
+
+def split_blocks(payload):
+    """
+    Split payload into ordered (block_key, value) pairs
+
+    Top-level keys are blocks, except social_care_episodes which (if every
+    episode has distinct id) becomes marker block followed by one block per
+    episode, so one changed episode does not move the rest.
+
+    Args:
+        payload: Parsed payload dict
+
+    Returns:
+        List of (block_key, value) in payload order
+    """
+    blocks = []
+    for key, value in payload.items():
+        if key == _EPISODES and isinstance(value, list):
+            keys = [
+                _EPISODE_PREFIX + codec.dumps(ep["social_care_episode_id"])
+                if isinstance(ep, dict) and ep.get("social_care_episode_id") is not None else None
+                for ep in value
+            ]
+            if None not in keys and len(set(keys)) == len(keys):
+                blocks.append((_EPISODE_LIST, None))
+                blocks.extend(zip(keys, value))
+                continue
+        blocks.append((key, value))
+    return blocks
+
+
+def payload_blocks(payload):
+    """
+    Block keys and compact JSON of payload, as diffed per block
+
+    Args:
+        payload: Parsed payload dict
+
+    Returns:
+        (keys, blocks, values): keys in payload order, blocks as
+        {key: JSON bytes}, values as {key: block value}
+    """
+    keys, blocks, values = [], {}, {}
+    for key, value in split_blocks(payload):
+        keys.append(key)
+        blocks[key] = b"" if key == _EPISODE_LIST else codec.dumps_bytes(value)
+        values[key] = value
+    return keys, blocks, values
+
+
+def _block_partial(curr, prev_raw, entry):
+    """
+    generate_partial_payload() with previous payload rebuilt from stored blocks
+
+    Blocks whose digest did not move are taken from current payload itself,
+    so diff short-circuits on identity; only moved blocks are decrypted and
+    parsed from store. Result is same as diffing against parsed previous
+    payload. Without usable entry (first run, last partial never sent, or
+    credentials changed) previous is parsed in full.
+
+    Args:
+        curr: Parsed current payload
+        prev_raw: Previous JSON text, used only without entry
+        entry: (keys, blocks) from BlockStore.lookup(), or None
+
+    Returns:
+        (partial, update): update as (keys, changed blocks as {key: (digest,
+        encrypted body)}, removed keys or None to replace all) for BlockStore.save()
+    """
+    keys, blocks, values = payload_blocks(curr)
+    digests = {k: digest(b) for k, b in blocks.items()}
+
+    prev = None
+    if entry is not None:
+        prev_keys, prev_blocks = entry
+        prev = {}
+        try:
+            for key in prev_keys:
+                if key == _EPISODE_LIST:
+                    prev[_EPISODES] = []
+                    continue
+                block_digest, body = prev_blocks[key]
+                value = values[key] if digests.get(key) == block_digest else codec.loads(unseal(body))
+                if key.startswith(_EPISODE_PREFIX):
+                    prev[_EPISODES].append(value)
+                else:
+                    prev[key] = value
+        except InvalidToken:
+            prev = None  # Written under other credentials
+
+    if prev is None:
+        sealed = {k: (digests[k], seal(b)) for k, b in blocks.items()}
+        return generate_partial_payload(curr, codec.loads(prev_raw)), (keys, sealed, None)
+
+    changed = {k: (digests[k], seal(b)) for k, b in blocks.items() if prev_blocks.get(k, (None,))[0] != digests[k]}
+    removed = [k for k in prev_keys if k not in blocks]
+    return generate_partial_payload(curr, prev), (keys, changed, removed)
+
+
+def to_send_record(pid, payload, current_hash=None):
+    """
+    Build send record from stored payload, or None if payload invalid
+
+    Raw passthrough (RAW_PAYLOAD_PASSTHROUGH) keeps stored JSON text as-is
+    under 'raw', checked only for object delimiters unless
+    RAW_PAYLOAD_VALIDATE also asks for full parse. Otherwise parsed under 'json'.
+    current_hash of row read travels with record, so its outcome is only
+    applied while row still holds that payload (see journal.reconcile).
+
+    Args:
+        pid: Person identifier
+        payload: Stored JSON text
+        current_hash: Staging current_hash of row (bytes), if known
+
+    Returns:
+        Record dict with 'person_id', 'current_hash' and 'raw' or 'json', or None
+    """
+    if current_hash is not None:
+        current_hash = bytes(current_hash)  # psycopg2 bytea is memoryview
+    try:
+        if RAW_PAYLOAD_PASSTHROUGH:
+            raw = payload.strip()
+            if not (raw.startswith("{") and raw.endswith("}")):
+                raise ValueError("not a JSON object")
+            if RAW_PAYLOAD_VALIDATE:
+                codec.loads(raw)
+            return {"person_id": pid, "current_hash": current_hash, "raw": raw}
+        return {"person_id": pid, "current_hash": current_hash, "json": codec.loads(payload)}  # Parse JSON safely
+    except Exception:
+        print(f"Skipping invalid JSON for person_id {pid}")
+        return None
+
+
+@metrics.timed("recursive_diff()", sample_every=_HOT_SAMPLE_EVERY, enabled=DEBUG)  # Performance monitor
 def recursive_diff(curr, prev):
-    # [DIAG] Start timing and count
-    global _recursive_diff_call_count, _recursive_diff_total_time  # [DIAG]
-    _recursive_diff_call_count += 1  # [DIAG]
-    _start = perf_counter()  # [DIAG]
+    """
+    Diff current against previous, descending only into branches that differ
+
+    Unchanged branches short-circuit on identity or C-level equality (stops
+    at first difference), so they are never walked in Python. A changed
+    branch is compared again at each level it is descended through, so deep
+    changes cost one equality check per nesting level.
+
+    Args:
+        curr: Current value
+        prev: Previous value
 
+    Returns:
+        Dict of differences for dicts, else changed value or {} if equal
+    """
     if isinstance(curr, dict) and isinstance(prev, dict):
         diff = {}
 
-        for key in curr:
-            # Skip if key unchanged
-            if key not in prev or curr[key] != prev[key]:
-
-                # Recurse into nested dicts
-                if isinstance(curr[key], dict) and isinstance(prev.get(key), dict):
-                    nested = recursive_diff(curr[key], prev[key])
-                    if nested:
-                        diff[key] = nested  # Include only if changes present
-
-                # Recurse into lists
-                elif isinstance(curr[key], list) and isinstance(prev.get(key), list):
-                    if curr[key] != prev[key]:
-                        # Pass parent key to control 'purge' inclusion
-                        diff[key] = prune_unchanged_list(
-                            curr[key], prev[key], parent_key=key
-                        )
-
-                # Handle scalars or mismatched types
-                else:
-                    diff[key] = curr[key]
+        for key, curr_val in curr.items():
+            # New key
+            if key not in prev:
+                diff[key] = curr_val
+                continue
+
+            # Skip if branch unchanged
+            prev_val = prev[key]
+            if curr_val is prev_val or curr_val == prev_val:
+                continue
+
+            # Recurse into nested dicts
+            if isinstance(curr_val, dict) and isinstance(prev_val, dict):
+                nested = recursive_diff(curr_val, prev_val)
+                if nested:
+                    diff[key] = nested  # Include only if changes present
+
+            # Recurse into lists, pass parent key to control 'purge' inclusion
+            elif isinstance(curr_val, list) and isinstance(prev_val, list):
+                diff[key] = prune_unchanged_list(curr_val, prev_val, parent_key=key)
+
+            # Handle scalars or mismatched types
+            else:
+                diff[key] = curr_val
 
-        _recursive_diff_total_time += perf_counter() - _start  # [DIAG]
         return diff  # Return dict of differences
 
     # Return scalar diff, or empty if no change
-    result = {} if curr == prev else curr
-    _recursive_diff_total_time += perf_counter() - _start  # [DIAG]
-    return result
+    return {} if curr == prev else curr
+
+
+def _detect_id_key(item):
+    """
+    Return first '_id' suffixed key of list item, or None
 
+    Args:
+        item: List element (dict for matchable items, scalar otherwise)
+
+    Returns:
+        Key name used as item identifier, or None if not matchable
+    """
+    if not isinstance(item, dict):
+        return None
+    for k in item:
+        if k.endswith("_id"):
+            return k
+    return None
+
+
+def _build_id_index(items, id_key):
+    """
+    Map id value -> positions of items carrying that value, built once per list
+
+    Items without the key, with a null id, or with an unhashable id are left
+    out of the index and so never match (treated as new|removed)
+
+    Args:
+        items: Previous list items
+        id_key: Identifier key to index on
+
+    Returns:
+        Dict of id value to list of item positions, in list order
+    """
+    index = {}
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        value = item.get(id_key)
+        if value is None:
+            continue
+        try:
+            index.setdefault(value, []).append(pos)
+        except TypeError:
+            continue  # Unhashable id (dict/list), cannot match by id
+    return index
+
+
+def _match_previous(curr_item, id_key, prev_list, index, matched):
+    """
+    Find previous item for current item using id index
+
+    Composite ids: if item carries several '_id' keys, prefer candidate that
+    agrees on all of them. Duplicate ids pair up in list order before any
+    previous item is reused.
 
-@benchmark_section("prune_unchanged_list()")  # Performance monitor
+    Args:
+        curr_item: Current list item
+        id_key: Primary identifier key of current item
+        prev_list: Previous list items
+        index: Id index of previous list for id_key
+        matched: Set of already matched previous positions (updated in place)
+
+    Returns:
+        Matched previous item, or None
+    """
+    value = curr_item.get(id_key)
+    if value is None:
+        return None
+    try:
+        candidates = index.get(value)
+    except TypeError:
+        return None
+    if not candidates:
+        return None
+
+    if len(candidates) > 1:
+        extra_keys = [k for k in curr_item if k != id_key and k.endswith("_id")]
+        if extra_keys:
+            composite = [
+                pos for pos in candidates
+                if all(prev_list[pos].get(k) == curr_item[k] for k in extra_keys)
+            ]
+            candidates = composite or candidates
+
+    # First unmatched candidate, else reuse first (legacy first-match behaviour)
+    pos = next((p for p in candidates if p not in matched), candidates[0])
+    matched.add(pos)
+    return prev_list[pos]
+
+
+@metrics.timed("prune_unchanged_list()", sample_every=_HOT_SAMPLE_EVERY, enabled=DEBUG)  # Performance monitor
 def prune_unchanged_list(curr_list, prev_list, parent_key=None):
-    # [DIAG] Start timing and count
-    global _prune_call_count, _prune_total_time  # [DIAG]
-    _prune_call_count += 1  # [DIAG]
-    _start = perf_counter()  # [DIAG]
+    """
+    Diff list of items against previous list, matched by '_id' key
+
+    Previous items are indexed by id once per list (O(n + m)) rather than
+    scanned per current item. Unmatched current items are kept in full,
+    matched items reduce to their diff plus id, and previous items no longer
+    present are returned as purge markers for allowed blocks.
+
+    Args:
+        curr_list: Current list items
+        prev_list: Previous list items
+        parent_key: Key of list in parent, controls 'purge' inclusion
 
+    Returns:
+        List of new, changed and removed items
+    """
     result = []
+    purge_allowed = parent_key in ALLOWED_PURGE_BLOCKS
+
+    indexes = {}      # id_key -> id index of prev_list, usually one per block
+    matched = set()   # positions in prev_list paired with a current item
+    seen_ids = set()  # (id_key, value) pairs present in curr_list
 
     for curr_item in curr_list:
         matched_prev = None
 
         # Detect ID key
-        id_key = next((k for k in curr_item if k.endswith("_id")), None)
+        id_key = _detect_id_key(curr_item)
 
         if id_key:
-            # Find match in previous by ID
-            for prev_item in prev_list:
-                if prev_item.get(id_key) == curr_item.get(id_key):
-                    matched_prev = prev_item
-                    break
+            try:
+                seen_ids.add((id_key, curr_item[id_key]))
+            except TypeError:
+                pass
+            index = indexes.get(id_key)
+            if index is None:
+                index = indexes[id_key] = _build_id_index(prev_list, id_key)
+            matched_prev = _match_previous(curr_item, id_key, prev_list, index, matched)
 
         if matched_prev:
             # Diff current item against matched previous
             item_diff = recursive_diff(curr_item, matched_prev)
 
             # Always retain ID key
-            if id_key:
-                item_diff[id_key] = curr_item[id_key]
+            item_diff[id_key] = curr_item[id_key]
 
             if item_diff:
                 # Set 'purge' flag only for allowed blocks
-                if parent_key in ALLOWED_PURGE_BLOCKS:
+                if purge_allowed:
                     item_diff["purge"] = False
                 result.append(item_diff)
 
@@ -151,20 +631,31 @@ def prune_unchanged_list(curr_list, prev_list, parent_key=None):
             # Unmatched: treat as new item
             result.append(curr_item)
 
-    _prune_total_time += perf_counter() - _start  # [DIAG]
+    # Previous items whose id no longer appears in current list have been removed
+    if purge_allowed:
+        for pos, prev_item in enumerate(prev_list):
+            if pos in matched:
+                continue
+            prev_id_key = _detect_id_key(prev_item)
+            if not prev_id_key or prev_item[prev_id_key] is None:
+                continue
+            try:
+                if (prev_id_key, prev_item[prev_id_key]) in seen_ids:
+                    continue  # Duplicate of an id still present, not a removal
+            except TypeError:
+                continue
+            result.append({prev_id_key: prev_item[prev_id_key], "purge": True})
+
     return result
 
 
-# [DIAG] summarise usage and timings
+# [DIAG] summarise usage and timings (DEBUG only, hot paths unwrapped otherwise)
 def print_diff_stats():
-    print(f"\n[DIAG] recursive_diff() calls: {_recursive_diff_call_count}")
-    print(f"[DIAG] Total time in recursive_diff(): {_recursive_diff_total_time:.2f}s")
-    if _recursive_diff_call_count:
-        print(f"[DIAG] Avg time per recursive_diff(): {_recursive_diff_total_time / _recursive_diff_call_count:.6f}s")
-
-    print(f"\n[DIAG] prune_unchanged_list() calls: {_prune_call_count}")
-    print(f"[DIAG] Total time in prune_unchanged_list(): {_prune_total_time:.2f}s")
-    if _prune_call_count:
-        print(f"[DIAG] Avg time per prune_unchanged_list(): {_prune_total_time / _prune_call_count:.6f}s")
-
-
+    for label in ("recursive_diff()", "prune_unchanged_list()"):
+        calls = metrics.get_counter(f"{label} calls")
+        hist = metrics.get_histogram(label)
+        print(f"\n[DIAG] {label} calls: {calls}")
+        if calls and hist:
+            avg = hist.total / hist.count
+            print(f"[DIAG] Est. total time in {label}: {avg * calls:.2f}s (sampled {hist.count})")
+            print(f"[DIAG] Avg time per {label}: {avg:.6f}s")
@@ -0,0 +1,126 @@
+# api_pipeline/rate_limit.py
+#
+# Client-side rate limiter shared by all batch senders (incl. worker threads)
+# Paces requests by requests/sec and bytes/sec, pauses everyone when API
+# answers 429 (honouring Retry-After), and adapts rate to throttling:
+# halve on 429, creep back up on success (AIMD)
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from . import metrics
+from .config import API_MAX_RPS, API_MAX_BYTES_PER_SEC
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from . import metrics
+#     from .config import API_MAX_RPS, API_MAX_BYTES_PER_SEC
+# except ImportError:
+#     import metrics
+#     from config import API_MAX_RPS, API_MAX_BYTES_PER_SEC
+
+MIN_RATE_FACTOR = 0.05    # Floor for adaptive slow-down (5% of configured rate)
+DECREASE_FACTOR = 0.5     # Multiplicative decrease on 429
+INCREASE_STEP = 0.05      # Additive increase per accepted request
+MAX_RETRY_AFTER = 300     # Seconds, cap on server supplied pause
+
+
+def parse_retry_after(value):
+    """
+    Parse Retry-After header (delta seconds or HTTP date)
+
+    Args:
+        value: Header value or None
+
+    Returns:
+        Seconds to wait (capped at MAX_RETRY_AFTER), or None if absent|unreadable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class RateLimiter:
+    """
+    Shared pacing for API submissions
+
+    Requests are scheduled on virtual time slots: each acquire() reserves
+    next free slot under lock then sleeps outside it, so concurrent senders
+    queue fairly. 0 for a limit means unlimited; if unlimited and API
+    throttles, limiter starts pacing from observed send rate.
+    """
+
+    def __init__(self, max_rps=API_MAX_RPS, max_bytes_per_sec=API_MAX_BYTES_PER_SEC):
+        self.max_rps = max_rps or None
+        self.max_bps = max_bytes_per_sec or None
+        self.factor = 1.0              # Adaptive share of configured rate
+        self._lock = threading.Lock()
+        self._next_request = 0.0       # Monotonic time of next free request slot
+        self._next_bytes = 0.0         # Monotonic time byte budget next available
+        self._pause_until = 0.0        # Monotonic time of Retry-After pause end
+        self._recent = deque(maxlen=20)
+
+    def acquire(self, nbytes=0):
+        """
+        Block until request of nbytes may be sent
+
+        Args:
+            nbytes: Request body size
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._pause_until, self._next_request, self._next_bytes)
+            if self.max_rps:
+                self._next_request = start + 1.0 / (self.max_rps * self.factor)
+            if self.max_bps:
+                self._next_bytes = start + nbytes / (self.max_bps * self.factor)
+            self._recent.append(start)
+
+        wait = start - now
+        if wait > 0:
+            metrics.observe("rate limiter wait", wait)
+            time.sleep(wait)
+
+    def on_success(self):
+        """Accepted request: recover rate gradually towards configured limit"""
+        with self._lock:
+            self.factor = min(1.0, self.factor + INCREASE_STEP)
+
+    def on_throttled(self, retry_after=None, fallback_delay=5.0):
+        """
+        429 received: pause all senders and slow down
+
+        Args:
+            retry_after: Seconds from Retry-After header, if given
+            fallback_delay: Pause if server gave no Retry-After
+        """
+        metrics.incr("rate limiter throttled")
+        with self._lock:
+            now = time.monotonic()
+            pause = retry_after if retry_after is not None else fallback_delay
+            self._pause_until = max(self._pause_until, now + pause)
+
+            if self.max_rps is None and len(self._recent) > 1:
+                # Unlimited so far: start pacing from observed send rate
+                span = self._recent[-1] - self._recent[0]
+                if span > 0:
+                    self.max_rps = (len(self._recent) - 1) / span
+                    self.factor = 1.0
+            self.factor = max(MIN_RATE_FACTOR, self.factor * DECREASE_FACTOR)
+
+            rps = f"{self.max_rps * self.factor:.2f} req/s" if self.max_rps else "unpaced"
+            print(f"Rate limited: pausing senders {pause:.1f}s, rate now {rps}")
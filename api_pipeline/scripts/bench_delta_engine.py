@@ -0,0 +1,286 @@
+# api_pipeline/scripts/bench_delta_engine.py
+#
+# Dev only delta engine benchmark (not shipped, api_pipeline/scripts pruned from package)
+# Runs generate_partial_payload, recursive_diff, prune_unchanged_list and
+# build_partial_rows (parse + diff + serialise) over parametrised synthetic
+# current|previous payload pairs:
+#   episodes    - social_care_episodes per child (document size)
+#   list-len    - items per nested list block
+#   depth       - extra nested object levels inside each list item
+#   change      - share of list items|fields changed between previous and current
+# Reports throughput, latency percentiles and tracemalloc peak per call,
+# writes results as JSON and flags regressions against a saved baseline
+#
+# Usage (from repo root):
+#   python -m api_pipeline.scripts.bench_delta_engine --out delta_baseline.json
+#   python -m api_pipeline.scripts.bench_delta_engine --baseline delta_baseline.json --out delta_latest.json
+#   python -m api_pipeline.scripts.bench_delta_engine --episodes 50 --list-len 20 --depth 0 --change 0.01 --pairs 50
+#
+# Exit code 1 if any scenario|target regresses beyond --threshold (CI friendly).
+# Baselines are machine specific, compare runs from same host only.
+
+import argparse
+import gc
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from api_pipeline import codec, metrics
+from api_pipeline.payload import build_partial_rows, generate_partial_payload, prune_unchanged_list, recursive_diff
+
+_BLOCKS = ("care_worker_details", "child_and_family_assessments", "child_in_need_plans",
+           "section_47_assessments", "child_protection_plans", "child_looked_after_placements")
+_ID_KEYS = {
+    "care_worker_details": "worker_id",
+    "child_and_family_assessments": "child_and_family_assessment_id",
+    "child_in_need_plans": "child_in_need_plan_id",
+    "section_47_assessments": "section_47_assessment_id",
+    "child_protection_plans": "child_protection_plan_id",
+    "child_looked_after_placements": "child_looked_after_placement_id",
+}
+
+# Compared against baseline; higher is worse for all
+_REGRESSION_METRICS = ("p50_us", "p95_us", "peak_kib")
+
+
+def _nested(rng, depth):
+    """depth levels of nested objects, leaf carries changeable value"""
+    node = {"code": rng.choice(["A1", "B2", "C3"]), "value": rng.randint(0, 999)}
+    for level in range(depth):
+        node = {"level": level, "note": f"n{rng.randrange(10 ** 6)}", "detail": node}
+    return node
+
+
+def _item(rng, block, item_id, depth):
+    item = {
+        _ID_KEYS[block]: item_id,
+        "start_date": f"2022-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "end_date": None,
+        "purge": False,
+    }
+    if depth:
+        item["detail"] = _nested(rng, depth)
+    return item
+
+
+def make_payload(rng, n, episodes, list_len, depth):
+    """Staging-shaped previous payload with fixed block sizes"""
+    return {
+        "la_child_id": f"Child{n:07d}",
+        "mis_child_id": f"Supplier-Child-{n:07d}",
+        "child_details": {
+            "unique_pupil_number": f"A{rng.randrange(10 ** 11, 10 ** 12)}",
+            "surname": "Doe",
+            "postcode": "AB12 3DE",
+            "disabilities": ["HAND", "VIS"],
+            "purge": False,
+        },
+        "social_care_episodes": [
+            dict(
+                {"social_care_episode_id": f"E{n:07d}{e:03d}", "referral_date": "2022-06-14", "purge": False},
+                **{b: [_item(rng, b, f"{b[:3].upper()}{n:07d}{e:03d}{i:03d}", depth) for i in range(list_len)] for b in _BLOCKS},
+            )
+            for e in range(episodes)
+        ],
+        "purge": False,
+    }
+
+
+def _leaf(item):
+    while "detail" in item:
+        item = item["detail"]
+    return item
+
+
+def apply_changes(rng, payload, change, depth):
+    """
+    Current payload from previous: each list item changed with probability
+    change (edit deepest field 70%, removed 15%, new item added 15%)
+    """
+    curr = codec.loads(codec.dumps(payload))
+    if rng.random() < change:
+        curr["child_details"]["postcode"] = "ZZ9 9ZZ"
+    for e, episode in enumerate(curr["social_care_episodes"]):
+        for block in _BLOCKS:
+            kept = []
+            for item in episode[block]:
+                if rng.random() >= change:
+                    kept.append(item)
+                    continue
+                op = rng.random()
+                if op < 0.7:
+                    if depth:
+                        _leaf(item)["value"] += 1
+                    else:
+                        item["end_date"] = "2023-01-01"
+                    kept.append(item)
+                elif op < 0.85:
+                    continue  # Removed, diff emits purge marker
+                else:
+                    kept.append(item)
+                    kept.append(_item(rng, block, f"NEW{rng.randrange(10 ** 9)}", depth))
+            episode[block] = kept
+    return curr
+
+
+def make_pairs(seed, pairs, episodes, list_len, depth, change):
+    """(current, previous, current_raw, previous_raw) tuples, deterministic from seed"""
+    rng = random.Random(f"{seed}:{episodes}:{list_len}:{depth}:{change}")
+    result = []
+    for n in range(pairs):
+        prev = make_payload(rng, n, episodes, list_len, depth)
+        curr = apply_changes(rng, prev, change, depth)
+        result.append((curr, prev, codec.dumps(curr), codec.dumps(prev)))
+    return result
+
+
+_TARGETS = {
+    "generate_partial_payload": lambda c, p, cr, pr: generate_partial_payload(c, p),
+    "recursive_diff": lambda c, p, cr, pr: recursive_diff(c, p),
+    "prune_unchanged_list": lambda c, p, cr, pr: prune_unchanged_list(
+        c["social_care_episodes"], p["social_care_episodes"], "social_care_episodes"),
+    "build_partial_rows": lambda c, p, cr, pr: build_partial_rows([(c["la_child_id"], "updated", cr, pr)]),
+}
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(func, pairs, repeat):
+    """
+    Time func over all pairs repeat times, then one traced pass for allocations
+
+    Returns:
+        Dict of ops_per_s (best pass), mean|p50|p95|p99 latency (us), peak_kib per call
+    """
+    samples = []
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start_pass = time.perf_counter()
+        for pair in pairs:
+            t0 = time.perf_counter_ns()
+            func(*pair)
+            samples.append(time.perf_counter_ns() - t0)
+        best = min(best, time.perf_counter() - start_pass)
+
+    # Allocation pass separate, tracemalloc slows calls several times
+    peaks = []
+    tracemalloc.start()
+    try:
+        for pair in pairs:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            func(*pair)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    samples.sort()
+    return {
+        "ops_per_s": round(len(pairs) / best, 1),
+        "mean_us": round(sum(samples) / len(samples) / 1000, 2),
+        "p50_us": round(_percentile(samples, 50) / 1000, 2),
+        "p95_us": round(_percentile(samples, 95) / 1000, 2),
+        "p99_us": round(_percentile(samples, 99) / 1000, 2),
+        "peak_kib": round(sum(peaks) / len(peaks) / 1024, 2),
+    }
+
+
+def scenario_key(episodes, list_len, depth, change):
+    return f"ep{episodes}-len{list_len}-d{depth}-chg{change:g}"
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of results against baseline
+
+    Returns:
+        List of (scenario, target, metric, baseline value, current value, ratio)
+    """
+    regressions = []
+    for key, targets in results.items():
+        for target, stats in targets.items():
+            ref = baseline.get(key, {}).get(target)
+            if not ref:
+                continue
+            for metric in _REGRESSION_METRICS:
+                old, new = ref.get(metric), stats.get(metric)
+                if old and new and new > old * (1 + threshold):
+                    regressions.append((key, target, metric, old, new, new / old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark delta engine with regression tracking")
+    parser.add_argument("--episodes", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--list-len", type=int, nargs="+", default=[2, 8])
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 3])
+    parser.add_argument("--change", type=float, nargs="+", default=[0.0, 0.05, 0.3])
+    parser.add_argument("--targets", nargs="+", choices=sorted(_TARGETS), default=list(_TARGETS))
+    parser.add_argument("--pairs", type=int, default=100, help="Payload pairs per scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per scenario|target")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown|growth, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"JSON codec backend: {codec.BACKEND}")
+    print(f"{'scenario':<26} {'target':<25} {'ops/s':>10} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'peak KiB':>9} {'vs base':>8}")
+
+    results = {}
+    for episodes, list_len, depth, change in itertools.product(args.episodes, args.list_len, args.depth, args.change):
+        key = scenario_key(episodes, list_len, depth, change)
+        pairs = make_pairs(args.seed, args.pairs, episodes, list_len, depth, change)
+        results[key] = {}
+        for target in args.targets:
+            metrics.reset()  # Keep @metrics.timed state from growing across scenarios
+            stats = results[key][target] = measure(_TARGETS[target], pairs, args.repeat)
+            ref = baseline.get(key, {}).get(target, {}).get("p50_us")
+            vs = f"{stats['p50_us'] / ref:>7.2f}x" if ref else ""
+            print(
+                f"{key:<26} {target:<25} {stats['ops_per_s']:>10,.0f} {stats['p50_us']:>9.1f} "
+                f"{stats['p95_us']:>9.1f} {stats['p99_us']:>9.1f} {stats['peak_kib']:>9.1f} {vs:>8}"
+            )
+
+    if args.out:
+        document = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "codec": codec.BACKEND,
+                "pairs": args.pairs,
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "results": results,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for key, target, metric, old, new, ratio in regressions:
+                print(f"  REGRESSION {key} {target} {metric}: {old} -> {new} ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
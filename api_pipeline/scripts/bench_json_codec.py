@@ -0,0 +1,135 @@
+# api_pipeline/scripts/bench_json_codec.py
+#
+# Dev only micro-benchmark (not shipped, api_pipeline/scripts pruned from package)
+# Compares JSON codec backends (stdlib, orjson, ujson if installed) on
+# staging-shaped payloads: parse of stored json_payload, serialise of
+# partial payloads, and batch request body build
+#
+# Usage (from repo root):
+#   python -m api_pipeline.scripts.bench_json_codec
+#   python -m api_pipeline.scripts.bench_json_codec --records 2000 --episodes 1 5 25 --repeat 5
+
+import argparse
+import random
+import time
+
+from api_pipeline import codec
+
+
+def _make_episode(i, rng):
+    day = f"2022-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return {
+        "social_care_episode_id": f"EP{i:07d}",
+        "referral_date": day,
+        "referral_source": rng.choice(["1A", "1C", "2B", "3E"]),
+        "referral_no_further_action_flag": rng.random() < 0.2,
+        "care_worker_details": [
+            {"worker_id": f"W{rng.randint(1, 400)}", "start_date": day, "end_date": None}
+            for _ in range(rng.randint(1, 3))
+        ],
+        "child_and_family_assessments": [{
+            "child_and_family_assessment_id": f"CFA{i:07d}",
+            "start_date": day,
+            "authorisation_date": day,
+            "factors": rng.sample(["1A", "1C", "2B", "3C", "4A", "6C", "21"], 3),
+            "purge": False,
+        }],
+        "child_in_need_plans": [{"child_in_need_plan_id": f"CIN{i:07d}", "start_date": day, "end_date": None, "purge": False}],
+        "section_47_assessments": [{
+            "section_47_assessment_id": f"S47{i:07d}",
+            "start_date": day,
+            "icpc_required_flag": True,
+            "icpc_date": day,
+            "end_date": None,
+            "purge": False,
+        }],
+        "child_protection_plans": [{"child_protection_plan_id": f"CPP{i:07d}", "start_date": day, "end_date": None, "purge": False}],
+        "child_looked_after_placements": [],
+        "closure_date": None,
+        "closure_reason": None,
+    }
+
+
+def _make_record(n, episodes, rng):
+    """Staging-shaped child payload with given number of social care episodes"""
+    return {
+        "la_child_id": f"Child{n:07d}",
+        "mis_child_id": f"Supplier-Child-{n:07d}",
+        "child_details": {
+            "unique_pupil_number": f"A{rng.randint(10 ** 11, 10 ** 12 - 1)}",
+            "first_name": rng.choice(["John", "Aoife", "Zoë", "Mohammed", "Łucja"]),
+            "surname": rng.choice(["Doe", "O'Neill", "Nguyễn", "Smith"]),
+            "date_of_birth": "2015-06-14",
+            "sex": rng.choice(["M", "F", "U"]),
+            "ethnicity": "WBRI",
+            "disabilities": ["HAND", "VIS"][:rng.randint(0, 2)],
+            "postcode": "AB12 3DE",
+            "uasc_flag": False,
+            "purge": False,
+        },
+        "health_and_wellbeing": {
+            "sdq_assessments": [{"date": "2022-06-14", "score": rng.randint(0, 40)}],
+            "purge": False,
+        },
+        "social_care_episodes": [_make_episode(n * 100 + e, rng) for e in range(episodes)],
+    }
+
+
+def _backends():
+    """Available (name, loads, dumps_bytes) with pipeline output options"""
+    backends = [("stdlib", codec._std_loads, codec._std_dumps_bytes)]
+    if codec.orjson is not None:
+        backends.append(("orjson", codec._orjson_loads, codec._orjson_dumps_bytes))
+    if codec.ujson is not None:
+        backends.append(("ujson", codec._ujson_loads, codec._ujson_dumps_bytes))
+    return backends
+
+
+def _best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON codec backends")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--episodes", type=int, nargs="+", default=[1, 5, 25])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    backends = _backends()
+    print(f"Pipeline codec backend: {codec.BACKEND}")
+    print(f"{'episodes':>8} {'avg KiB':>8} {'backend':>8} {'loads (ms)':>11} {'dumps (ms)':>11} {'batch (ms)':>11} {'vs stdlib':>10}")
+
+    for episodes in args.episodes:
+        records = [_make_record(n, episodes, rng) for n in range(args.records)]
+        raws = [codec._std_dumps(r) for r in records]
+        avg_kib = sum(len(r.encode("utf-8")) for r in raws) / len(raws) / 1024
+        batches = [records[i:i + args.batch_size] for i in range(0, len(records), args.batch_size)]
+
+        baseline = None
+        for name, loads, dumps_bytes in backends:
+            # Sanity: same parsed result and same bytes as stdlib
+            assert loads(raws[0]) == records[0]
+            assert dumps_bytes(records[0]) == codec._std_dumps_bytes(records[0])
+
+            t_loads = _best_of(lambda: [loads(r) for r in raws], args.repeat)
+            t_dumps = _best_of(lambda: [dumps_bytes(r) for r in records], args.repeat)
+            t_batch = _best_of(lambda: [dumps_bytes(b) for b in batches], args.repeat)
+            total = t_loads + t_dumps + t_batch
+            baseline = baseline or total
+            print(
+                f"{episodes:>8} {avg_kib:>8.1f} {name:>8} {t_loads * 1000:>11.2f} "
+                f"{t_dumps * 1000:>11.2f} {t_batch * 1000:>11.2f} {baseline / total:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
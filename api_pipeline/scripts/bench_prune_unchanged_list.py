@@ -0,0 +1,103 @@
+# api_pipeline/scripts/bench_prune_unchanged_list.py
+#
+# Dev only micro-benchmark (not shipped, api_pipeline/scripts pruned from package)
+# Compares id-indexed prune_unchanged_list() against previous nested linear scan
+# on large synthetic lists, e.g. children with hundreds of social_care_episodes
+#
+# Usage (from repo root):
+#   python -m api_pipeline.scripts.bench_prune_unchanged_list
+#   python -m api_pipeline.scripts.bench_prune_unchanged_list --sizes 100 500 2000 --repeat 5
+
+import argparse
+import copy
+import random
+import time
+
+from api_pipeline.payload import prune_unchanged_list, recursive_diff
+
+
+def _linear_prune(curr_list, prev_list, parent_key=None):
+    """Previous O(n*m) implementation, kept here as benchmark reference"""
+    result = []
+    for curr_item in curr_list:
+        matched_prev = None
+        id_key = next((k for k in curr_item if k.endswith("_id")), None)
+        if id_key:
+            for prev_item in prev_list:
+                if prev_item.get(id_key) == curr_item.get(id_key):
+                    matched_prev = prev_item
+                    break
+        if matched_prev:
+            item_diff = recursive_diff(curr_item, matched_prev)
+            if id_key:
+                item_diff[id_key] = curr_item[id_key]
+            if item_diff:
+                item_diff["purge"] = False
+                result.append(item_diff)
+        else:
+            result.append(curr_item)
+    return result
+
+
+def _make_episode(i):
+    return {
+        "social_care_episode_id": f"EP{i:07d}",
+        "referral_date": "2022-06-14",
+        "referral_source": "1C",
+        "referral_no_further_action_flag": False,
+        "care_worker_details": [{"worker_id": f"W{i % 50}", "start_date": "2022-06-14"}],
+        "closure_date": "2023-01-01",
+        "closure_reason": "RC7",
+        "purge": False,
+    }
+
+
+def _make_lists(size, change_ratio, rng):
+    """Build prev/curr lists, shuffled, with a share of changed, added and removed items"""
+    prev_list = [_make_episode(i) for i in range(size)]
+    curr_list = copy.deepcopy(prev_list)
+    for item in curr_list:
+        if rng.random() < change_ratio:
+            item["closure_reason"] = "RC8"
+    n_churn = max(1, int(size * change_ratio / 2))
+    del curr_list[:n_churn]                                     # removed
+    curr_list.extend(_make_episode(size + i) for i in range(n_churn))  # added
+    rng.shuffle(curr_list)
+    return curr_list, prev_list
+
+
+def _time_it(func, curr_list, prev_list, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(curr_list, prev_list, parent_key="social_care_episodes")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prune_unchanged_list()")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 3000])
+    parser.add_argument("--change-ratio", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    print(f"{'items':>8} {'linear (ms)':>12} {'indexed (ms)':>13} {'speed-up':>9}")
+    for size in args.sizes:
+        curr_list, prev_list = _make_lists(size, args.change_ratio, rng)
+
+        # Sanity: indexed output matches linear output, plus removal markers
+        indexed = prune_unchanged_list(curr_list, prev_list, parent_key="social_care_episodes")
+        linear = _linear_prune(curr_list, prev_list, parent_key="social_care_episodes")
+        assert [r for r in indexed if r.get("purge") is not True] == linear
+
+        t_linear = _time_it(_linear_prune, curr_list, prev_list, args.repeat)
+        t_indexed = _time_it(prune_unchanged_list, curr_list, prev_list, args.repeat)
+        print(f"{size:>8} {t_linear * 1000:>12.2f} {t_indexed * 1000:>13.2f} {t_linear / t_indexed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
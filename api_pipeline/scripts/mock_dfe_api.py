@@ -0,0 +1,279 @@
+# api_pipeline/scripts/mock_dfe_api.py
+#
+# Dev only local stand-in for DfE CSC API (not shipped, api_pipeline/scripts pruned from package)
+# Serves token endpoint and children_social_care_data/{LA_CODE}/children
+# so process_batches can be exercised offline: configurable latency, and
+# injected 429 (with Retry-After), 413 (body over size) and 400 (bad records)
+#
+# Usage (from repo root):
+#   python -m api_pipeline.scripts.mock_dfe_api --port 8765 --latency-ms 80 --p429 0.05 --max-bytes 1000000
+#
+# Then point pipeline at it, e.g. in .env:
+#   API_ENDPOINT=http://127.0.0.1:8765
+#   TOKEN_ENDPOINT=http://127.0.0.1:8765/oauth2/token
+#
+# In-process (benchmarks): server = start_server(MockSettings(latency_ms=50)); ...; server.shutdown()
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+CHILDREN_PATH = re.compile(r"^/children_social_care_data/(?P<la_code>[^/]+)/children/?$")
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of mock API, all injection off by default"""
+    latency_ms: float = 0.0        # Base latency added to every children POST
+    jitter_ms: float = 0.0         # Uniform random extra latency
+    ms_per_kib: float = 0.0        # Extra latency per KiB of (decompressed) body
+    p429: float = 0.0              # Probability of 429 per request
+    retry_after: float = 1.0       # Retry-After seconds sent with 429
+    max_rps: float = 0.0           # Server side rate limit, 429 above this (0 = off)
+    max_bytes: int = 0             # 413 if request body larger (0 = off)
+    p400: float = 0.0              # Share of records rejected (same record always), batch answers 400
+    token_ttl: int = 3600          # expires_in of issued tokens
+    accept_gzip: bool = True       # False answers gzip bodies with 415
+    seed: int = None
+
+
+@dataclass
+class MockStats:
+    """Request counters, readable while server runs"""
+    requests: int = 0
+    records_accepted: int = 0
+    tokens_issued: int = 0
+    bytes_received: int = 0
+    status_counts: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, status, nbytes=0, accepted=0):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += nbytes
+            self.records_accepted += accepted
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            codes = ", ".join(f"{k}: {v}" for k, v in sorted(self.status_counts.items()))
+            return (
+                f"requests={self.requests} records_accepted={self.records_accepted} "
+                f"tokens_issued={self.tokens_issued} bytes={self.bytes_received} [{codes}]"
+            )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockDfeApi/1.0"
+    protocol_version = "HTTP/1.1"  # Keep-alive, like real endpoint
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _reply(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self.path.split("?", 1)[0]
+        if path.rstrip("/").endswith("/token"):
+            return self._token(body)
+        match = CHILDREN_PATH.match(path)
+        if match:
+            return self._children(body)
+        self.server.stats.count(404, len(body))
+        return self._reply(404, {"error": f"Unknown path {path}"})
+
+    def _token(self, body):
+        form = parse_qs(body.decode("utf-8", "replace"))
+        if form.get("grant_type", [""])[0] != "client_credentials":
+            self.server.stats.count(400, len(body))
+            return self._reply(400, {"error": "unsupported_grant_type"})
+        token = f"mock-{uuid.uuid4().hex}"
+        with self.server.token_lock:
+            self.server.tokens[token] = time.time() + self.server.settings.token_ttl
+        with self.server.stats.lock:
+            self.server.stats.tokens_issued += 1
+        self.server.stats.count(200, len(body))
+        return self._reply(200, {
+            "access_token": token,
+            "token_type": "Bearer",
+            "expires_in": self.server.settings.token_ttl,
+        })
+
+    def _children(self, body):
+        settings = self.server.settings
+        rng = self.server.rng
+        nbytes = len(body)
+
+        # Auth: bearer token issued by this server and not expired
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:].strip() if auth.lower().startswith("bearer ") else None
+        with self.server.token_lock:
+            expires = self.server.tokens.get(token)
+        if expires is None or expires < time.time():
+            self.server.stats.count(401, nbytes)
+            return self._reply(401, {"error": "Invalid or expired token"})
+
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            if not settings.accept_gzip:
+                self.server.stats.count(415, nbytes)
+                return self._reply(415, {"error": "Unsupported Content-Encoding"})
+            try:
+                body = gzip.decompress(body)
+            except OSError:
+                self.server.stats.count(400, nbytes)
+                return self._reply(400, {"error": "Invalid gzip body"})
+
+        if settings.max_bytes and len(body) > settings.max_bytes:
+            self.server.stats.count(413, nbytes)
+            return self._reply(413, {"error": f"Payload {len(body)} bytes exceeds {settings.max_bytes}"})
+
+        if self._throttled(rng):
+            self.server.stats.count(429, nbytes)
+            return self._reply(429, {"error": "Rate limit exceeded"}, {"Retry-After": f"{settings.retry_after:g}"})
+
+        delay = settings.latency_ms + rng.random() * settings.jitter_ms + settings.ms_per_kib * len(body) / 1024
+        if delay:
+            time.sleep(delay / 1000)
+
+        try:
+            records = json.loads(body)
+        except ValueError as e:
+            self.server.stats.count(400, nbytes)
+            return self._reply(400, {"error": f"Malformed JSON: {e}"})
+        if not isinstance(records, list):
+            self.server.stats.count(400, nbytes)
+            return self._reply(400, {"error": "Expected JSON array of children"})
+
+        bad = [i for i, rec in enumerate(records) if not isinstance(rec, dict) or _rejected(rec, settings.p400)]
+        if bad:
+            # Real API flags record indexes as [i] in detail text
+            detail = "; ".join(f"[{i}] Record failed validation" for i in bad)
+            self.server.stats.count(400, nbytes)
+            return self._reply(400, detail.encode("utf-8"))
+
+        now = datetime.now()
+        stamp = now.strftime("%Y-%m-%d_%H:%M:%S.") + f"{now.microsecond // 1000:03d}"
+        self.server.stats.count(200, nbytes, accepted=len(records))
+        return self._reply(200, [f"{stamp}_{uuid.uuid4()}" for _ in records])
+
+    def _throttled(self, rng):
+        settings = self.server.settings
+        if settings.p429 and rng.random() < settings.p429:
+            return True
+        if not settings.max_rps:
+            return False
+        with self.server.token_lock:
+            now = time.monotonic()
+            window = self.server.recent
+            while window and now - window[0] > 1.0:
+                window.pop(0)
+            if len(window) >= settings.max_rps:
+                return True
+            window.append(now)
+        return False
+
+
+def _rejected(record, share):
+    """Deterministic record rejection, so resent bad records fail again (like real validation)"""
+    if not share:
+        return False
+    digest = zlib.crc32(json.dumps(record, sort_keys=True).encode("utf-8"))
+    return digest / 2 ** 32 < share
+
+
+class MockDfeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings, verbose=False):
+        super().__init__(address, _Handler)
+        self.settings = settings
+        self.verbose = verbose
+        self.stats = MockStats()
+        self.rng = random.Random(settings.seed)
+        self.tokens = {}
+        self.recent = []
+        self.token_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(settings=None, host="127.0.0.1", port=0, verbose=False):
+    """
+    Start mock API on background thread
+
+    Args:
+        settings: MockSettings (defaults: no latency, no injected errors)
+        host: Bind address
+        port: Port, 0 picks free port (see server.base_url)
+        verbose: Log each request
+
+    Returns:
+        Running MockDfeApiServer, stop with server.shutdown()
+    """
+    server = MockDfeApiServer((host, port), settings or MockSettings(), verbose=verbose)
+    threading.Thread(target=server.serve_forever, name="mock-dfe-api", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock DfE CSC API and token endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-kib", type=float, default=0.0)
+    parser.add_argument("--p429", type=float, default=0.0, help="Probability of 429 per request")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Server side requests/sec before 429")
+    parser.add_argument("--max-bytes", type=int, default=0, help="413 above this body size")
+    parser.add_argument("--p400", type=float, default=0.0, help="Share of records rejected as invalid")
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--no-gzip", action="store_true", help="Answer gzip bodies with 415")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, ms_per_kib=args.ms_per_kib,
+        p429=args.p429, retry_after=args.retry_after, max_rps=args.max_rps,
+        max_bytes=args.max_bytes, p400=args.p400, token_ttl=args.token_ttl,
+        accept_gzip=not args.no_gzip, seed=args.seed,
+    )
+    server = MockDfeApiServer((args.host, args.port), settings, verbose=args.verbose)
+    print(f"Mock DfE API on {server.base_url}")
+    print(f"  API_ENDPOINT={server.base_url}")
+    print(f"  TOKEN_ENDPOINT={server.base_url}/oauth2/token")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stopped. {server.stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+# api_pipeline/scripts/synth_cohort.py
+#
+# Dev only synthetic cohort generator (not shipped, api_pipeline/scripts pruned from package)
+# Replaces deep-copy-one-sample approach of admin/construct_fake_data_ssd_api_data_staging_anon.py:
+# builds varied records (variable list lengths per block), each deterministic
+# from (seed, record number), and bulk loads them into staging table of
+# configured DB_BACKEND (sqlite executemany, SQL Server fast_executemany, Postgres COPY)
+#
+#   day 1 - whole cohort as new|pending (first full send)
+#   day 2 - cohort as after day 1 was sent, plus configurable change set:
+#           updated records (field edits, list item adds|removes), deleted
+#           records and new children, all pending with previous payload|hash
+#           set, ready for update_partial_payloads and send path
+#
+# Usage (from repo root, DB_BACKEND|TABLE_NAME etc from .env):
+#   python -m api_pipeline.scripts.synth_cohort --records 1000000 --day 1 --truncate
+#   python -m api_pipeline.scripts.synth_cohort --records 1000000 --day 2 --p-update 0.1 --p-delete 0.01 --p-new 0.02 --truncate
+#   python -m api_pipeline.scripts.synth_cohort --records 100000 --dry-run --workers 0
+#
+# Same --seed and --records always give same rows, so day 1 and day 2 runs line up
+
+import argparse
+import csv
+import hashlib
+import io
+import os
+import random
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from api_pipeline import codec
+from api_pipeline.config import DB_BACKEND, TABLE_NAME
+
+_DAYS = [(date(2012, 1, 1) + timedelta(days=d)).isoformat() for d in range(365 * 12)]
+_SEXES = ["M", "F", "U"]
+_ETHNICITIES = ["WBRI", "WIRI", "WOTH", "MWBC", "AIND", "APKN", "BAFR", "BCRB", "CHNE", "OOTH", "REFU", "NOBT"]
+_DISABILITIES = ["NONE", "MOB", "HAND", "PC", "INC", "COMM", "LD", "HEAR", "VIS", "BEH", "CON", "AUT", "DDA"]
+_FORENAMES = ["John", "Aoife", "Zoë", "Mohammed", "Łucja", "Amara", "Oliver", "Isla", "Noah", "Ava", "Leo", "Maya"]
+_SURNAMES = ["Doe", "O'Neill", "Nguyễn", "Smith", "Khan", "Jones", "Kowalski", "Patel", "Brown", "Okafor"]
+_REFERRAL_SOURCES = ["1A", "1B", "1C", "1D", "2A", "2B", "3A", "3B", "3C", "3D", "3E", "3F", "4", "5A", "5B", "5C", "6", "7", "8", "9", "10"]
+_FACTORS = ["1A", "1B", "1C", "2A", "2B", "2C", "3A", "3B", "3C", "4A", "4B", "4C", "5A", "5B", "5C", "6A", "6B", "6C", "7A", "8B", "8C", "8D", "8E", "8F", "9A", "10A", "11A", "12A", "13A", "14A", "15A", "16A", "17A", "18B", "18C", "19B", "19C", "20", "21", "22A", "23A", "24A"]
+_PLACEMENT_TYPES = ["K1", "K2", "P1", "P2", "P3", "R1", "R2", "R3", "R5", "S1", "T0", "T1", "T2", "U1", "U2", "U3", "U4", "U5", "U6", "Z1"]
+_START_REASONS = ["S", "P", "L", "T", "U", "B"]
+_END_REASONS = ["E11", "E12", "E13", "E14", "E15", "E16", "E17", "E2", "E3", "E4A", "E4B", "E41", "E45", "E46", "E47", "E48", "E5", "E6", "E7", "E8", "E9"]
+_CHANGE_REASONS = ["ALLEG", "CARPL", "CHILD", "CLOSE", "INT", "LAREQ", "OTHER", "PLACE", "STAND", "CPREG"]
+_CLOSURE_REASONS = ["RC1", "RC2", "RC3", "RC4", "RC5", "RC6", "RC7", "RC8"]
+_POSTCODES = [f"{a}{n} {m}{b}{c}" for a in ("AB", "LS", "M", "B", "CF", "EH") for n in range(1, 9) for m in range(1, 9) for b, c in ("AA", "DE", "XY")]
+
+# Nested list blocks within a social care episode: key -> (mean length, cap)
+_EPISODE_LISTS = {
+    "care_worker_details": (1.5, 6),
+    "child_and_family_assessments": (1.0, 4),
+    "child_in_need_plans": (0.6, 3),
+    "section_47_assessments": (0.4, 3),
+    "child_protection_plans": (0.3, 3),
+    "child_looked_after_placements": (0.8, 12),
+}
+
+
+@dataclass
+class ChangeSet:
+    """Day 2 change rates, as share of day 1 cohort"""
+    p_update: float = 0.10   # Records with changed payload
+    p_delete: float = 0.01   # Records removed from cohort (row_state deleted)
+    p_new: float = 0.02      # New children added to cohort
+    p_list: float = 0.5      # Share of changes to updated records that add|remove list items
+
+
+def _count(rng, mean, cap):
+    """Skewed list length: most short, long tail up to cap"""
+    if mean <= 0:
+        return 0
+    return min(cap, int(rng.expovariate(1.0 / mean) + 0.5))
+
+
+def _dates(rng, n=2):
+    """n ascending ISO dates"""
+    return sorted(rng.choice(_DAYS) for _ in range(n))
+
+
+def _episode_item(block, rng, item_id):
+    """One list item of episode block, shaped as in staging JSON"""
+    start, end = _dates(rng)
+    end = end if rng.random() < 0.6 else None
+    if block == "care_worker_details":
+        return {"worker_id": f"W{rng.randrange(1, 5000):05d}", "start_date": start, "end_date": end}
+    if block == "child_and_family_assessments":
+        return {
+            "child_and_family_assessment_id": item_id,
+            "start_date": start,
+            "authorisation_date": end,
+            "factors": rng.sample(_FACTORS, rng.randint(0, 6)),
+            "purge": False,
+        }
+    if block == "child_in_need_plans":
+        return {"child_in_need_plan_id": item_id, "start_date": start, "end_date": end, "purge": False}
+    if block == "section_47_assessments":
+        return {
+            "section_47_assessment_id": item_id,
+            "start_date": start,
+            "icpc_required_flag": rng.random() < 0.5,
+            "icpc_date": end,
+            "end_date": end,
+            "purge": False,
+        }
+    if block == "child_protection_plans":
+        return {"child_protection_plan_id": item_id, "start_date": start, "end_date": end, "purge": False}
+    return {
+        "child_looked_after_placement_id": item_id,
+        "start_date": start,
+        "start_reason": rng.choice(_START_REASONS),
+        "placement_type": rng.choice(_PLACEMENT_TYPES),
+        "postcode": rng.choice(_POSTCODES),
+        "end_date": end,
+        "end_reason": rng.choice(_END_REASONS) if end else None,
+        "change_reason": rng.choice(_CHANGE_REASONS) if end else None,
+        "purge": False,
+    }
+
+
+def _episode(rng, episode_id):
+    referral_date, closure_date = _dates(rng)
+    closed = rng.random() < 0.5
+    episode = {
+        "social_care_episode_id": episode_id,
+        "referral_date": referral_date,
+        "referral_source": rng.choice(_REFERRAL_SOURCES),
+        "referral_no_further_action_flag": rng.random() < 0.15,
+    }
+    for block, (mean, cap) in _EPISODE_LISTS.items():
+        n = _count(rng, mean, cap)
+        if n or rng.random() < 0.5:  # Empty blocks sometimes omitted, sometimes []
+            episode[block] = [_episode_item(block, rng, f"{episode_id}{block[:3].upper()}{i:02d}") for i in range(n)]
+    if rng.random() < 0.05:
+        episode["adoption"] = {
+            "initial_decision_date": rng.choice(_DAYS),
+            "matched_date": rng.choice(_DAYS),
+            "placed_date": rng.choice(_DAYS),
+            "purge": False,
+        }
+    if rng.random() < 0.08:
+        episode["care_leavers"] = {
+            "contact_date": rng.choice(_DAYS),
+            "activity": rng.choice(["F1", "F2", "P1", "P2", "G4", "G5", "G6"]),
+            "accommodation": rng.choice(["B", "C", "D", "E", "G", "H", "K", "R", "S", "T", "U", "V", "W", "X", "Y", "Z"]),
+            "purge": False,
+        }
+    episode["closure_date"] = closure_date if closed else None
+    episode["closure_reason"] = rng.choice(_CLOSURE_REASONS) if closed else None
+    episode["purge"] = False
+    return episode
+
+
+def person_id_for(n):
+    """Staging person_id (also la_child_id) of record number n"""
+    return f"Child{n:09d}"
+
+
+def make_record(seed, n):
+    """
+    Build day 1 payload of record number n
+
+    Args:
+        seed: Cohort seed
+        n: Record number, 0 based
+
+    Returns:
+        Payload dict, same for same (seed, n)
+    """
+    rng = random.Random(seed * 1_000_000_007 + n)
+    pid = person_id_for(n)
+    details = {
+        "unique_pupil_number": f"A{rng.randrange(10 ** 11, 10 ** 12)}",
+        "first_name": rng.choice(_FORENAMES),
+        "surname": rng.choice(_SURNAMES),
+        "date_of_birth": rng.choice(_DAYS),
+        "sex": rng.choice(_SEXES),
+        "ethnicity": rng.choice(_ETHNICITIES),
+        "disabilities": rng.sample(_DISABILITIES, _count(rng, 0.7, 4)),
+        "postcode": rng.choice(_POSTCODES),
+        "uasc_flag": rng.random() < 0.03,
+        "purge": False,
+    }
+    if rng.random() < 0.05:
+        details["former_unique_pupil_number"] = f"B{rng.randrange(10 ** 11, 10 ** 12)}"
+    record = {
+        "la_child_id": pid,
+        "mis_child_id": f"Supplier-{pid}",
+        "child_details": details,
+    }
+    sdq = _count(rng, 1.0, 6)
+    if sdq:
+        record["health_and_wellbeing"] = {
+            "sdq_assessments": [{"date": d, "score": rng.randint(0, 40)} for d in _dates(rng, sdq)],
+            "purge": False,
+        }
+    record["social_care_episodes"] = [_episode(rng, f"E{n:09d}{e:02d}") for e in range(1 + _count(rng, 0.8, 20))]
+    record["purge"] = False
+    return record
+
+
+def _list_targets(record):
+    """(container list, block key, parent episode) for every list block in record"""
+    targets = [(record["social_care_episodes"], "social_care_episodes", None)]
+    if "health_and_wellbeing" in record:
+        targets.append((record["health_and_wellbeing"]["sdq_assessments"], "sdq_assessments", None))
+    for episode in record["social_care_episodes"]:
+        for block in _EPISODE_LISTS:
+            if block in episode:
+                targets.append((episode[block], block, episode))
+    return targets
+
+
+def mutate_record(record, rng, p_list=0.5):
+    """
+    Apply 1-3 day 2 changes to record in place
+
+    Args:
+        record: Payload dict (modified)
+        rng: random.Random for this record
+        p_list: Share of changes that add|remove list items, rest edit fields
+
+    Returns:
+        List of change kinds applied, e.g. ['field', 'item_add']
+    """
+    applied = []
+    for _ in range(rng.randint(1, 3)):
+        if rng.random() < p_list:
+            container, block, episode = rng.choice(_list_targets(record))
+            if container and (rng.random() < 0.4) and not (block == "social_care_episodes" and len(container) == 1):
+                container.pop(rng.randrange(len(container)))
+                applied.append("item_remove")
+            else:
+                n = len(container)
+                if block == "social_care_episodes":
+                    container.append(_episode(rng, f"E{record['la_child_id'][5:]}N{rng.randrange(10 ** 4):04d}"))
+                elif block == "sdq_assessments":
+                    container.append({"date": rng.choice(_DAYS), "score": rng.randint(0, 40)})
+                else:
+                    container.append(_episode_item(block, rng, f"{episode['social_care_episode_id']}N{n:02d}{rng.randrange(100):02d}"))
+                applied.append("item_add")
+        else:
+            kind = rng.random()
+            if kind < 0.3:
+                details = record["child_details"]
+                field = rng.choice(["postcode", "surname", "ethnicity", "disabilities"])
+                if field == "postcode":
+                    details["postcode"] = rng.choice(_POSTCODES)
+                elif field == "surname":
+                    details["surname"] = rng.choice(_SURNAMES) + "-" + rng.choice(_SURNAMES)
+                elif field == "ethnicity":
+                    details["ethnicity"] = rng.choice(_ETHNICITIES)
+                else:
+                    details["disabilities"] = rng.sample(_DISABILITIES, _count(rng, 1.0, 4))
+            else:
+                episode = rng.choice(record["social_care_episodes"])
+                items = [it for block in _EPISODE_LISTS for it in episode.get(block, ()) if "end_date" in it]
+                if items and kind < 0.7:
+                    rng.choice(items)["end_date"] = rng.choice(_DAYS)
+                else:
+                    episode["closure_date"] = rng.choice(_DAYS)
+                    episode["closure_reason"] = rng.choice(_CLOSURE_REASONS)
+            applied.append("field")
+    return applied
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def build_rows(start, stop, seed, day, changes, now):
+    """
+    Staging rows for record numbers start..stop-1
+
+    Args:
+        start, stop: Record number range
+        seed: Cohort seed
+        day: 1 (all new|pending) or 2 (sent cohort plus change set)
+        changes: ChangeSet for day 2
+        now: Timestamp for last_updated|submission_timestamp
+
+    Returns:
+        (rows, counts): rows as tuples in INSERT_COLUMNS order, counts per row_state|change kind
+    """
+    rows = []
+    counts = Counter()
+    for n in range(start, stop):
+        pid = person_id_for(n)
+        text = codec.dumps(make_record(seed, n))
+        digest = _hash(text)
+
+        if day == 1:
+            rows.append((pid, None, text, None, digest, "new", now, "pending", None))
+            counts["new"] += 1
+            continue
+
+        rng = random.Random(seed * 1_000_000_007 + n + (1 << 62))  # Day 2 draws, independent of day 1 stream
+        u = rng.random()
+        if u < changes.p_delete:
+            rows.append((pid, text, text, digest, digest, "deleted", now, "pending", None))
+            counts["deleted"] += 1
+        elif u < changes.p_delete + changes.p_update:
+            record = codec.loads(text)
+            new_text = text
+            while new_text == text:  # Field edit can redraw same value, updated rows must differ
+                counts.update(mutate_record(record, rng, changes.p_list))
+                new_text = codec.dumps(record)
+            rows.append((pid, text, new_text, digest, _hash(new_text), "updated", now, "pending", None))
+            counts["updated"] += 1
+        else:
+            rows.append((pid, text, text, digest, digest, "unchanged", now, "sent", now))
+            counts["unchanged"] += 1
+    return rows, counts
+
+
+# id left to table (IDENTITY|BIGSERIAL|INTEGER PRIMARY KEY): explicit ids fail on SQL Server
+# and leave Postgres sequence behind, breaking latest-row-per-person order
+INSERT_COLUMNS = (
+    "person_id", "previous_json_payload", "json_payload", "previous_hash", "current_hash",
+    "row_state", "last_updated", "submission_status", "submission_timestamp",
+)
+
+
+def iter_row_chunks(records, seed=42, day=1, changes=None, chunk_size=5000, workers=1):
+    """
+    Generate staging rows chunk by chunk, optionally across worker processes
+
+    Args:
+        records: Day 1 cohort size (day 2 adds records * p_new new children)
+        seed: Cohort seed
+        day: 1 or 2
+        changes: ChangeSet for day 2 (defaults if None)
+        chunk_size: Rows per chunk
+        workers: Processes, 1 = in-process, 0 = os.cpu_count()
+
+    Yields:
+        (rows, counts) per chunk, in record order
+    """
+    changes = changes or ChangeSet()
+    now = datetime.now().replace(microsecond=0)
+    ranges = [(s, min(s + chunk_size, records)) for s in range(0, records, chunk_size)]
+    if day == 2:
+        # New children: numbered after day 1 cohort, loaded as new|pending
+        extra = int(records * changes.p_new)
+        ranges += [(s, min(s + chunk_size, records + extra)) for s in range(records, records + extra, chunk_size)]
+
+    def task(start, stop):
+        return (start, stop, seed, 1 if start >= records else day, changes, now)
+
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if workers <= 1:
+        for start, stop in ranges:
+            yield build_rows(*task(start, stop))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, stop in ranges:
+            pending.append(executor.submit(build_rows, *task(start, stop)))
+            if len(pending) >= workers * 2:  # Bound memory if loader slower than generators
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ---- Bulk load per backend ----
+def _copy_csv_rows(rows):
+    """Rows as CSV for Postgres COPY (bytea as hex, timestamps ISO)"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for row in rows:
+        writer.writerow([
+            "\\x" + v.hex() if isinstance(v, bytes) else v.isoformat(sep=" ") if isinstance(v, datetime) else v
+            for v in row
+        ])
+    buf.seek(0)
+    return buf
+
+
+def insert_rows(conn, rows, table=TABLE_NAME, backend=DB_BACKEND):
+    """
+    Bulk insert staging rows and commit
+
+    Args:
+        conn: Connection from storage.backend.connect()
+        rows: Tuples in INSERT_COLUMNS order
+        table: Staging table
+        backend: DB_BACKEND of conn
+    """
+    cursor = conn.cursor()
+    columns = ", ".join(INSERT_COLUMNS)
+    if backend == "postgres":
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", _copy_csv_rows(rows))
+    else:
+        if backend == "sqlserver":
+            import pyodbc  # Only with sqlserver backend
+
+            # Explicit sizes as db._load_temp_table: NVARCHAR(MAX) otherwise sized from
+            # first rows under fast_executemany (truncation, memory errors)
+            cursor.fast_executemany = True
+            cursor.setinputsizes([
+                (pyodbc.SQL_WVARCHAR, 48, 0),       # person_id
+                (pyodbc.SQL_WLONGVARCHAR, 0, 0),    # previous_json_payload
+                (pyodbc.SQL_WLONGVARCHAR, 0, 0),    # json_payload
+                (pyodbc.SQL_BINARY, 32, 0),         # previous_hash
+                (pyodbc.SQL_BINARY, 32, 0),         # current_hash
+                (pyodbc.SQL_WVARCHAR, 10, 0),       # row_state
+                (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3), # last_updated
+                (pyodbc.SQL_WVARCHAR, 50, 0),       # submission_status
+                (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3), # submission_timestamp
+            ])
+        else:
+            # sqlite: no DATETIME type, store ISO text as db_sqlite does
+            rows = [tuple(v.isoformat(sep=" ") if isinstance(v, datetime) else v for v in row) for row in rows]
+        placeholders = ", ".join("?" for _ in INSERT_COLUMNS)
+        cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+    conn.commit()
+
+
+def clear_table(conn, table=TABLE_NAME, backend=DB_BACKEND):
+    """Remove all staging rows before load"""
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {table}" if backend == "sqlite" else f"TRUNCATE TABLE {table}")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and bulk load synthetic staging cohort")
+    parser.add_argument("--records", type=int, default=10000, help="Day 1 cohort size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--day", type=int, choices=(1, 2), default=1)
+    parser.add_argument("--p-update", type=float, default=0.10)
+    parser.add_argument("--p-delete", type=float, default=0.01)
+    parser.add_argument("--p-new", type=float, default=0.02)
+    parser.add_argument("--p-list", type=float, default=0.5, help="Share of changes that add|remove list items")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per generated chunk|commit")
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes, 0 = all cores")
+    parser.add_argument("--truncate", action="store_true", help="Clear staging table first")
+    parser.add_argument("--dry-run", action="store_true", help="Generate only, no DB")
+    args = parser.parse_args()
+
+    changes = ChangeSet(args.p_update, args.p_delete, args.p_new, args.p_list)
+    conn = None
+    if not args.dry_run:
+        from api_pipeline.storage import backend  # Only needs DB driver when loading
+        conn = backend.connect()
+        if args.truncate:
+            clear_table(conn)
+        print(f"Loading day {args.day} cohort into {TABLE_NAME} ({DB_BACKEND})")
+
+    totals = Counter()
+    rows_done = bytes_done = 0
+    gen_time = load_time = 0.0
+    start = time.perf_counter()
+    mark = start
+    for rows, counts in iter_row_chunks(args.records, args.seed, args.day, changes, args.chunk_size, args.workers):
+        now = time.perf_counter()
+        gen_time += now - mark
+        if conn is not None:
+            insert_rows(conn, rows)
+        mark = time.perf_counter()
+        load_time += mark - now
+        totals.update(counts)
+        rows_done += len(rows)
+        bytes_done += sum(len(r[2]) for r in rows)
+        print(f"  {rows_done:,} rows ({rows_done / (mark - start):,.0f} rows/s)", end="\r")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{rows_done:,} rows, {bytes_done / 2 ** 20:,.1f} MiB json_payload in {elapsed:.1f}s "
+          f"(generate {gen_time:.1f}s, load {load_time:.1f}s)")
+    print("  " + ", ".join(f"{k}: {v:,}" for k, v in sorted(totals.items())))
+    if conn is not None:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# api_pipeline/storage.py
+#
+# Staging table backend selected by DB_BACKEND. All backends expose same
+# functions (connect, update_partial_payloads, get_pending_records,
+# iter_pending_records, update_api_results, ...), callers use storage.backend
+#   sqlserver - db.py, LA reporting instance via pyodbc (default)
+#   postgres  - db_postgres.py, psycopg2, staging table from ALPHA postgres script
+#   sqlite    - db_sqlite.py, local file stand-in for offline runs|benchmarks
+
+import re
+
+from .config import DB_BACKEND, SQL_CONN_STR, PG_CONN_STR, SQLITE_PATH
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from .config import DB_BACKEND, SQL_CONN_STR, PG_CONN_STR, SQLITE_PATH
+# except ImportError:
+#     from config import DB_BACKEND, SQL_CONN_STR, PG_CONN_STR, SQLITE_PATH
+
+if DB_BACKEND == "sqlserver":
+    from . import db as backend
+    TARGET = SQL_CONN_STR
+elif DB_BACKEND == "postgres":
+    from . import db_postgres as backend
+    TARGET = re.sub(r"(password=|://[^:/@]*:)[^\s@]*", r"\1***", PG_CONN_STR)  # debug output, no secret
+elif DB_BACKEND == "sqlite":
+    from . import db_sqlite as backend
+    TARGET = SQLITE_PATH
+else:
+    raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}', expected 'sqlserver', 'postgres' or 'sqlite'")
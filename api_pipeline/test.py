@@ -2,7 +2,6 @@
 
 import json
 import time
-import requests
 import pyodbc
 
 from .config import (
@@ -14,6 +13,7 @@ from .config import (
     SUPPLIER_KEY,
     API_ENDPOINT_LA,
 )
+from .transport import post
 
 # ----------------- helpers -----------------
 
@@ -127,7 +127,7 @@ def _smoke_post_to_api():
     }
 
     try:
-        response = requests.post(TOKEN_ENDPOINT, data=token_data)
+        response = post(TOKEN_ENDPOINT, data=token_data)
         response.raise_for_status()
         access_token = response.json().get("access_token")
     except Exception as e:
@@ -143,7 +143,7 @@ def _smoke_post_to_api():
     dummy_payload = {}  # or use {"test": true} 
     print("Sending harmless POST to API...")
     try:
-        response = requests.post(API_ENDPOINT_LA, headers=headers, json=dummy_payload)
+        response = post(API_ENDPOINT_LA, headers=headers, json=dummy_payload)
         print(f"Status: {response.status_code}")
         if response.status_code in [200, 400, 422]:
             print("API responded to dummy POST")
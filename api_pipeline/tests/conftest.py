@@ -0,0 +1,121 @@
+# api_pipeline/tests/conftest.py
+#
+# Offline fixtures: sqlite staging backend and in-process mock DfE API
+# (api_pipeline/scripts/mock_dfe_api.py), so send|retry|journal paths run
+# without SQL Server or network. Config is read at import, so env is set here
+# before any api_pipeline module is imported
+
+import hashlib
+import json
+import os
+
+os.environ.update({
+    "DB_BACKEND": "sqlite",
+    "SQLITE_PATH": ":memory:",
+    "TABLE_NAME": "ssd_api_data_staging_anon",
+    "USE_PARTIAL_PAYLOAD": "false",
+    "API_ENDPOINT": "http://127.0.0.1:9",  # Replaced per test by mock_api
+    "LA_CODE": "000",
+    "TOKEN_ENDPOINT": "http://127.0.0.1:9/oauth2/token",
+    "CLIENT_ID": "test-client",
+    "CLIENT_SECRET": "test-secret",
+    "SCOPE": "test-scope",
+    "SUPPLIER_KEY": "test-supplier",
+    "TOKEN_CACHE_PATH": "",
+    "SEND_JOURNAL_PATH": "",
+    "BLOCK_STORE_PATH": "",
+    "GZIP_REQUESTS": "false",
+    "BISECT_ON_400": "false",
+    "RAW_PAYLOAD_PASSTHROUGH": "false",
+    "MAX_IN_FLIGHT": "1",
+    "API_MAX_RPS": "0",
+    "API_MAX_BYTES_PER_SEC": "0",
+    "DEBUG": "false",
+})
+
+import pytest
+
+from api_pipeline import api, auth, db_sqlite, transport
+from api_pipeline.scripts.mock_dfe_api import MockSettings, start_server
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """
+    Running mock API with pipeline pointed at it, injection off
+
+    Tests change server.settings (read per request) to inject 400|413|429|415.
+    Token cache and run-level gzip state are reset so tests do not leak.
+    """
+    server = start_server(MockSettings(seed=1))
+    monkeypatch.setattr(api, "API_ENDPOINT_LA", f"{server.base_url}/children_social_care_data/000/children")
+    monkeypatch.setattr(api, "TOKEN_ENDPOINT", f"{server.base_url}/oauth2/token")
+    monkeypatch.setattr(auth, "TOKEN_ENDPOINT", f"{server.base_url}/oauth2/token")
+    monkeypatch.setattr(auth, "_cached_token", None)
+    monkeypatch.setattr(auth, "_cached_refresh_at", 0.0)
+    monkeypatch.setattr(transport, "_gzip_enabled", False)
+    monkeypatch.setattr(transport, "_gzip_confirmed", False)
+    monkeypatch.setattr(transport, "_gzip_probing", False)
+    yield server
+    transport.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def headers(mock_api):
+    """Request headers as main() builds them, token issued by mock"""
+    return {
+        "Authorization": f"Bearer {auth.get_oauth_token()}",
+        "Content-Type": "application/json",
+        "SupplierKey": "test-supplier",
+    }
+
+
+@pytest.fixture
+def staging(tmp_path):
+    """Empty sqlite staging table on temp file"""
+    conn = db_sqlite.connect(str(tmp_path / "staging.sqlite3"))
+    yield conn
+    conn.close()
+
+
+def child_payload(n, padding=0):
+    """Minimal valid child payload, padding adds bytes to grow body"""
+    return {
+        "la_child_id": f"C{n:06d}",
+        "mis_child_id": f"M{n:06d}",
+        "child_details": {"unique_pupil_number": f"A{n:012d}", "notes": "x" * padding},
+    }
+
+
+def add_pending(conn, count, padding=0):
+    """
+    Insert pending staging rows with hashed payloads
+
+    Returns:
+        Pending records as pipeline reads them (get_pending_records)
+    """
+    rows = []
+    for n in range(count):
+        payload = json.dumps(child_payload(n, padding))
+        rows.append((f"P{n:06d}", payload, hashlib.sha256(payload.encode("utf-8")).digest()))
+    conn.executemany(
+        f"""
+        INSERT INTO {db_sqlite.TABLE_NAME} (person_id, json_payload, current_hash, row_state, submission_status)
+        VALUES (?, ?, ?, 'new', 'pending')
+        """,
+        rows,
+    )
+    conn.commit()
+    return db_sqlite.get_pending_records(conn.cursor())
+
+
+def submission_states(conn):
+    """person_id -> (submission_status, api_response) of staging rows"""
+    return {
+        pid: (status, response)
+        for pid, status, response in conn.execute(
+            f"SELECT person_id, submission_status, api_response FROM {db_sqlite.TABLE_NAME}"
+        )
+    }
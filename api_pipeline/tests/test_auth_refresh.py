@@ -0,0 +1,57 @@
+# api_pipeline/tests/test_auth_refresh.py
+#
+# Token cache: reuse until refresh margin, proactive refresh, and one shared
+# refresh when concurrent senders hit 401 with same revoked token
+
+import time
+
+from api_pipeline import api, auth
+
+from conftest import add_pending, submission_states
+
+
+def test_token_reused_until_refresh_margin(mock_api):
+    mock_api.settings.token_ttl = 60  # Shorter than TOKEN_REFRESH_MARGIN: margin clamped to 1/4 lifetime
+
+    token = auth.get_oauth_token()
+    assert auth.get_oauth_token() == token
+    assert mock_api.stats.tokens_issued == 1
+    assert abs(auth._cached_refresh_at - (time.time() + 45)) < 5
+
+    auth._cached_refresh_at = time.time() - 1  # Refresh point reached
+    assert auth.get_oauth_token() != token
+    assert mock_api.stats.tokens_issued == 2
+
+
+def test_401_refreshes_token_once_across_senders(mock_api, headers, staging, monkeypatch):
+    records = add_pending(staging, 40)
+    monkeypatch.setattr(api, "BATCH_SIZE", 5)
+    mock_api.tokens.clear()  # Revoked server side, still cached client side
+
+    api.process_batches(records, headers, staging, max_in_flight=4)
+
+    assert mock_api.stats.tokens_issued == 2  # Initial token, one refresh shared by all senders
+    assert 1 <= mock_api.stats.status_counts[401] <= 4  # At most one per sender in flight
+    assert mock_api.stats.records_accepted == 40
+    assert {status for status, _ in submission_states(staging).values()} == {"sent"}
+
+
+def test_401_with_refreshed_token_rejected_is_final(mock_api, headers, staging, monkeypatch):
+    batch = add_pending(staging, 3)
+    mock_api.tokens.clear()
+    real_fetch = auth._fetch_oauth_token
+
+    def revoke_on_issue():
+        # Every refreshed token is already revoked when used
+        fetched = real_fetch()
+        mock_api.tokens.clear()
+        return fetched
+
+    monkeypatch.setattr(auth, "_fetch_oauth_token", revoke_on_issue)
+
+    successes, failures = api.send_batch(batch, headers, max_retries=3)
+
+    assert successes == []
+    assert all(msg.startswith("API error (401)") for _, msg in failures)
+    assert mock_api.stats.status_counts[401] == 3
+    assert mock_api.stats.tokens_issued == 3  # Initial, then one refresh per 401 retry
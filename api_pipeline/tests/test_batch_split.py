@@ -0,0 +1,51 @@
+# api_pipeline/tests/test_batch_split.py
+#
+# 413 handling: oversize batch split in halves and resent, shared byte limit
+# learned from rejected body so later batches are packed under it
+
+from api_pipeline import api
+
+from conftest import add_pending, submission_states
+
+
+def _body_len(records):
+    return len(api._build_batch_body(records))
+
+
+def test_413_splits_batch_and_learns_limit(mock_api, headers, staging):
+    batch = add_pending(staging, 16, padding=200)
+    mock_api.settings.max_bytes = _body_len(batch[:4]) + 10  # Quarters fit, halves do not
+    byte_limit = api.BatchByteLimit(ceiling=1_000_000)
+
+    successes, failures = api.send_batch(batch, headers, byte_limit=byte_limit)
+
+    assert failures == []
+    assert [s[0] for s in successes] == [r["person_id"] for r in batch]
+    assert mock_api.stats.status_counts[413] == 3  # Whole batch, then both halves
+    assert mock_api.stats.records_accepted == 16
+    assert byte_limit.value == int(min(_body_len(batch[:8]), _body_len(batch[8:])) * 0.9)
+
+
+def test_learned_limit_packs_later_batches(mock_api, headers, staging, monkeypatch):
+    records = add_pending(staging, 60, padding=200)
+    monkeypatch.setattr(api, "BATCH_SIZE", 20)
+    # Learned from first 20 record batch, anything packed under it is accepted
+    mock_api.settings.max_bytes = int(_body_len(records[:20]) * 0.9)
+
+    api.process_batches(records, headers, staging)
+
+    assert mock_api.stats.status_counts[413] == 1  # Only first batch, before limit learned
+    assert mock_api.stats.records_accepted == 60
+    assert {status for status, _ in submission_states(staging).values()} == {"sent"}
+
+
+def test_413_on_single_record_is_final(mock_api, headers, staging):
+    batch = add_pending(staging, 2)
+    mock_api.settings.max_bytes = 10
+
+    successes, failures = api.send_batch(batch, headers, byte_limit=api.BatchByteLimit())
+
+    assert successes == []
+    assert [pid for pid, _ in failures] == ["P000000", "P000001"]
+    assert all(msg.startswith("API error (413)") for _, msg in failures)
+    assert mock_api.stats.status_counts[413] == 3
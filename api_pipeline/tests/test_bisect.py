@@ -0,0 +1,67 @@
+# api_pipeline/tests/test_bisect.py
+#
+# 400 handling: with BISECT_ON_400 rejected batch is split around record
+# indexes flagged in API detail, so only invalid records end as errors
+
+import pytest
+
+from api_pipeline import api
+from api_pipeline.scripts.mock_dfe_api import _rejected
+
+from conftest import add_pending, submission_states
+
+REJECT_SHARE = 0.15
+
+
+@pytest.fixture
+def records(mock_api, staging):
+    """Pending records, some of which mock rejects (same ones every time)"""
+    records = add_pending(staging, 40)
+    mock_api.settings.p400 = REJECT_SHARE
+    return records
+
+
+def _invalid(records):
+    invalid = {r["person_id"] for r in records if _rejected(r["json"], REJECT_SHARE)}
+    assert 0 < len(invalid) < len(records)  # Fixture data must mix valid and invalid
+    return invalid
+
+
+def test_bisect_isolates_invalid_records(mock_api, headers, staging, records, monkeypatch):
+    monkeypatch.setattr(api, "BISECT_ON_400", True)
+    monkeypatch.setattr(api, "BATCH_SIZE", 10)
+    invalid = _invalid(records)
+
+    api.process_batches(records, headers, staging)
+
+    states = submission_states(staging)
+    assert {pid for pid, (status, _) in states.items() if status == "error"} == invalid
+    assert all("Record failed validation" in states[pid][1] for pid in invalid)
+    assert mock_api.stats.records_accepted == len(records) - len(invalid)
+
+
+def test_flagged_records_split_from_clean_ones(mock_api, headers, records, monkeypatch):
+    monkeypatch.setattr(api, "BISECT_ON_400", True)
+    batch = records[:10]
+    invalid = _invalid(batch)
+
+    successes, failures = api.send_batch(batch, headers)
+
+    assert sorted(pid for pid, _ in failures) == sorted(invalid)
+    assert [s[0] for s in successes] == [r["person_id"] for r in batch if r["person_id"] not in invalid]
+    assert mock_api.stats.status_counts[200] == 2  # Token, then all clean records in one request
+
+
+def test_without_bisect_whole_batch_fails(mock_api, headers, records):
+    batch = records[:10]
+    invalid = _invalid(batch)
+
+    successes, failures = api.send_batch(batch, headers)
+
+    assert successes == []
+    assert len(failures) == len(batch)
+    for pid, msg in failures:
+        if pid in invalid:
+            assert "Record failed validation" in msg
+        else:
+            assert msg.endswith("Record valid but batch failed")
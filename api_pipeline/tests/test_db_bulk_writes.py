@@ -0,0 +1,127 @@
+# api_pipeline/tests/test_db_bulk_writes.py
+#
+# SQL Server set-based writes (db.py) and their row by row fallback, against
+# recording cursor: temp table load refused as under restricted permissions
+
+from datetime import datetime
+
+import pyodbc
+
+from api_pipeline import db
+
+
+class RecordingCursor:
+    """Records statements; creating temp table raises unless temp_tables allowed"""
+
+    def __init__(self, temp_tables=True):
+        self.temp_tables = temp_tables
+        self.temp_table_attempts = 0
+        self.executed = []
+        self.executemany_calls = []
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        if "tempdb" in sql:
+            self.temp_table_attempts += 1
+            if not self.temp_tables:
+                raise pyodbc.Error("42000", "CREATE TABLE permission denied in database 'tempdb'")
+        self.executed.append((" ".join(sql.split()), params))
+
+    def executemany(self, sql, rows):
+        self.executemany_calls.append((" ".join(sql.split()), list(rows)))
+
+    def setinputsizes(self, sizes):
+        pass
+
+
+SUCCESSES = [
+    ("P1", "uuid-1", datetime(2025, 1, 2, 3, 4, 5, 678901), b"\x01" * 32),
+    ("P2", "uuid-2", datetime(2025, 1, 2, 3, 4, 5, 678901), None),
+]
+FAILURES = [("P3", "API error (400): Malformed Payload")]
+
+
+def _row_updates(cursor):
+    return [(sql, params) for sql, params in cursor.executed if "tempdb" not in sql and "JOIN" not in sql]
+
+
+def test_update_api_results_bulk_loads_temp_table(monkeypatch):
+    monkeypatch.setattr(db, "_bulk_results_available", True)
+    cursor = RecordingCursor()
+
+    db.update_api_results(cursor, SUCCESSES, FAILURES)
+
+    (insert_sql, rows), = cursor.executemany_calls
+    assert insert_sql.startswith("INSERT INTO #api_results")
+    assert [r[:2] for r in rows] == [("P1", "sent"), ("P2", "sent"), ("P3", "error")]
+    joined = [sql for sql, _ in cursor.executed if "JOIN #api_results" in sql]
+    assert len(joined) == 2  # One UPDATE per status, not per record
+    assert _row_updates(cursor) == []
+    assert cursor.fast_executemany is False
+
+
+def test_update_api_results_falls_back_to_row_updates_for_rest_of_run(monkeypatch):
+    monkeypatch.setattr(db, "_bulk_results_available", True)
+    cursor = RecordingCursor(temp_tables=False)
+
+    db.update_api_results(cursor, SUCCESSES, FAILURES)
+
+    assert db._bulk_results_available is False
+    updates = _row_updates(cursor)
+    assert [params for sql, params in updates if "'sent'" in sql] == [
+        ("uuid-1", SUCCESSES[0][2], "P1", b"\x01" * 32, b"\x01" * 32),
+        ("uuid-2", SUCCESSES[1][2], "P2", None, None),
+    ]
+    assert [params for sql, params in updates if "'error'" in sql] == [(FAILURES[0][1], "P3")]
+
+    # Later batches go straight to row updates, temp table not retried
+    cursor = RecordingCursor(temp_tables=False)
+    db.update_api_results(cursor, SUCCESSES, [])
+    assert cursor.temp_table_attempts == 0
+    assert len(_row_updates(cursor)) == 2
+
+
+class RecordingConnection:
+    """Counts commits|rollbacks around RecordingCursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+UPDATES = [(f"P{n}", f'{{"la_child_id": "C{n}"}}') for n in range(5)]
+
+
+def test_write_partial_payloads_commits_per_chunk():
+    cursor = RecordingCursor()
+    conn = RecordingConnection(cursor)
+
+    db.write_partial_payloads(conn, UPDATES, commit_size=2)
+
+    assert [rows for _, rows in cursor.executemany_calls] == [UPDATES[0:2], UPDATES[2:4], UPDATES[4:5]]
+    assert all(sql.startswith("INSERT INTO #partial_payloads") for sql, _ in cursor.executemany_calls)
+    assert conn.commits == 3
+
+
+def test_write_partial_payloads_falls_back_to_executemany():
+    cursor = RecordingCursor(temp_tables=False)
+    conn = RecordingConnection(cursor)
+
+    db.write_partial_payloads(conn, UPDATES, commit_size=2)
+
+    assert cursor.temp_table_attempts == 1  # Not retried for later chunks
+    assert conn.rollbacks == 1
+    assert [rows for _, rows in cursor.executemany_calls] == [
+        [(json_out, pid) for pid, json_out in UPDATES[i:i + 2]] for i in (0, 2, 4)
+    ]
+    assert conn.commits == 3
@@ -0,0 +1,86 @@
+# api_pipeline/tests/test_gzip.py
+#
+# Gzip request bodies: confirmed on 200, off for run on 415, plain resend
+# probe after 400 on unconfirmed gzip, and 413 on gzip body not learned
+
+import pytest
+
+from api_pipeline import api, transport
+from api_pipeline.scripts.mock_dfe_api import _rejected
+
+from conftest import add_pending
+
+
+@pytest.fixture
+def gzip_on(mock_api, monkeypatch):
+    monkeypatch.setattr(transport, "_gzip_enabled", True)
+    monkeypatch.setattr(transport, "GZIP_MIN_BYTES", 0)
+
+
+def test_gzip_accepted_is_confirmed(mock_api, headers, staging, gzip_on):
+    batch = add_pending(staging, 20, padding=200)
+    received = mock_api.stats.bytes_received
+
+    successes, failures = api.send_batch(batch, headers)
+
+    assert len(successes) == 20 and failures == []
+    assert transport._gzip_confirmed
+    assert mock_api.stats.bytes_received - received < len(api._build_batch_body(batch)) / 4
+
+
+def test_415_turns_gzip_off_for_run(mock_api, headers, staging, gzip_on):
+    batch = add_pending(staging, 10)
+    mock_api.settings.accept_gzip = False
+
+    successes, failures = api.send_batch(batch[:5], headers)
+    assert len(successes) == 5 and failures == []
+    assert not transport._gzip_enabled
+
+    successes, failures = api.send_batch(batch[5:], headers)
+    assert len(successes) == 5
+    assert mock_api.stats.status_counts[415] == 1  # Later batches sent plain straight away
+
+
+def test_400_on_unconfirmed_gzip_probes_plain_and_turns_off(mock_api, headers, staging, gzip_on, monkeypatch):
+    batch = add_pending(staging, 10)
+
+    def garbled_gzip(body):
+        # Endpoint that cannot read gzip and answers 400 rather than 415
+        if transport._gzip_enabled:
+            return b"not gzip", {"Content-Encoding": "gzip"}
+        return body, {}
+
+    monkeypatch.setattr(api, "encode_body", garbled_gzip)
+
+    successes, failures = api.send_batch(batch, headers)
+
+    assert len(successes) == 10 and failures == []
+    assert mock_api.stats.status_counts[400] == 1
+    assert not transport._gzip_enabled
+    assert not transport._gzip_probing
+
+
+def test_400_on_working_gzip_confirms_it_once(mock_api, headers, staging, gzip_on, monkeypatch):
+    monkeypatch.setattr(api, "BISECT_ON_400", True)
+    batch = add_pending(staging, 20)
+    mock_api.settings.p400 = 0.15
+    invalid = {r["person_id"] for r in batch if _rejected(r["json"], 0.15)}
+    assert invalid
+
+    successes, failures = api.send_batch(batch, headers)
+
+    assert sorted(pid for pid, _ in failures) == sorted(invalid)
+    assert len(successes) == 20 - len(invalid)
+    assert transport._gzip_enabled and transport._gzip_confirmed  # Plain resend also 400: body bad, gzip fine
+
+
+def test_413_on_gzip_body_splits_without_learning(mock_api, headers, staging, gzip_on):
+    batch = add_pending(staging, 16, padding=200)
+    mock_api.settings.max_bytes = len(api._build_batch_body(batch[:8])) + 10  # Checked on decompressed body
+    byte_limit = api.BatchByteLimit(ceiling=1_000_000)
+
+    successes, failures = api.send_batch(batch, headers, byte_limit=byte_limit)
+
+    assert len(successes) == 16 and failures == []
+    assert mock_api.stats.status_counts[413] == 1
+    assert byte_limit.value == 1_000_000  # Compressed length says nothing of packed size
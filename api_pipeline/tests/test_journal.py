@@ -0,0 +1,112 @@
+# api_pipeline/tests/test_journal.py
+#
+# Send journal: run killed after POST but before staging commit, then
+# resume replays journalled outcomes without re-POSTing; records never
+# answered stay pending
+
+import functools
+import os
+import stat
+
+import pytest
+
+from api_pipeline import api, db_sqlite, main
+from api_pipeline.journal import SendJournal, reconcile
+
+from conftest import add_pending, submission_states
+
+
+class Killed(Exception):
+    """Stands in for process dying between API response and DB commit"""
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "send_journal.sqlite3")
+
+
+def _send_until_killed(records, headers, staging, journal_path, monkeypatch):
+    """Run process_batches, killed at first staging write; journal closed as by crash"""
+    journal = SendJournal(journal_path)
+    with monkeypatch.context() as m:
+        m.setattr(api, "BATCH_SIZE", 10)
+
+        def killed(cursor, successes, failures):
+            raise Killed()
+
+        m.setattr(db_sqlite, "update_api_results", killed)
+        with pytest.raises(Killed):
+            api.process_batches(records, headers, staging, journal=journal)
+    journal.close()
+
+
+def _resume(tmp_path, journal_path, monkeypatch):
+    monkeypatch.setattr(main, "open_journal", lambda: SendJournal(journal_path))
+    monkeypatch.setattr(db_sqlite, "connect", functools.partial(db_sqlite.connect, str(tmp_path / "staging.sqlite3")))
+    main.resume()
+
+
+def test_resume_replays_outcomes_after_kill(mock_api, headers, staging, journal_path, tmp_path, monkeypatch):
+    records = add_pending(staging, 20)
+    _send_until_killed(records, headers, staging, journal_path, monkeypatch)
+    posted = mock_api.stats.requests
+    assert {status for status, _ in submission_states(staging).values()} == {"pending"}
+
+    _resume(tmp_path, journal_path, monkeypatch)
+
+    states = submission_states(staging)
+    first, rest = records[:10], records[10:]
+    assert all(states[r["person_id"]][0] == "sent" and states[r["person_id"]][1] for r in first)
+    assert all(states[r["person_id"]][0] == "pending" for r in rest)  # Never POSTed, go next run
+    assert mock_api.stats.requests == posted  # Replayed from journal, not resent
+
+    journal = SendJournal(journal_path)
+    assert journal.responded_batches() == [] and journal.in_flight_batches() == []
+    journal.close()
+
+
+def test_resume_leaves_row_repopulated_since_post_pending(mock_api, headers, staging, journal_path, tmp_path, monkeypatch):
+    records = add_pending(staging, 10)
+    _send_until_killed(records, headers, staging, journal_path, monkeypatch)
+    staging.execute(
+        f"UPDATE {db_sqlite.TABLE_NAME} SET json_payload = '{{}}', current_hash = ? WHERE person_id = 'P000003'",
+        (b"\x02" * 32,),
+    )
+    staging.commit()
+
+    _resume(tmp_path, journal_path, monkeypatch)
+
+    states = submission_states(staging)
+    assert states["P000003"][0] == "pending"  # New payload still to send
+    assert all(status == "sent" for pid, (status, _) in states.items() if pid != "P000003")
+
+
+def test_reconcile_reports_unanswered_records_and_clears(staging, journal_path, capsys):
+    records = add_pending(staging, 4)
+    journal = SendJournal(journal_path)
+    answered = journal.begin(records[:2])
+    journal.record_outcome(answered, [], [("P000000", "API error (400): Malformed Payload")])  # P000001 unanswered
+    journal.begin(records[2:])  # No response at all
+
+    assert reconcile(journal, staging) == 1
+
+    states = submission_states(staging)
+    assert states["P000000"][0] == "error"
+    assert [states[pid][0] for pid in ("P000001", "P000002", "P000003")] == ["pending"] * 3
+    assert "no recorded API response for 1 record(s)" in capsys.readouterr().out
+    assert journal.responded_batches() == [] and journal.in_flight_batches() == []
+    journal.close()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+def test_journal_files_owner_only(journal_path):
+    old_umask = os.umask(0o022)
+    try:
+        journal = SendJournal(journal_path)
+        journal.begin([{"person_id": "P1", "current_hash": None}])
+    finally:
+        os.umask(old_umask)
+    for path in (journal_path, journal_path + "-wal", journal_path + "-shm"):
+        if os.path.exists(path):
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600, path
+    journal.close()
@@ -0,0 +1,85 @@
+# api_pipeline/tests/test_rate_limit.py
+#
+# Shared rate limiter: Retry-After parsing, AIMD rate (halve on 429, creep
+# back on success) and pause of all senders, alone and behind send_batch
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from api_pipeline import api, rate_limit
+from api_pipeline.rate_limit import RateLimiter, parse_retry_after
+
+from conftest import add_pending
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("86400") == rate_limit.MAX_RETRY_AFTER
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= parse_retry_after(when) <= 30
+
+
+def test_aimd_halves_on_429_and_recovers_on_success():
+    limiter = RateLimiter(max_rps=100)
+
+    limiter.on_throttled(retry_after=0)
+    limiter.on_throttled(retry_after=0)
+    assert limiter.factor == pytest.approx(0.25)
+
+    for _ in range(10):
+        limiter.on_throttled(retry_after=0)
+    assert limiter.factor == rate_limit.MIN_RATE_FACTOR
+
+    limiter.on_success()
+    assert limiter.factor == pytest.approx(rate_limit.MIN_RATE_FACTOR + rate_limit.INCREASE_STEP)
+    for _ in range(50):
+        limiter.on_success()
+    assert limiter.factor == 1.0
+
+
+def test_unlimited_limiter_paces_from_observed_rate_once_throttled():
+    limiter = RateLimiter(max_rps=0)
+    for _ in range(5):
+        limiter.acquire()
+        time.sleep(0.01)
+    assert limiter.max_rps is None
+
+    limiter.on_throttled(retry_after=0)
+    assert limiter.max_rps is not None
+    assert limiter.factor == rate_limit.DECREASE_FACTOR
+
+
+def test_retry_after_pauses_next_acquire():
+    limiter = RateLimiter()
+    limiter.on_throttled(retry_after=0.2)
+
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_429_backs_off_then_recovers(mock_api, headers, staging):
+    batch = add_pending(staging, 5)
+    mock_api.settings.p429 = 1.0
+    mock_api.settings.retry_after = 0.05
+    limiter = RateLimiter(max_rps=100)
+
+    start = time.monotonic()
+    successes, failures = api.send_batch(batch, headers, max_retries=3, limiter=limiter)
+
+    assert successes == []
+    assert all(msg.startswith("API error (429)") for _, msg in failures)
+    assert mock_api.stats.status_counts[429] == 3
+    assert limiter.factor == pytest.approx(0.25)  # Halved before each of 2 retries
+    assert time.monotonic() - start >= 0.1  # Retry-After honoured each time
+
+    mock_api.settings.p429 = 0.0
+    successes, failures = api.send_batch(batch, headers, max_retries=3, limiter=limiter)
+
+    assert len(successes) == 5 and failures == []
+    assert limiter.factor == pytest.approx(0.25 + rate_limit.INCREASE_STEP)
@@ -0,0 +1,144 @@
+# api_pipeline/transport.py
+#
+# Shared HTTP session for all outbound calls (OAuth token, batch POSTs, smoke test)
+# One pooled keep-alive session per process, so batches reuse open TCP+TLS
+# connections rather than handshaking per request, and every call gets a timeout
+# Optional gzip request bodies, dropped for rest of run if endpoint rejects them
+
+import gzip
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    GZIP_REQUESTS, GZIP_LEVEL, GZIP_MIN_BYTES,
+)
+
+# # ---- local imports with fallback for notebook/debug use ----
+# try:
+#     from .config import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, GZIP_REQUESTS, GZIP_LEVEL, GZIP_MIN_BYTES
+# except ImportError:
+#     from config import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, GZIP_REQUESTS, GZIP_LEVEL, GZIP_MIN_BYTES
+
+
+_session = None
+_session_lock = threading.Lock()
+
+# Run-level gzip state: enabled until endpoint rejects, confirmed once accepted
+_gzip_enabled = GZIP_REQUESTS
+_gzip_confirmed = False
+_gzip_probing = False  # Plain resend probe in flight (see gzip_probe_start)
+_gzip_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return shared requests session, created on first use
+
+    Returns:
+        requests.Session with pooled keep-alive adapters for http and https
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def post(url, timeout=None, **kwargs):
+    """
+    POST via shared session with default (connect, read) timeout
+
+    Args:
+        url: Target URL
+        timeout: Optional override, seconds or (connect, read) tuple
+        **kwargs: Passed through to requests (headers, data, json...)
+
+    Returns:
+        requests.Response
+    """
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    return get_session().post(url, timeout=timeout, **kwargs)
+
+
+def close_session():
+    """Close shared session and its pooled connections (next call reopens)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# --- Request body compression ---------------------------------------------------
+def encode_body(body):
+    """
+    Gzip request body if enabled and above size threshold
+
+    Args:
+        body: Request body bytes
+
+    Returns:
+        (data, extra_headers) - extra_headers carries Content-Encoding if compressed
+    """
+    if not _gzip_enabled or len(body) < GZIP_MIN_BYTES:
+        return body, {}
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), {"Content-Encoding": "gzip"}
+
+
+def gzip_accepted():
+    """Record endpoint accepted gzip body"""
+    global _gzip_confirmed
+    _gzip_confirmed = True
+
+
+def gzip_probe_start():
+    """
+    Claim plain resend probe after 400 on gzip body not yet known to work
+
+    One probe at a time, and none once gzip is confirmed or off, so 400
+    bisection does not repeat gzip-then-plain at every level.
+
+    Returns:
+        True if caller should resend plain and report gzip_probe_result()
+    """
+    global _gzip_probing
+    with _gzip_lock:
+        if _gzip_confirmed or not _gzip_enabled or _gzip_probing:
+            return False
+        _gzip_probing = True
+        return True
+
+
+def gzip_probe_result(status):
+    """
+    Settle probe by status of plain resend
+
+    200 means gzip was the problem (off for run); 400 means body is bad
+    either way, gzip is fine (confirmed, no more probes). Anything else
+    (429, 401, 5xx, network error as None) is inconclusive and a later 400
+    may probe again.
+    """
+    global _gzip_probing
+    if status == 200:
+        gzip_rejected()
+    elif status == 400:
+        gzip_accepted()
+    with _gzip_lock:
+        _gzip_probing = False
+
+
+def gzip_rejected():
+    """Endpoint cannot take gzip bodies: send uncompressed for rest of run"""
+    global _gzip_enabled
+    if _gzip_enabled:
+        _gzip_enabled = False
+        print("Endpoint rejected gzip request body, sending uncompressed for rest of run")
@@ -1,7 +1,7 @@
 # api_pipeline/utils.py
 
 import time
-import tracemalloc
+from functools import wraps
 import pyodbc  # for notebook/test_db_connection snippet(end block)
 
 # --- Optional memory_profiler support ----------------------------------------
@@ -26,6 +26,11 @@ def _safe_memory_usage_first_sample():
         return None
 
 # --- Config imports (package + script contexts) -----------------------------
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
 try:
     # running as proper package
     from .config import DEBUG, USE_PARTIAL_PAYLOAD
@@ -48,36 +53,37 @@ def announce_mode():
     print("Partial delta payload mode enabled" if USE_PARTIAL_PAYLOAD else "▶ Full non-delta payload mode only")
 
 # --- Benchmark decorator ------------------------------------------------------
-def benchmark_section(label: str):
+def benchmark_section(label: str, trace_memory: bool = False):
     """
-    Decorator to benchmark a function section.
-    - Always measures elapsed time and tracemalloc peak memory.
-    - If memory_profiler is available, also reports process "Mem delta" in MiB.
+    Decorator to benchmark a top-level pipeline section.
+    - Always times section as nested span in metrics registry.
+    - trace_memory=True opts section into tracemalloc peak and, if
+      memory_profiler available, process "Mem delta" in MiB.
+    - Metrics summary printed once, when outermost section finishes (DEBUG).
+    Hot or recursive functions should use metrics.timed() instead.
     """
     def decorator(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
             print(f"Starting {label}...")
-            start = time.time()
-            tracemalloc.start()
-
-            mem_before = _safe_memory_usage_first_sample()
+            mem_before = _safe_memory_usage_first_sample() if trace_memory else None
 
-            result = func(*args, **kwargs)
-
-            mem_after = _safe_memory_usage_first_sample()
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
-
-            elapsed = time.time() - start
+            start = time.perf_counter()
+            with metrics.span(label, trace_memory=trace_memory):
+                result = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
 
             if DEBUG:
-                peak_mib = peak / (1024 ** 2)
+                mem_after = _safe_memory_usage_first_sample() if trace_memory else None
                 if mem_before is not None and mem_after is not None:
-                    mem_delta = mem_after - mem_before
-                    print(f"Finished {label}: {elapsed:.2f}s | Mem delta: {mem_delta:.2f} MiB | Peak mem: {peak_mib:.2f} MiB")
+                    print(f"Finished {label}: {elapsed:.2f}s | Mem delta: {mem_after - mem_before:.2f} MiB")
                 else:
-                    # memory_profiler not present (or failed): omit Mem delta
-                    print(f"Finished {label}: {elapsed:.2f}s | Peak mem: {peak_mib:.2f} MiB")
+                    print(f"Finished {label}: {elapsed:.2f}s")
+
+                # End of run: report aggregated metrics once
+                if metrics.depth() == 0:
+                    for line in metrics.report():
+                        print(line)
 
             return result
         return wrapper
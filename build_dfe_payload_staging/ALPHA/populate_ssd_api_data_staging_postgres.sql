@@ -79,6 +79,13 @@ CREATE TABLE IF NOT EXISTS ssd_api_data_staging_anon (
     last_updated TIMESTAMPTZ DEFAULT now()
 );
 
+-- Table is append-only: latest row per person (highest id) is current, as read
+-- by api_pipeline (DISTINCT ON (person_id) ... ORDER BY person_id, id DESC)
+CREATE INDEX IF NOT EXISTS ix_ssd_api_data_staging_person_id
+    ON ssd_api_data_staging (person_id, id DESC);
+CREATE INDEX IF NOT EXISTS ix_ssd_api_data_staging_anon_person_id
+    ON ssd_api_data_staging_anon (person_id, id DESC);
+
 -- Optional unique index as a guard rail
 -- CREATE UNIQUE INDEX IF NOT EXISTS ux_ssd_api_person_hash
 --     ON ssd_api_data_staging(person_id, current_hash);
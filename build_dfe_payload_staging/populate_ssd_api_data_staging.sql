@@ -1423,6 +1423,20 @@ WHERE NOT EXISTS (
 
 
 
+-- Non-unique idx for API pipeline keyset paging of pending rows (iter_pending_records);
+-- without it every page of PENDING_PAGE_SIZE rows rescans the table
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_ssd_api_data_staging_person'
+      AND object_id = OBJECT_ID('ssd_api_data_staging')
+)
+BEGIN
+    CREATE INDEX IX_ssd_api_data_staging_person
+    ON ssd_api_data_staging(person_id);
+END;
+
+
 -- -- -- Optional Idx
 -- -- CREATE UNIQUE INDEX UX_ssd_api_data_staging_person ON ssd_api_data_staging(person_id);
 -- IF NOT EXISTS (
@@ -1483,6 +1497,18 @@ BEGIN
 
 END
 
+-- Pipeline keyset paging idx, as on ssd_api_data_staging (SELECT INTO copies no indexes)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_ssd_api_data_staging_anon_person'
+      AND object_id = OBJECT_ID('ssd_api_data_staging_anon')
+)
+BEGIN
+    CREATE INDEX IX_ssd_api_data_staging_anon_person
+    ON ssd_api_data_staging_anon(person_id);
+END;
+
 -- GO
 
 SET NOCOUNT ON;